@@ -0,0 +1,420 @@
+"""AI enhanced report generation: token-budgeted map-reduce over the containers.
+
+Only the fields the report asks for are sent (see project_container()). The
+projected containers are packed into chunks that fit a token budget, each
+chunk is summarized by its own completion request (several run concurrently)
+and the partial summaries are merged into the final report by a reduce pass;
+if they don't fit one request either, they are merged in rounds, and cut to
+the budget if merging can't shrink them enough. A host that
+fits a single request gets exactly one request, as before.
+
+Completions are cached on disk by a hash of the request, so re-running a
+report over unchanged containers doesn't call the API again.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+from instrumentation import Histogram
+
+OPENAI_REQUEST_SECONDS = Histogram("openai_request_seconds", "Latency of OpenAI chat completion requests",
+                                   ("outcome",)) # ok, rate_limited or error
+
+SYSTEM_PROMPT = "You are an expert assistant specialized in analyzing Docker container configurations and generating clear, concise markdown reports."
+
+REPORT_SECTIONS = """Include sections for:
+1. Executive Summary (count of containers, unique images used, common networks, etc.)
+2. Detailed Container Information:
+   Present this information in a markdown table with the following columns:
+   | Name | Short ID | Image | Status | Ports | Networks | Mounts |
+   |------|----------|-------|--------|-------|----------|--------|
+   Use the first 12 characters for the 'Short ID'. For the 'Ports', 'Networks', and 'Mounts' columns, summarize the information concisely. Use backticks (`) around complex entries if needed to prevent breaking the table structure (e.g., `port1 -> host:port1, port2 -> host:port2`).
+3. Resource Usage and Limits (If available in data)
+4. Environment Variables (Mention sensitive variables should be handled carefully, list non-sensitive ones if appropriate, or just summarize their presence)
+5. Health Checks (If configured)
+6. Security Considerations (Based on exposed ports, capabilities, user, etc. - provide general advice)
+
+Don't list networks, volumes, images or published ports with the containers using them: the report already has exact tables of those.
+
+Format the markdown to be well-structured with proper headings, tables (for structured data like ports/mounts), and code blocks where appropriate. Focus on clarity and readability."""
+
+REPORT_PROMPT = """Create a comprehensive markdown report about Docker containers from the following JSON data (one object per container; `env` lists variable names only).
+""" + REPORT_SECTIONS + """
+
+JSON data:
+```json
+{data}
+```"""
+
+# No batch number or count in here: a batch of unchanged containers makes the same request (a cache hit)
+# even when containers elsewhere on the host came or went
+MAP_PROMPT = """The following JSON data describes some of the Docker containers on a host (one object per container; `env` lists variable names only). Write compact markdown notes on these containers that will later be merged with the notes on the others into one report:
+- A markdown table with one row per container and the columns | Name | Short ID | Image | Status | Ports | Networks | Mounts |
+- Resource limits, environment variable names worth mentioning, health checks and security-relevant settings (exposed ports, privileged mode, capabilities, user)
+Only describe what is in the data; don't write an introduction or conclusion.
+
+JSON data:
+```json
+{data}
+```"""
+
+REDUCE_PROMPT = """The following are notes on {parts} batches of the {total} Docker containers on a host. Merge them into one comprehensive markdown report about all {total} containers.
+""" + REPORT_SECTIONS + """
+
+Keep every container row of the batch tables in the Detailed Container Information table.
+
+Notes:
+{data}"""
+
+MERGE_PROMPT = """The following are notes on {parts} batches of Docker containers. Merge them into one set of notes in the same format: a single table with every container row, followed by the merged resource, environment, health check and security notes. Only describe what is in the notes.
+
+Notes:
+{data}"""
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for JSON and English)."""
+    return len(text) // 4 + 1
+
+
+def project_container(container_info):
+    """The fields of an inspect document the AI report uses, in a compact form."""
+    config = container_info.get('Config') or {}
+    host_config = container_info.get('HostConfig') or {}
+    network_settings = container_info.get('NetworkSettings') or {}
+    state = container_info.get('State') or {}
+
+    ports = []
+    for container_port, bindings in (network_settings.get('Ports') or {}).items():
+        if bindings:
+            ports.extend(f"{b.get('HostIp') or '0.0.0.0'}:{b.get('HostPort')}->{container_port}" for b in bindings)
+        else:
+            ports.append(container_port)
+
+    record = {
+        'name': container_info.get('Name', '').lstrip('/'),
+        'id': container_info.get('Id', '')[:12],
+        'image': config.get('Image'),
+        'status': state.get('Status'),
+        'health': (state.get('Health') or {}).get('Status'),
+        'ports': ports,
+        'networks': sorted((network_settings.get('Networks') or {}).keys()),
+        'mounts': [f"{m.get('Source') or m.get('Name')}:{m.get('Destination')}:{m.get('Type')}{'' if m.get('RW', True) else ':ro'}"
+                   for m in container_info.get('Mounts') or []],
+        'env': [var.split('=', 1)[0] for var in config.get('Env') or []], # Names only: values may be secrets
+        'compose_project': (config.get('Labels') or {}).get('com.docker.compose.project'),
+        'restart': (host_config.get('RestartPolicy') or {}).get('Name'),
+        'cpu_shares': host_config.get('CpuShares'),
+        'nano_cpus': host_config.get('NanoCpus'),
+        'memory': host_config.get('Memory'),
+        'user': config.get('User'),
+        'privileged': host_config.get('Privileged'),
+        'cap_add': host_config.get('CapAdd'),
+        'read_only': host_config.get('ReadonlyRootfs'),
+        'network_mode': host_config.get('NetworkMode'),
+        'healthcheck': (config.get('Healthcheck') or {}).get('Test'),
+    }
+    # Leave out empty fields; they cost tokens and say nothing
+    return {key: value for key, value in record.items() if value not in (None, '', [], 0, False)}
+
+
+def pack(items, budget, overhead=0):
+    """Split serialized items into consecutive groups of at most budget tokens each.
+
+    An item larger than the budget on its own gets a group of its own.
+    """
+    groups, group, used = [], [], overhead
+    for item in items:
+        tokens = estimate_tokens(item)
+        if group and used + tokens > budget:
+            groups.append(group)
+            group, used = [], overhead
+        group.append(item)
+        used += tokens
+    if group:
+        groups.append(group)
+    return groups
+
+
+NOTES_SEPARATOR = "\n\n---\n\n"
+TRUNCATED_MARKER = "\n\n[... cut to fit the token budget]"
+
+
+def fit_notes(notes, budget):
+    """Cut the longest notes so that all of them, joined, take at most budget tokens.
+
+    Each note gets an equal share of the budget; what short notes leave
+    unused goes to the longer ones.
+    """
+    budget -= estimate_tokens(NOTES_SEPARATOR) * (len(notes) - 1)
+    if sum(estimate_tokens(note) for note in notes) <= budget:
+        return notes
+    fitted = list(notes)
+    remaining = max(budget, len(notes))
+    for count, index in enumerate(sorted(range(len(notes)), key=lambda i: len(notes[i]))):
+        share = remaining // (len(notes) - count)
+        tokens = estimate_tokens(notes[index])
+        if tokens > share:
+            keep = max(0, (share - 1) * 4 - len(TRUNCATED_MARKER))
+            fitted[index] = notes[index][:keep] + TRUNCATED_MARKER
+            tokens = estimate_tokens(fitted[index])
+        remaining -= tokens
+    return fitted
+
+
+class CompletionCache:
+    """Completion texts stored on disk under a hash of the request.
+
+    At most max_entries are kept; the least recently written go first.
+    """
+    def __init__(self, directory, max_entries=1000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(request):
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key):
+        try:
+            with open(os.path.join(self.directory, f"{key}.md"), 'r') as f:
+                value = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        path = os.path.join(self.directory, f"{key}.md")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+        self._prune()
+
+    def _prune(self):
+        with self._lock:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith('.md')]
+            if len(entries) <= self.max_entries:
+                return
+            entries.sort(key=lambda e: e.stat().st_mtime)
+            for entry in entries[:len(entries) - self.max_entries]:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+
+def default_cache_dir():
+    # Not named docker_info_*: those are per-task report directories and get swept
+    return os.path.join(tempfile.gettempdir(), "docker-info-ai-cache")
+
+
+class AIReportGenerator:
+    """Generates the AI enhanced report for a list of projected containers."""
+    def __init__(self, client, model, token_budget=8000, workers=4, max_retries=5, temperature=0.5,
+                 timeout=180, cache=None):
+        self.client = client
+        self.model = model
+        self.token_budget = token_budget # Maximum estimated input tokens per request
+        self.workers = workers
+        self.max_retries = max_retries
+        self.temperature = temperature
+        self.timeout = timeout
+        self.cache = cache
+        self.requests = 0 # API requests made (cache misses and retries included)
+        self._lock = threading.Lock()
+
+    def _request(self, prompt):
+        """The completion request for a prompt and its cache key (None without a cache)."""
+        request = {'model': self.model, 'temperature': self.temperature,
+                   'messages': [{"role": "system", "content": SYSTEM_PROMPT},
+                                {"role": "user", "content": prompt}]}
+        return request, CompletionCache.key(request) if self.cache else None
+
+    def _finish(self, completion, key):
+        content = completion.choices[0].message.content if completion.choices and completion.choices[0].message else None
+        if content and key:
+            self.cache.put(key, content)
+        return content
+
+    def _backoff(self, error, attempt):
+        """Seconds to wait after a rate limit, or raise it once retries are used up."""
+        if attempt == self.max_retries:
+            raise error
+        delay = self._retry_after(error) or min(2 ** attempt, 60) * (0.5 + random.random())
+        print(f"Warning: OpenAI rate limit hit, retrying in {delay:.1f}s")
+        return delay
+
+    def complete(self, prompt, check_cancelled=None):
+        """One chat completion (cached), retrying with exponential backoff when rate limited."""
+        request, key = self._request(prompt)
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        for attempt in range(self.max_retries + 1):
+            if check_cancelled:
+                check_cancelled()
+            with self._lock:
+                self.requests += 1
+            start = time.perf_counter()
+            try:
+                completion = self.client.chat.completions.create(timeout=self.timeout, **request)
+                OPENAI_REQUEST_SECONDS.observe(time.perf_counter() - start, "ok")
+                break
+            except openai.RateLimitError as e:
+                OPENAI_REQUEST_SECONDS.observe(time.perf_counter() - start, "rate_limited")
+                time.sleep(self._backoff(e, attempt))
+            except Exception:
+                OPENAI_REQUEST_SECONDS.observe(time.perf_counter() - start, "error")
+                raise
+        return self._finish(completion, key)
+
+    async def acomplete(self, prompt, check_cancelled=None):
+        """complete() for an openai.AsyncOpenAI client: waits without holding a thread."""
+        request, key = self._request(prompt)
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        for attempt in range(self.max_retries + 1):
+            if check_cancelled:
+                check_cancelled()
+            self.requests += 1 # Coroutines of one event loop; no lock needed
+            start = time.perf_counter()
+            try:
+                completion = await self.client.chat.completions.create(timeout=self.timeout, **request)
+                OPENAI_REQUEST_SECONDS.observe(time.perf_counter() - start, "ok")
+                break
+            except openai.RateLimitError as e:
+                OPENAI_REQUEST_SECONDS.observe(time.perf_counter() - start, "rate_limited")
+                await asyncio.sleep(self._backoff(e, attempt))
+            except Exception:
+                OPENAI_REQUEST_SECONDS.observe(time.perf_counter() - start, "error")
+                raise
+        return self._finish(completion, key)
+
+    @staticmethod
+    def _retry_after(error):
+        try:
+            return float(error.response.headers.get('retry-after'))
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    def _prompt_overhead(self, template):
+        return estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(template)
+
+    def _single_report_prompt(self, items):
+        """The REPORT_PROMPT for all items if it fits the token budget (or there is only one item), else None."""
+        prompt = REPORT_PROMPT.format(data="[\n" + ",\n".join(items) + "\n]")
+        if len(items) <= 1 or estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(prompt) <= self.token_budget:
+            return prompt
+        return None
+
+    def generate(self, records, check_cancelled=None, progress=None):
+        """Return the report markdown for the projected container records (None if the API returned nothing).
+
+        progress(message) is called as batches are summarized.
+        """
+        items = [json.dumps(record, separators=(',', ':')) for record in records]
+        prompt = self._single_report_prompt(items)
+        if prompt is not None:
+            return self.complete(prompt, check_cancelled)
+        batches = pack(items, self.token_budget, overhead=self._prompt_overhead(MAP_PROMPT))
+
+        # Map: summarize the batches concurrently
+        done = 0
+        done_lock = threading.Lock()
+
+        def summarize(index):
+            nonlocal done
+            data = "[\n" + ",\n".join(batches[index]) + "\n]"
+            notes = self.complete(MAP_PROMPT.format(data=data), check_cancelled)
+            with done_lock:
+                done += 1
+                if progress:
+                    progress(f"Generating AI enhanced report... summarized {done}/{len(batches)} batches")
+            return notes or ""
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(batches)))) as executor:
+            notes = list(executor.map(summarize, range(len(batches))))
+
+        # Reduce: merge notes in rounds until they fit one request
+        while True:
+            groups = pack(notes, self.token_budget, overhead=self._prompt_overhead(REDUCE_PROMPT))
+            if len(groups) <= 1 or len(groups) >= len(notes): # Fits, or no two notes fit one merge request
+                break
+            if progress:
+                progress(f"Generating AI enhanced report... merging {len(notes)} partial summaries")
+            with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(groups)))) as executor:
+                notes = list(executor.map(
+                    lambda group: self.complete(MERGE_PROMPT.format(parts=len(group), data=NOTES_SEPARATOR.join(group)),
+                                                check_cancelled) or "",
+                    groups))
+
+        # Whatever merging couldn't shrink enough is cut, so the final request stays within the budget
+        notes = fit_notes(notes, self.token_budget - self._prompt_overhead(REDUCE_PROMPT))
+        if progress:
+            progress("Generating AI enhanced report... writing the final report")
+        return self.complete(REDUCE_PROMPT.format(parts=len(notes), total=len(records),
+                                                  data=NOTES_SEPARATOR.join(notes)), check_cancelled)
+
+    async def agenerate(self, records, check_cancelled=None, progress=None):
+        """generate() for an openai.AsyncOpenAI client: the batches are requests in flight on one
+        event loop (at most `workers` at a time) instead of a thread each."""
+        items = [json.dumps(record, separators=(',', ':')) for record in records]
+        prompt = self._single_report_prompt(items)
+        if prompt is not None:
+            return await self.acomplete(prompt, check_cancelled)
+        batches = pack(items, self.token_budget, overhead=self._prompt_overhead(MAP_PROMPT))
+
+        slots = asyncio.Semaphore(max(1, self.workers))
+        done = 0
+
+        async def bounded(prompt):
+            async with slots:
+                return await self.acomplete(prompt, check_cancelled) or ""
+
+        async def summarize(index):
+            nonlocal done
+            data = "[\n" + ",\n".join(batches[index]) + "\n]"
+            notes = await bounded(MAP_PROMPT.format(data=data))
+            done += 1
+            if progress:
+                progress(f"Generating AI enhanced report... summarized {done}/{len(batches)} batches")
+            return notes
+
+        notes = await asyncio.gather(*(summarize(index) for index in range(len(batches))))
+
+        while True:
+            groups = pack(notes, self.token_budget, overhead=self._prompt_overhead(REDUCE_PROMPT))
+            if len(groups) <= 1 or len(groups) >= len(notes): # Fits, or no two notes fit one merge request
+                break
+            if progress:
+                progress(f"Generating AI enhanced report... merging {len(notes)} partial summaries")
+            notes = await asyncio.gather(*(
+                bounded(MERGE_PROMPT.format(parts=len(group), data=NOTES_SEPARATOR.join(group))) for group in groups))
+
+        notes = fit_notes(notes, self.token_budget - self._prompt_overhead(REDUCE_PROMPT))
+        if progress:
+            progress("Generating AI enhanced report... writing the final report")
+        return await self.acomplete(REDUCE_PROMPT.format(parts=len(notes), total=len(records),
+                                                         data=NOTES_SEPARATOR.join(notes)), check_cancelled)
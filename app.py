@@ -1,194 +1,981 @@
-from flask import Flask, render_template, request, send_file, redirect, url_for, jsonify, flash
-import subprocess
+from flask import Flask, Response, render_template, request, send_file, redirect, url_for, jsonify, flash, g
+import asyncio
+import cProfile
+import gzip
+import hashlib
+import io
 import json
 import os
+import pstats
+import shutil
 import tempfile
 import time
 import threading
+import queue
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import openai # Import OpenAI library
 from datetime import datetime
+from urllib.parse import urlencode
+from docker_backend import DockerError, create_backend
+from fleet import Fleet
+from container_cache import ContainerStateCache
+from container_index import SORT_FIELDS, ContainerListIndex, decode_cursor
+from task_store import FINISHED_STATUSES, SQLiteTaskStore, TaskStore
+from job_queue import JobCancelled, JobQueue, QueueFull
+from snapshot_cache import InspectSnapshotCache
+from snapshot_history import SnapshotHistory
+from topology import KINDS as TOPOLOGY_KINDS, TopologyIndex
+from container_export import FORMATS as EXPORT_FORMATS, DatasetWriter, dataset_collected_at, export, parse_fields
+from report_html import markdown_to_html
+from metrics_sampler import FIELDS as METRIC_FIELDS, TIERS as METRIC_TIERS, MetricsSampler
+from ai_report import AIReportGenerator, CompletionCache, default_cache_dir, project_container
+from instrumentation import REGISTRY, Counter, Gauge, Histogram
 
 app = Flask(__name__)
 
 # Add Docker path to the environment
 os.environ["PATH"] = "/run/current-system/sw/bin:" + os.environ.get("PATH", "")
 
-# Storage for background tasks
-tasks = {}
+# Docker backend, created lazily by get_docker() (see DOCKER_BACKEND)
+_docker = None
+_docker_lock = threading.Lock()
+
+# Docker hosts aggregated in fleet mode, created lazily by get_fleet() (see DOCKER_HOSTS)
+_fleet = None
+_host_snapshots = {} # Host name -> InspectSnapshotCache of that host
+
+# AI completion cache, created lazily by get_completion_cache()
+_completion_cache = None
+
+# Snapshot history of every collection, created lazily by get_history()
+_history = None
+
+# Resource metrics sampler, created lazily by get_metrics_sampler()
+_metrics_sampler = None
+
+# Event-driven container list cache, created lazily by get_container_cache()
+_container_cache = None
+_container_list_memo = {} # (show_all, request_hostname) -> (cache version, ContainerListIndex)
+
+# Asynchronous container actions, see start_container_operation()
+operations = OrderedDict() # operation_id -> operation dict, oldest first
+_operations_lock = threading.Lock()
 
 # Configuration
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY") # Get API key from environment
 OPENAI_MODEL = "gpt-4.1-nano" # Specify the desired OpenAI model
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") # Any OpenAI-compatible API, e.g. bench/fake_openai.py
 app.secret_key = os.urandom(24) # Needed for flashing messages
 
+# Container inspection is batched: each `docker inspect` call receives up to
+# INSPECT_CHUNK_SIZE IDs and up to INSPECT_WORKERS calls run at the same time.
+INSPECT_CHUNK_SIZE = int(os.environ.get("INSPECT_CHUNK_SIZE", "100"))
+INSPECT_WORKERS = int(os.environ.get("INSPECT_WORKERS", "4"))
+
+# The container list is served from memory and kept current from `docker events`;
+# it is fully resynced (and considered stale if it can't be) every MAX_AGE seconds.
+CONTAINER_CACHE_ENABLED = os.environ.get("CONTAINER_CACHE", "true").lower() == "true"
+CONTAINER_CACHE_MAX_AGE = float(os.environ.get("CONTAINER_CACHE_MAX_AGE", "60"))
+CONTAINER_CACHE_EVENT_WINDOW = float(os.environ.get("CONTAINER_CACHE_EVENT_WINDOW", "5"))
+
+# Report tasks: unchanged tasks expire after TASK_TTL seconds and at most TASK_MAX
+# finished tasks are kept; their report directories are deleted with them. With
+# TASK_STORE_DB set, tasks are kept in that SQLite file instead of in memory so
+# they survive restarts and are shared by all worker processes.
+TASK_MAX = int(os.environ.get("TASK_MAX", "200"))
+TASK_TTL = float(os.environ.get("TASK_TTL", str(24 * 3600)))
+TASK_STORE_DB = os.environ.get("TASK_STORE_DB")
+
+# Unchanged containers are not re-inspected or re-rendered between reports; these
+# bound how many inspect documents and rendered sections are kept for that.
+SNAPSHOT_CACHE_CONTAINERS = int(os.environ.get("SNAPSHOT_CACHE_CONTAINERS", "1000"))
+SNAPSHOT_CACHE_FRAGMENTS = int(os.environ.get("SNAPSHOT_CACHE_FRAGMENTS", "2000"))
+
+# Every collection is kept as a snapshot in HISTORY_DIR, inspect documents stored
+# once per distinct content; the newest HISTORY_KEEP are kept. "" disables it.
+HISTORY_DIR = os.environ.get("HISTORY_DIR", os.path.join(tempfile.gettempdir(), "docker-info-history"))
+HISTORY_KEEP = int(os.environ.get("HISTORY_KEEP", "500"))
+
+# Networks, volumes, images and host ports are indexed by every collection;
+# /api/topology collects again (incrementally) if the index is older than TOPOLOGY_MAX_AGE
+TOPOLOGY_MAX_AGE = float(os.environ.get("TOPOLOGY_MAX_AGE", "60"))
+TOPOLOGY_REPORT_NAMES = 50 # Containers named per network, volume or image in the report
+
+# The extracted fields of every collection are kept in EXPORT_DATASET for /api/export,
+# which collects again first if they are older than EXPORT_MAX_AGE. "" disables it.
+EXPORT_DATASET = os.environ.get("EXPORT_DATASET", os.path.join(tempfile.gettempdir(), "docker-info-export.jsonl"))
+EXPORT_MAX_AGE = float(os.environ.get("EXPORT_MAX_AGE", "300"))
+
+# Report generation runs on REPORT_WORKERS worker threads; at most
+# REPORT_QUEUE_SIZE further requests wait, beyond that /generate answers 429.
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", "2"))
+REPORT_QUEUE_SIZE = int(os.environ.get("REPORT_QUEUE_SIZE", "10"))
+
+# The AI report is generated map-reduce style: containers are sent in batches of at
+# most AI_TOKEN_BUDGET estimated input tokens, AI_WORKERS of them at a time, and
+# rate-limited requests are retried up to AI_MAX_RETRIES times with backoff.
+# Completions are cached in AI_CACHE_DIR (at most AI_CACHE_MAX); set it to "" to disable.
+AI_TOKEN_BUDGET = int(os.environ.get("AI_TOKEN_BUDGET", "8000"))
+AI_WORKERS = int(os.environ.get("AI_WORKERS", "4"))
+AI_MAX_RETRIES = int(os.environ.get("AI_MAX_RETRIES", "5"))
+AI_CACHE_DIR = os.environ.get("AI_CACHE_DIR", default_cache_dir())
+AI_CACHE_MAX = int(os.environ.get("AI_CACHE_MAX", "1000"))
+# With ASYNC_OPENAI=true (the default under asgi.py) the batches are sent with
+# openai.AsyncOpenAI from one event loop per report instead of a thread each
+ASYNC_OPENAI = os.environ.get("ASYNC_OPENAI", "false").lower() == "true"
+
+# Live resource metrics: one stats feed for all running containers, sampled every
+# METRICS_INTERVAL seconds into fixed-size ring buffers (raw, 1 minute and 1 hour
+# tiers) for at most METRICS_MAX_CONTAINERS containers. Set METRICS=false to disable.
+METRICS_ENABLED = os.environ.get("METRICS", "true").lower() == "true"
+METRICS_INTERVAL = float(os.environ.get("METRICS_INTERVAL", "5"))
+METRICS_RAW_POINTS = int(os.environ.get("METRICS_RAW_POINTS", "120")) # 10 minutes at 5s
+METRICS_MINUTE_POINTS = int(os.environ.get("METRICS_MINUTE_POINTS", "360")) # 6 hours
+METRICS_HOUR_POINTS = int(os.environ.get("METRICS_HOUR_POINTS", "168")) # 7 days
+METRICS_MAX_CONTAINERS = int(os.environ.get("METRICS_MAX_CONTAINERS", "1000"))
+
+# Fleet mode: DOCKER_HOSTS lists several daemons ("name=unix:///path,name=tcp://host:port,...")
+# to aggregate; each is queried concurrently and given DOCKER_HOST_TIMEOUT seconds
+# to answer before it is reported as failed. Unset means the single local host.
+DOCKER_HOSTS = os.environ.get("DOCKER_HOSTS")
+DOCKER_HOST_TIMEOUT = float(os.environ.get("DOCKER_HOST_TIMEOUT", "10"))
+
+# /view shows large reports a page at a time, VIEW_PAGE_SIZE container sections per page
+VIEW_PAGE_SIZE = int(os.environ.get("VIEW_PAGE_SIZE", "50"))
+
+# Profiling: with PROFILING=true a report requested with profile=true (form field
+# or query parameter of /generate) runs under cProfile; see /api/tasks/<id>/profile
+PROFILING_ENABLED = os.environ.get("PROFILING", "false").lower() == "true"
+
+# Task status streaming (/api/status/<task_id>/stream)
+TASK_STREAM_BUFFER = 16 # Updates queued per client; the oldest are dropped beyond that
+TASK_STREAM_HEARTBEAT = 15 # Seconds between keep-alive comments on an idle stream
+TASK_STREAM_TIMEOUT = 300 # Seconds before a stream is closed (the browser reconnects)
+
+# Container list streaming (/api/containers/stream) and asynchronous actions
+CONTAINER_STREAM_BUFFER = 64
+CONTAINER_STREAM_HEARTBEAT = 15
+CONTAINER_STREAM_TIMEOUT = 300
+CONTAINER_PAGE_SIZE = 50 # Rows per page on the main page
+CONTAINER_PAGE_MAX = 1000 # Largest ?limit= of /api/containers
+ACTION_WORKERS = int(os.environ.get("ACTION_WORKERS", "4")) # Container actions run concurrently
+CONTAINER_ACTIONS = ('start', 'stop', 'restart')
+# Bulk actions (/api/operations/bulk/<action>) run at most this many of their
+# containers at once by default (a request can ask for up to ACTION_WORKERS)
+BULK_ACTION_PARALLELISM = int(os.environ.get("BULK_ACTION_PARALLELISM", "4"))
+BULK_ACTION_MAX_CONTAINERS = 1000 # Containers per bulk action
+BULK_ACTION_WAIT = 600 # Seconds a ?wait=true request waits for the results
+OPERATIONS_KEEP = 500 # Finished operations remembered for /api/operations/<id>
+
+# --- Update Streaming ---
+
+class Broadcaster:
+    """Fans updates out to per-client bounded queues, grouped by topic.
+
+    A slow client never makes its queue grow past buffer_size: its oldest
+    queued update is dropped instead.
+    """
+    def __init__(self, buffer_size):
+        self.buffer_size = buffer_size
+        self._subscribers = {} # topic -> set of queues
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic, updates=None):
+        """Returns a new queue of the topic's updates (or registers updates, any object with put_nowait())."""
+        updates = queue.Queue(maxsize=self.buffer_size) if updates is None else updates
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(updates)
+        return updates
+
+    def unsubscribe(self, topic, updates):
+        with self._lock:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(updates)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def publish(self, topic, update):
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for updates in subscribers:
+            while True:
+                try:
+                    updates.put_nowait(update)
+                    break
+                except queue.Full:
+                    try:
+                        updates.get_nowait()
+                    except queue.Empty:
+                        pass
+
+
+task_updates = Broadcaster(TASK_STREAM_BUFFER) # Topic: task_id
+container_updates = Broadcaster(CONTAINER_STREAM_BUFFER) # Topic: 'containers'
+
+
+class Task(dict):
+    """Task state dict that publishes status/message changes to stream subscribers."""
+    def __init__(self, task_id, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.task_id = task_id
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        tasks.save(self.task_id, self)
+        if key in ('status', 'message'):
+            task_updates.publish(self.task_id, {'status': self.get('status'), 'message': self.get('message')})
+
+
+# Storage for background tasks
+if TASK_STORE_DB:
+    tasks = SQLiteTaskStore(TASK_STORE_DB, max_tasks=TASK_MAX, ttl=TASK_TTL, task_factory=Task)
+else:
+    tasks = TaskStore(max_tasks=TASK_MAX, ttl=TASK_TTL, task_factory=Task)
+
+
+def stream_task_status(task_id):
+    """Server-Sent Events generator for the status transitions of a task."""
+    updates = task_updates.subscribe(task_id) # Subscribe first so no transition is missed
+    try:
+        task = tasks.get(task_id, {})
+        update = {'status': task.get('status'), 'message': task.get('message')}
+        yield f"retry: 3000\ndata: {json.dumps(update)}\n\n"
+        deadline = time.monotonic() + TASK_STREAM_TIMEOUT
+        while update['status'] not in FINISHED_STATUSES:
+            if time.monotonic() > deadline:
+                return # EventSource reconnects and gets a fresh stream
+            # Tasks run by another worker process don't publish here; re-read those every second
+            local = tasks.is_local(task_id)
+            try:
+                update = updates.get(timeout=TASK_STREAM_HEARTBEAT if local else 1)
+            except queue.Empty:
+                task = tasks.get(task_id, {})
+                latest = {'status': task.get('status'), 'message': task.get('message')}
+                if local or latest == update:
+                    yield ": heartbeat\n\n" # Also detects clients that went away
+                    continue
+                update = latest
+            yield f"data: {json.dumps(update)}\n\n"
+
+        # The final message is often set right after the final status; pass it on too
+        while True:
+            try:
+                yield f"data: {json.dumps(updates.get(timeout=0.25))}\n\n"
+            except queue.Empty:
+                break
+        yield "event: end\ndata: {}\n\n"
+    finally:
+        task_updates.unsubscribe(task_id, updates)
+
+
+def _container_key(container):
+    """Identifies a container in the list; IDs are only unique per host in fleet mode."""
+    return f"{container['host']}/{container['id']}" if container.get('host') else container['id']
+
+
+def _diff_containers(previous, current):
+    """Per-container differences between two {key: container} mappings (see _container_key())."""
+    return {
+        'added': [c for cid, c in current.items() if cid not in previous],
+        'removed': [cid for cid in previous if cid not in current],
+        'changed': [c for cid, c in current.items() if cid in previous and previous[cid] != c],
+    }
+
+
+def stream_container_changes(show_all, request_hostname, send_snapshot=True):
+    """Server-Sent Events generator: one full snapshot, then per-container diffs.
+
+    Diffs are recomputed whenever the container cache changes or an operation
+    finishes, and on every heartbeat in case the cache is not in use. Clients
+    that page through /api/containers pass send_snapshot=False and get a
+    "ready" event with the container count instead of the whole list.
+    """
+    updates = container_updates.subscribe('containers')
+    try:
+        containers = get_containers(show_all=show_all, request_hostname=request_hostname)
+        if containers is None:
+            yield f"event: error\ndata: {json.dumps({'error': 'Failed to fetch container status from Docker.'})}\n\n"
+            return
+        current = {_container_key(c): c for c in containers}
+        if send_snapshot:
+            yield f"retry: 3000\nevent: snapshot\ndata: {json.dumps(containers)}\n\n"
+        else:
+            yield f"retry: 3000\nevent: ready\ndata: {json.dumps({'total': len(containers)})}\n\n"
+
+        deadline = time.monotonic() + CONTAINER_STREAM_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                pending = [updates.get(timeout=CONTAINER_STREAM_HEARTBEAT)]
+            except queue.Empty:
+                pending = []
+                yield ": heartbeat\n\n"
+            # Coalesce bursts (e.g. a mass stop) into a single diff
+            while True:
+                try:
+                    pending.append(updates.get_nowait())
+                except queue.Empty:
+                    break
+            for update in pending:
+                if update['type'] == 'operation':
+                    yield f"event: operation\ndata: {json.dumps(update['operation'])}\n\n"
+
+            containers = get_containers(show_all=show_all, request_hostname=request_hostname)
+            if containers is None:
+                continue # Docker hiccup; try again on the next change or heartbeat
+            previous, current = current, {_container_key(c): c for c in containers}
+            diff = _diff_containers(previous, current)
+            if diff['added'] or diff['removed'] or diff['changed']:
+                yield f"event: diff\ndata: {json.dumps(diff)}\n\n"
+    finally:
+        container_updates.unsubscribe('containers', updates)
+
+# Inspect documents and rendered report sections reused between reports
+snapshots = InspectSnapshotCache(max_containers=SNAPSHOT_CACHE_CONTAINERS, max_fragments=SNAPSHOT_CACHE_FRAGMENTS)
+
+# Network, volume, image and host port -> containers, updated by every collection
+topology = TopologyIndex()
+_collection_lock = threading.Lock() # Held by refresh_collection()
+
+# --- Report Job Queue ---
+
+def _announce_queue_positions(positions):
+    """Show each waiting task its place in the queue."""
+    for task_id, position in positions.items():
+        task = tasks.get(task_id)
+        if task is not None and task.get('status') == 'queued':
+            task['message'] = f"Waiting in queue (position {position} of {len(positions)})..."
+
+
+report_queue = JobQueue(workers=REPORT_WORKERS, max_queued=REPORT_QUEUE_SIZE,
+                        on_positions_changed=_announce_queue_positions)
+
+# --- Instrumentation (served at /metrics) ---
+# Docker calls and OpenAI requests are timed in docker_backend.py and ai_report.py.
+
+HTTP_REQUEST_SECONDS = Histogram("http_request_seconds", "Latency of HTTP requests by route",
+                                 ("method", "route", "status"))
+INSPECT_CHUNK_SECONDS = Histogram("inspect_chunk_seconds", "Latency of one batched inspect call of a report")
+INSPECT_CONTAINER_SECONDS = Histogram("inspect_container_seconds",
+                                      "Inspect latency per container (a batch's latency divided by its size)")
+REPORT_STAGE_SECONDS = Histogram("report_stage_seconds", "Time spent in each stage of report generation",
+                                 ("stage",)) # collect, markdown, ai, html and total
+CONTAINER_LIST_REQUESTS = Counter("container_list_requests_total", "Container list lookups by where they were served from",
+                                  ("source",)) # cache, docker or fleet
+CONTAINER_LIST_ERRORS = Counter("container_list_errors_total", "Failed container listings", ("host",))
+PARSE_PORTS_WARNINGS = Counter("parse_ports_warnings_total", "Port strings parse_ports() could not fully parse")
+
+
+def _cache_stats():
+    """(hits, misses) of each cache."""
+    documents = [snapshots, *list(_host_snapshots.values())]
+    stats = {
+        'inspect_snapshot': (sum(c.hits for c in documents), sum(c.misses for c in documents)),
+        'report_fragment': (sum(c.fragment_hits for c in documents), sum(c.fragment_misses for c in documents)),
+        'container_list': (CONTAINER_LIST_REQUESTS.value('cache'), CONTAINER_LIST_REQUESTS.value('docker')),
+    }
+    if _completion_cache is not None:
+        stats['ai_completion'] = (_completion_cache.hits, _completion_cache.misses)
+    if _history is not None:
+        stats['history_object'] = (_history.hits, _history.misses) # Hits are documents already stored
+    return stats
+
+
+Gauge("report_queue_jobs", "Report jobs waiting in or taken from the queue", ("state",),
+      function=lambda: {state: report_queue.stats()[state] for state in ('queued', 'running')})
+Gauge("report_tasks", "Report tasks kept, by status", ("status",), function=lambda: tasks.count_by_status())
+Counter("cache_hits_total", "Cache hits", ("cache",),
+        function=lambda: {cache: hits for cache, (hits, _) in _cache_stats().items()})
+Counter("cache_misses_total", "Cache misses", ("cache",),
+        function=lambda: {cache: misses for cache, (_, misses) in _cache_stats().items()})
+Gauge("cache_hit_ratio", "Share of cache lookups that were hits since startup", ("cache",),
+      function=lambda: {cache: hits / (hits + misses) if hits + misses else None
+                        for cache, (hits, misses) in _cache_stats().items()})
+
 # --- Helper Functions ---
 
+class ContainerInspectError(Exception):
+    """Raised when `docker inspect` fails for a container."""
+    def __init__(self, container_id, error):
+        super().__init__(str(error))
+        self.container_id = container_id
+
+
+def get_fleet():
+    """Return the Fleet of DOCKER_HOSTS, or None when a single host is used."""
+    global _fleet
+    if _fleet is None and DOCKER_HOSTS:
+        with _docker_lock:
+            if _fleet is None:
+                _fleet = Fleet.from_spec(DOCKER_HOSTS, timeout=DOCKER_HOST_TIMEOUT)
+                print(f"Aggregating {len(_fleet.hosts)} Docker hosts: {', '.join(h.name for h in _fleet.hosts)}")
+    return _fleet
+
+
+def get_docker(host=None):
+    """Return the shared Docker backend (Engine API or CLI), creating it on first use.
+
+    In fleet mode this is the backend of the named host (the first one if no
+    host is given); an unknown host name raises KeyError.
+    """
+    global _docker
+    fleet = get_fleet()
+    if fleet is not None:
+        return fleet.get(host).backend if host else fleet.hosts[0].backend
+    if _docker is None:
+        with _docker_lock:
+            if _docker is None:
+                _docker = create_backend()
+                print(f"Using Docker {_docker.name} backend")
+    return _docker
+
+
+def get_completion_cache():
+    """Return the shared AI completion cache, or None if caching is disabled."""
+    global _completion_cache
+    if _completion_cache is None and AI_CACHE_DIR:
+        with _docker_lock:
+            if _completion_cache is None:
+                _completion_cache = CompletionCache(AI_CACHE_DIR, max_entries=AI_CACHE_MAX)
+    return _completion_cache
+
+
+def get_history():
+    """Return the snapshot history, or None if it is disabled."""
+    global _history
+    if _history is None and HISTORY_DIR:
+        with _docker_lock:
+            if _history is None:
+                _history = SnapshotHistory(HISTORY_DIR, keep=HISTORY_KEEP)
+    return _history
+
+
+def check_docker():
+    """Raise DockerError unless Docker answers; in fleet mode one answering host is enough.
+
+    Returns the fleet hosts that failed to answer as {name: error}.
+    """
+    fleet = get_fleet()
+    if fleet is None:
+        get_docker().version()
+        return {}
+    failed = {result.host.name: result.error for result in fleet.map(lambda host: host.backend.version())
+              if result.error}
+    if len(failed) == len(fleet.hosts):
+        raise DockerError("No Docker host answered: " + "; ".join(f"{name}: {error}" for name, error in failed.items()))
+    return failed
+
+
+def get_snapshot_cache(host=None):
+    """The inspect snapshot cache of a fleet host (the shared one for the single host)."""
+    if host is None:
+        return snapshots
+    with _docker_lock:
+        if host.name not in _host_snapshots:
+            _host_snapshots[host.name] = InspectSnapshotCache(max_containers=SNAPSHOT_CACHE_CONTAINERS,
+                                                              max_fragments=SNAPSHOT_CACHE_FRAGMENTS)
+        return _host_snapshots[host.name]
+
+
+class Prefetcher:
+    """Runs an iterator on a background thread, at most `size` items ahead of the consumer.
+
+    Exceptions are re-raised to the consumer; close() stops the thread.
+    """
+    def __init__(self, iterable, size):
+        self._queue = queue.Queue(maxsize=size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._fill, args=(iterable,), name="prefetch", daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fill(self, iterable):
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not self._put((True, item)):
+                    return # Consumer went away
+            self._put((False, None))
+        except BaseException as e:
+            self._put((False, e))
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close() # Runs the generator's cleanup on the thread that ran it
+
+    def __iter__(self):
+        while True:
+            ok, item = self._queue.get()
+            if ok:
+                yield item
+            elif item is None:
+                return
+            else:
+                raise item
+
+    def close(self):
+        self._stop.set()
+
+
+def list_collection_sources():
+    """List the running containers to collect: (listed_at, sources, host results, host errors).
+
+    sources is [(host, container rows)] as collect_container_snapshots() takes
+    it; in fleet mode hosts that failed to answer are left out, with their
+    error in host_errors.
+    """
+    fleet = get_fleet()
+    listed_at = time.time()
+    if fleet is None:
+        return listed_at, [(None, get_docker().list_containers())], [], {}
+    host_results = fleet.map(lambda host: host.backend.list_containers())
+    sources = [(result.host, result.value) for result in host_results if result.error is None]
+    return listed_at, sources, host_results, {result.host.name: result.error for result in host_results if result.error}
+
+
+def export_record(container_info, host_name):
+    return dict(container_fields(container_info), host=host_name)
+
+
+class CollectionUpdate:
+    """Applies one collection to the topology index and the export dataset: add() each container, then commit()."""
+    def __init__(self):
+        self.seen = set()
+        self.dataset = DatasetWriter(EXPORT_DATASET) if EXPORT_DATASET else None
+
+    def add(self, host, container_info, fingerprint):
+        host_name = host.name if host is not None else None
+        topology.update(container_info, fingerprint, host_name)
+        self.seen.add((host_name, container_info.get('Id', '')[:12]))
+        if self.dataset is not None:
+            self.dataset.add(export_record(container_info, host_name))
+
+    def commit(self, sources, host_errors):
+        topology.sync(self.seen, {host.name if host is not None else None for host, _ in sources
+                                  if host is None or host.name not in host_errors})
+        if self.dataset is not None:
+            self.dataset.commit()
+
+    def close(self):
+        if self.dataset is not None:
+            self.dataset.close()
+
+
+def refresh_collection(is_fresh=None):
+    """Collect without a report: update the topology index and the export dataset.
+
+    Unchanged containers come from the snapshot cache and are skipped by the
+    index, so this inspects only what changed. is_fresh() is checked once the
+    lock is held, so concurrent callers wait for one collection instead of
+    each running their own.
+    """
+    with _collection_lock:
+        if is_fresh is not None and is_fresh():
+            return
+        listed_at, sources, _, host_errors = list_collection_sources()
+        update = CollectionUpdate()
+        try:
+            for host, container_info, fingerprint in collect_container_snapshots(sources, listed_at, None, host_errors):
+                update.add(host, container_info, fingerprint)
+            update.commit(sources, host_errors)
+        finally:
+            update.close()
+
+
+def collect_container_snapshots(sources, listed_at, task_id, host_errors):
+    """Yield (host, inspect object, state fingerprint) for the listed containers, host by host.
+
+    sources is [(host, container rows)], with host None for the single host.
+    Fleet hosts are collected concurrently, each at most a chunk of containers
+    ahead of the report writer; a host whose inspection fails is recorded in
+    host_errors and left out instead of failing the whole report.
+    """
+    if sources and sources[0][0] is None:
+        _, rows = sources[0]
+        for container_info, fingerprint in snapshots.collect(
+                get_docker(), rows, listed_at, lambda ids: iter_inspected_containers(ids, task_id=task_id)):
+            yield None, container_info, fingerprint
+        return
+
+    streams = []
+    for host, rows in sources:
+        inspect = lambda ids, backend=host.backend: iter_inspected_containers(ids, task_id=task_id, backend=backend)
+        streams.append((host, Prefetcher(get_snapshot_cache(host).collect(host.backend, rows, listed_at, inspect),
+                                         size=INSPECT_CHUNK_SIZE)))
+    try:
+        for host, stream in streams:
+            try:
+                for container_info, fingerprint in stream:
+                    yield host, container_info, fingerprint
+            except (ContainerInspectError, DockerError, RuntimeError) as e:
+                print(f"Warning: Inspecting containers on {host.name} failed: {e}")
+                host_errors[host.name] = f"inspect failed: {e}"
+    finally:
+        for _, stream in streams:
+            stream.close()
+
+
+def _inspect_chunk(container_ids, backend=None):
+    """Inspect a chunk of containers with a single backend call."""
+    start = time.perf_counter()
+    try:
+        return (backend or get_docker()).inspect(container_ids)
+    except DockerError as e:
+        raise ContainerInspectError(e.container_id or container_ids[0], e)
+    finally:
+        elapsed = time.perf_counter() - start
+        INSPECT_CHUNK_SECONDS.observe(elapsed)
+        INSPECT_CONTAINER_SECONDS.observe(elapsed / len(container_ids))
+
+
+def iter_inspected_containers(container_ids, task_id=None, chunk_size=None, workers=None, backend=None):
+    """Inspect containers in chunked bulk `docker inspect` calls run on a thread pool.
+
+    Yields the inspect objects in the order of container_ids. At most `workers`
+    chunks are in flight at a time, so memory use doesn't grow with the number
+    of containers. If task_id is given, per-chunk progress is written to
+    tasks[task_id]['message']. backend defaults to get_docker().
+    """
+    chunk_size = max(1, chunk_size or INSPECT_CHUNK_SIZE)
+    workers = max(1, workers or INSPECT_WORKERS)
+    container_ids = [c for c in container_ids if c] # Skip empty lines
+    chunks = [container_ids[i:i + chunk_size] for i in range(0, len(container_ids), chunk_size)]
+    if not chunks:
+        return
+
+    inspected_count = 0
+    with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        pending = deque()
+        next_chunk = 0
+        try:
+            for chunks_done in range(1, len(chunks) + 1):
+                # Keep up to `workers` chunks in flight ahead of the consumer
+                while next_chunk < len(chunks) and len(pending) < workers:
+                    pending.append(executor.submit(_inspect_chunk, chunks[next_chunk], backend))
+                    next_chunk += 1
+                chunk_result = pending.popleft().result()
+                inspected_count += len(chunk_result)
+                if task_id is not None:
+                    check_task_cancelled(task_id)
+                    tasks[task_id]['message'] = (f"Collecting Docker container information... "
+                                                 f"inspected {inspected_count}/{len(container_ids)} containers "
+                                                 f"({chunks_done}/{len(chunks)} batches)")
+                yield from chunk_result
+        finally:
+            for future in pending:
+                future.cancel() # Don't start chunks that are still queued (error, cancel or abandoned)
+
+
+def inspect_containers(container_ids, task_id=None, chunk_size=None, workers=None):
+    """Like iter_inspected_containers(), but returns all inspect objects as a list."""
+    return list(iter_inspected_containers(container_ids, task_id=task_id, chunk_size=chunk_size, workers=workers))
+
+
+def container_fields(container_info):
+    """Extracts the report fields from a `docker inspect` document, as lists, numbers and None."""
+    # Extract ports
+    ports_dict = container_info.get('NetworkSettings', {}).get('Ports', {})
+    ports_list = []
+    for container_port, host_bindings in ports_dict.items():
+        if host_bindings:
+            for binding in host_bindings:
+                ports_list.append(f"{container_port} -> {binding.get('HostIp', '0.0.0.0')}:{binding.get('HostPort', 'N/A')}")
+        else:
+             ports_list.append(f"{container_port} (no host binding)")
+
+    # Extract mounts
+    mounts_list = []
+    for mount in container_info.get('Mounts', []):
+        mount_str = f"{mount.get('Source', 'N/A')} -> {mount.get('Destination', 'N/A')} ({mount.get('Type', 'N/A')}"
+        if not mount.get('RW', True):
+            mount_str += ", ro"
+        mount_str += ")"
+        mounts_list.append(mount_str)
+
+    host_config = container_info.get('HostConfig', {})
+    labels = container_info.get('Config', {}).get('Labels', {}) or {}
+    return {
+        'id': container_info.get('Id', 'N/A')[:12], # Short ID
+        'name': container_info.get('Name', 'N/A').lstrip('/'),
+        'image': container_info.get('Config', {}).get('Image', 'N/A'),
+        'created': container_info.get('Created', 'N/A'),
+        'status': container_info.get('State', {}).get('Status', 'N/A'),
+        'ports': ports_list,
+        'networks': list((container_info.get('NetworkSettings', {}).get('Networks') or {}).keys()),
+        'mounts': mounts_list,
+        # Environment variables (excluding potentially sensitive ones is safer for basic report)
+        'env': container_info.get('Config', {}).get('Env') or [],
+        'cpu_shares': host_config.get('CpuShares'),
+        'memory_limit': host_config.get('Memory') or None, # In bytes; 0 is no limit
+        # Docker Compose labels
+        'compose_project': labels.get('com.docker.compose.project'),
+        'compose_service': labels.get('com.docker.compose.service'),
+        'labels': labels,
+    }
+
+
+def extract_container_details(container_info):
+    """The report fields of a `docker inspect` document, formatted for the basic report."""
+    fields = container_fields(container_info)
+    memory_limit = fields['memory_limit']
+    return {
+        'id': fields['id'],
+        'name': fields['name'],
+        'image': fields['image'],
+        'created': fields['created'],
+        'status': fields['status'],
+        'ports': ", ".join(fields['ports']) if fields['ports'] else "None",
+        'networks': ", ".join(fields['networks']) if fields['networks'] else "None",
+        'mounts': "\n".join(fields['mounts']) if fields['mounts'] else "No volumes mounted.",
+        'env_vars': "\n".join(fields['env']) if fields['env'] else "No environment variables set.",
+        'cpu_shares': fields['cpu_shares'] if fields['cpu_shares'] is not None else 'N/A',
+        'memory_limit': f"{memory_limit / (1024*1024):.2f} MiB" if memory_limit else "N/A",
+        'compose_project': fields['compose_project']
+    }
+
+
+def render_container_section(details):
+    """Renders the markdown section of one container in the basic report."""
+    return (
+        f"### Container: {details['name']} ({details['id']})\n"
+        f"- **Image**: {details['image']}\n"
+        f"- **Created**: {details['created']}\n"
+        f"- **Status**: {details['status']}\n"
+        f"- **Ports**: {details['ports']}\n"
+        f"- **Networks**: {details['networks']}\n\n"
+        "#### Volumes\n"
+        "```\n"
+        f"{details['mounts']}"
+        "\n```\n\n"
+        "#### Environment Variables\n"
+        "```\n"
+        f"{details['env_vars']}"
+        "\n```\n\n"
+        "#### Resource Limits\n"
+        f"- CPU Shares: {details['cpu_shares']}\n"
+        f"- Memory Limit: {details['memory_limit']}\n\n"
+    )
+
+
+def render_container_fragment(container_info):
+    """Report fragment of one container: its markdown section and compose grouping."""
+    details = extract_container_details(container_info)
+    return {
+        'markdown': render_container_section(details),
+        'compose_project': details['compose_project'],
+        'label': f"{details['name']} ({details['id']})"
+    }
+
+
+def check_task_cancelled(task_id):
+    """Raise JobCancelled if the task was cancelled, here or (through the task store) by another worker process."""
+    if tasks.cancel_requested(task_id):
+        report_queue.cancel(task_id)
+    report_queue.check_cancelled(task_id)
+
+
 def run_docker_info(task_id, use_openai):
     """Run the Docker info collection and report generation in the background"""
     try:
+        check_task_cancelled(task_id) # Cancelled by another worker while queued here
         # Create temp directory for this task
         task_dir = tempfile.mkdtemp(prefix=f"docker_info_{task_id}_")
         json_file = os.path.join(task_dir, "containers_info.json")
         markdown_file = os.path.join(task_dir, "docker_containers_info.md")
+        index_file = os.path.join(task_dir, "docker_containers_info.idx")
+        tasks[task_id]['task_dir'] = task_dir # Deleted when the task is evicted
         
         # Update task status
         tasks[task_id]['status'] = 'collecting'
         tasks[task_id]['message'] = 'Collecting Docker container information...'
         
-        # Get all running containers
-        containers = subprocess.check_output(["docker", "ps", "--format", "{{.ID}}"]).decode().strip().split('\n')
-        if not containers or containers == ['']:
+        # Get all running containers (of every host, concurrently, in fleet mode)
+        collect_started = time.perf_counter()
+        fleet = get_fleet()
+        listed_at, sources, host_results, host_errors = list_collection_sources()
+        if not any(rows for _, rows in sources):
             tasks[task_id]['status'] = 'error'
-            tasks[task_id]['message'] = 'No running containers found.'
+            tasks[task_id]['message'] = 'No running containers found.' + "".join(
+                f" Host {name} failed: {error}." for name, error in host_errors.items())
             return
 
-        # Collect information for each container
-        all_container_info = []
-        for container_id in containers:
-            if container_id:  # Skip empty lines
-                try:
-                    # docker inspect outputs a JSON array with one element
-                    inspect_output = subprocess.check_output(["docker", "inspect", container_id]).decode()
-                    container_info_list = json.loads(inspect_output)
-                    if container_info_list: # Check if the list is not empty
-                        all_container_info.append(container_info_list[0]) # Append the actual object
-                except (subprocess.SubprocessError, json.JSONDecodeError) as inspect_error:
-                    tasks[task_id]['status'] = 'error'
-                    tasks[task_id]['message'] = f"Error inspecting container {container_id}: {str(inspect_error)}"
-                    return # Stop processing if inspection fails for one container
-
-        # Write the collected info as a proper JSON array
+        # Collect, write and render one container at a time: unchanged containers
+        # come from the snapshot cache, the rest are inspected in batched `docker
+        # inspect` calls. Each inspect document is written to the JSON file and its
+        # section to a scratch file, then dropped, so memory use does not grow with
+        # the number of containers.
+        sections_file = os.path.join(task_dir, "sections.md.tmp")
+        compose_projects = {}
+        section_offsets = [] # Byte offset of each container section in sections_file
+        container_count = 0
+        host_counts = {} # Host name -> (containers, compose projects), in fleet mode
+        ai_records = [] if use_openai else None # Just the fields the AI report uses
+        history = get_history()
+        history_snapshot = history.begin() if history is not None else None
+        indexed = set() # (host, short ID) of the containers collected, for the topology index
+        dataset = DatasetWriter(EXPORT_DATASET) if EXPORT_DATASET else None
         try:
-            with open(json_file, 'w') as f:
-                json.dump(all_container_info, f, indent=2) # Use indent for readability (optional)
+            snapshot = collect_container_snapshots(sources, listed_at, task_id, host_errors)
+            with open(json_file, 'w') as json_out, open(sections_file, 'wb') as sections_out:
+                json_out.write('[')
+                current_host = None
+                for host, container_info, fingerprint in snapshot:
+                    check_task_cancelled(task_id)
+                    # Same layout as json.dump(all_container_info, f, indent=2)
+                    json_out.write(',\n  ' if container_count else '\n  ')
+                    document = container_info if host is None else dict(container_info, DockerHost=host.name)
+                    json_out.write(json.dumps(document, indent=2).replace('\n', '\n  '))
+                    if ai_records is not None:
+                        record = project_container(container_info)
+                        if host is not None:
+                            record['host'] = host.name
+                        ai_records.append(record)
+                    host_name = host.name if host is not None else None
+                    topology.update(container_info, fingerprint, host_name)
+                    indexed.add((host_name, container_info.get('Id', '')[:12]))
+                    if dataset is not None:
+                        dataset.add(export_record(container_info, host_name))
+                    if history_snapshot is not None:
+                        try:
+                            history_snapshot.add(container_info, host_name)
+                        except OSError as e: # The report doesn't depend on the history
+                            print(f"Warning: Not saving this collection to the snapshot history: {e}")
+                            history_snapshot = None
+
+                    # Sections of containers whose state fingerprint is unchanged are reused
+                    cache = get_snapshot_cache(host)
+                    fragment = cache.fragment(fingerprint, lambda: render_container_fragment(container_info))
+                    section_offsets.append(sections_out.tell())
+                    if host is not None and host is not current_host:
+                        # Each host's containers are grouped under a section of their own
+                        current_host = host
+                        sections_out.write(f"## Host: {host.name}\n- **Endpoint**: {host.endpoint}\n\n".encode())
+                    sections_out.write(fragment['markdown'].encode())
+
+                    # Check for Docker Compose label
+                    project_name = fragment['compose_project']
+                    if project_name:
+                        if project_name not in compose_projects:
+                            compose_projects[project_name] = []
+                        compose_projects[project_name].append(
+                            fragment['label'] if host is None else f"{fragment['label']} on {host.name}")
+                    if host is not None:
+                        count, projects = host_counts.setdefault(host.name, (0, set()))
+                        host_counts[host.name] = (count + 1, projects | ({project_name} if project_name else set()))
+                    container_count += 1
+                json_out.write('\n]')
+            # Hosts whose inspection failed keep their previous entries
+            collected_hosts = {host.name if host is not None else None for host, _ in sources
+                               if host is None or host.name not in host_errors}
+            topology.sync(indexed, collected_hosts)
+            if dataset is not None:
+                dataset.commit()
+            if history_snapshot is not None:
+                try:
+                    tasks[task_id]['snapshot_id'] = history_snapshot.commit(task_id=task_id, host_errors=host_errors)['id']
+                except OSError as e:
+                    print(f"Warning: Could not save the snapshot history: {e}")
+        except ContainerInspectError as inspect_error:
+            tasks[task_id]['status'] = 'error'
+            tasks[task_id]['message'] = f"Error inspecting container {inspect_error.container_id}: {str(inspect_error)}"
+            return # Stop processing if inspection fails for one container
         except IOError as write_error:
              tasks[task_id]['status'] = 'error'
              tasks[task_id]['message'] = f"Error writing container info to file: {str(write_error)}"
              return
+        finally:
+            if dataset is not None:
+                dataset.close() # Discarded unless committed (error or cancelled)
+        REPORT_STAGE_SECONDS.observe(time.perf_counter() - collect_started, 'collect')
 
         # Update task status
+        check_task_cancelled(task_id)
         tasks[task_id]['status'] = 'generating'
         tasks[task_id]['message'] = 'Generating basic markdown report...' # Start with basic report message
 
         # --- Basic Report Generation (Always Run First) ---
-        compose_projects = {}
-        container_details_for_report = []
-
-        # Process collected container info for the basic report
-        for container_info in all_container_info:
-            container_id = container_info.get('Id', 'N/A')[:12] # Short ID
-            name = container_info.get('Name', 'N/A').lstrip('/')
-            image = container_info.get('Config', {}).get('Image', 'N/A')
-            created = container_info.get('Created', 'N/A')
-            status = container_info.get('State', {}).get('Status', 'N/A')
-
-            # Extract ports
-            ports_dict = container_info.get('NetworkSettings', {}).get('Ports', {})
-            ports_list = []
-            for container_port, host_bindings in ports_dict.items():
-                if host_bindings:
-                    for binding in host_bindings:
-                        ports_list.append(f"{container_port} -> {binding.get('HostIp', '0.0.0.0')}:{binding.get('HostPort', 'N/A')}")
-                else:
-                     ports_list.append(f"{container_port} (no host binding)")
-            ports = ", ".join(ports_list) if ports_list else "None"
-
-            # Extract networks
-            networks_dict = container_info.get('NetworkSettings', {}).get('Networks', {})
-            networks = ", ".join(networks_dict.keys()) if networks_dict else "None"
-
-            # Extract mounts
-            mounts_list = []
-            for mount in container_info.get('Mounts', []):
-                mount_str = f"{mount.get('Source', 'N/A')} -> {mount.get('Destination', 'N/A')} ({mount.get('Type', 'N/A')}"
-                if not mount.get('RW', True):
-                    mount_str += ", ro"
-                mount_str += ")"
-                mounts_list.append(mount_str)
-            mounts_str = "\n".join(mounts_list) if mounts_list else "No volumes mounted."
-
-            # Extract environment variables (excluding potentially sensitive ones is safer for basic report)
-            env_vars = container_info.get('Config', {}).get('Env', [])
-            env_vars_str = "\n".join(env_vars) if env_vars else "No environment variables set."
-            # Consider filtering sensitive vars here if needed
-
-            # Extract resource limits
-            host_config = container_info.get('HostConfig', {})
-            cpu_shares = host_config.get('CpuShares', 'N/A')
-            memory_limit = host_config.get('Memory', 0) # In bytes
-            memory_limit_str = f"{memory_limit / (1024*1024):.2f} MiB" if memory_limit else "N/A"
-
-            # Store details for report generation
-            container_details_for_report.append({
-                'id': container_id,
-                'name': name,
-                'image': image,
-                'created': created,
-                'status': status,
-                'ports': ports,
-                'networks': networks,
-                'mounts': mounts_str,
-                'env_vars': env_vars_str,
-                'cpu_shares': cpu_shares,
-                'memory_limit': memory_limit_str
-            })
-
-            # Check for Docker Compose label
-            labels = container_info.get('Config', {}).get('Labels', {})
-            project_name = labels.get('com.docker.compose.project')
-            if project_name:
-                if project_name not in compose_projects:
-                    compose_projects[project_name] = []
-                compose_projects[project_name].append(f"{name} ({container_id})")
-
-
-        # Write the basic markdown report (always, using 'w' mode)
+        # Write the basic markdown report: the header needs the totals, so it is
+        # written first and the container sections are copied in after it
+        markdown_started = time.perf_counter()
         try:
-            with open(markdown_file, 'w') as f:
-                f.write(f"# Docker Containers Report (Basic)\n")
-                f.write(f"**Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}**\n\n")
-
-                f.write("## Summary\n")
-                f.write(f"Total running containers: {len(all_container_info)}\n\n")
+            with open(markdown_file, 'wb') as f:
+                header = [f"# Docker Containers Report (Basic)\n",
+                          f"**Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}**\n\n",
+                          "## Summary\n",
+                          f"Total running containers: {container_count}\n\n"]
+
+                # Live usage next to the static limits, if the metrics sampler has been running
+                usage = _metrics_sampler.usage_summary() if _metrics_sampler is not None else []
+                if usage:
+                    header.append("## Resource Usage\n")
+                    header.append(f"Average over the last hour, top {min(len(usage), 10)} containers by CPU:\n\n")
+                    header.append("| Container | CPU | Memory | Memory Limit |\n|-----------|-----|--------|--------------|\n")
+                    for entry in usage[:10]:
+                        cpu = f"{entry['cpu_percent']:.2f}%" if entry['cpu_percent'] is not None else "N/A"
+                        memory = f"{entry['memory_usage'] / (1024*1024):.2f} MiB" if entry['memory_usage'] is not None else "N/A"
+                        limit = f"{entry['memory_limit'] / (1024*1024):.2f} MiB" if entry['memory_limit'] else "N/A"
+                        header.append(f"| {entry['name']} ({entry['id']}) | {cpu} | {memory} | {limit} |\n")
+                    header.append("\n")
+
+                # Per-host overview in fleet mode, failed hosts included
+                if fleet is not None:
+                    header.append("## Fleet Summary\n")
+                    header.append(f"Hosts reporting: {len(fleet.hosts) - len(host_errors)} of {len(fleet.hosts)}\n\n")
+                    header.append("| Host | Endpoint | Status | Containers | Compose Projects |\n"
+                                  "|------|----------|--------|------------|------------------|\n")
+                    elapsed = {result.host.name: result.elapsed for result in host_results}
+                    for host in fleet.hosts:
+                        count, projects = host_counts.get(host.name, (0, set()))
+                        status = f"Error: {host_errors[host.name]}" if host.name in host_errors else f"OK ({elapsed[host.name]:.2f}s)"
+                        header.append(f"| {host.name} | {host.endpoint} | {status.replace('|', '/')} | {count} | "
+                                      f"{', '.join(sorted(projects)) or '-'} |\n")
+                    header.append("\n")
 
                 # Add Docker Compose Projects section if any were found
                 if compose_projects:
-                    f.write("## Docker Compose Projects\n\n")
+                    header.append("## Docker Compose Projects\n\n")
                     for project, project_containers in compose_projects.items():
-                        f.write(f"### Project: {project}\n")
+                        header.append(f"### Project: {project}\n")
                         for container_name_id in project_containers:
-                            f.write(f"- {container_name_id}\n")
-                        f.write("\n")
-
-                f.write("## Container Details\n\n")
-
-                for details in container_details_for_report:
-                    f.write(f"### Container: {details['name']} ({details['id']})\n")
-                    f.write(f"- **Image**: {details['image']}\n")
-                    f.write(f"- **Created**: {details['created']}\n")
-                    f.write(f"- **Status**: {details['status']}\n")
-                    f.write(f"- **Ports**: {details['ports']}\n")
-                    f.write(f"- **Networks**: {details['networks']}\n\n")
-
-                    f.write("#### Volumes\n")
-                    f.write("```\n")
-                    f.write(details['mounts'])
-                    f.write("\n```\n\n")
-
-                    f.write("#### Environment Variables\n")
-                    f.write("```\n")
-                    f.write(details['env_vars'])
-                    f.write("\n```\n\n")
-
-                    f.write("#### Resource Limits\n")
-                    f.write(f"- CPU Shares: {details['cpu_shares']}\n")
-                    f.write(f"- Memory Limit: {details['memory_limit']}\n\n")
-
-            # Basic report generated, update status before potentially trying AI
-            tasks[task_id]['status'] = 'completed' # Tentative status
-            tasks[task_id]['message'] = 'Basic report generated successfully.'
+                            header.append(f"- {container_name_id}\n")
+                        header.append("\n")
+
+                # Networks, volumes, images and published ports, from the topology index
+                header.append(topology.markdown(hosts=collected_hosts, max_names=TOPOLOGY_REPORT_NAMES))
+
+                if fleet is None:
+                    header.append("## Container Details\n\n") # In fleet mode each host has its own section
+                f.write("".join(header).encode())
+
+                details_start = f.tell()
+                with open(sections_file, 'rb') as sections_in:
+                    shutil.copyfileobj(sections_in, f)
+            os.remove(sections_file)
+
+            # Section offsets let /view page through the report without reading it whole
+            with open(index_file, 'w') as f:
+                json.dump({'sections': [details_start + offset for offset in section_offsets]}, f)
+            REPORT_STAGE_SECONDS.observe(time.perf_counter() - markdown_started, 'markdown')
+
+            # Basic report generated. It is only the final result if no AI step
+            # follows; otherwise the task moves straight on to 'generating_ai'.
             tasks[task_id]['file_path'] = markdown_file
+            tasks[task_id]['index_path'] = index_file
+            if not use_openai:
+                if host_errors:
+                    complete_report(task_id, f'Basic report generated; {len(host_errors)} of {len(fleet.hosts)} hosts failed (see the Fleet Summary).')
+                else:
+                    complete_report(task_id, 'Basic report generated successfully.')
 
         except IOError as write_error:
              tasks[task_id]['status'] = 'error'
@@ -197,65 +984,47 @@ def run_docker_info(task_id, use_openai):
 
         # --- AI Enhanced Report Generation (Optional) ---
         if use_openai:
+            check_task_cancelled(task_id)
             tasks[task_id]['status'] = 'generating_ai' # More specific status
             tasks[task_id]['message'] = 'Basic report generated. Now generating AI enhanced report...'
 
             if not OPENAI_API_KEY:
-                tasks[task_id]['status'] = 'completed' # Revert to completed as AI cannot run
-                tasks[task_id]['message'] = 'Basic report generated. OpenAI API key not configured, skipping AI enhancement.'
+                complete_report(task_id, 'Basic report generated. OpenAI API key not configured, skipping AI enhancement.')
                 return # Return here as AI part is skipped
             else:
                 try:
-                    # Initialize OpenAI client
-                    client = openai.OpenAI(api_key=OPENAI_API_KEY)
-
-                    # Create prompt
-                    with open(json_file, 'r') as f:
-                        json_data = f.read()
-
-                    system_prompt = "You are an expert assistant specialized in analyzing Docker container configurations and generating clear, concise markdown reports."
-                    user_prompt = f"""Create a comprehensive markdown report about Docker containers from the following JSON data.
-Include sections for:
-1. Executive Summary (count of containers, unique images used, common networks, etc.)
-2. Detailed Container Information:
-   Present this information in a markdown table with the following columns:
-   | Name | Short ID | Image | Status | Ports | Networks | Mounts |
-   |------|----------|-------|--------|-------|----------|--------|
-   Use the first 12 characters for the 'Short ID'. For the 'Ports', 'Networks', and 'Mounts' columns, summarize the information concisely. Use backticks (`) around complex entries if needed to prevent breaking the table structure (e.g., `port1 -> host:port1, port2 -> host:port2`).
-3. Network Configuration Summary (List networks and connected containers)
-4. Volume Mounts Summary (List volumes/bind mounts and containers using them)
-5. Resource Usage and Limits (If available in data)
-6. Environment Variables (Mention sensitive variables should be handled carefully, list non-sensitive ones if appropriate, or just summarize their presence)
-7. Health Checks (If configured)
-8. Security Considerations (Based on exposed ports, capabilities, user, etc. - provide general advice)
-
-Format the markdown to be well-structured with proper headings, tables (for structured data like ports/mounts), and code blocks where appropriate. Focus on clarity and readability.
-
-JSON data:
-```json
-{json_data}
-```"""
-
-                    # Make request to OpenAI API
-                    completion = client.chat.completions.create(
-                        model=OPENAI_MODEL,
-                        messages=[
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": user_prompt}
-                        ],
-                        temperature=0.5, # Adjust creativity/factuality
-                        timeout=180
-                    )
-
-                    # Extract response and append to file
-                    if completion.choices and completion.choices[0].message:
-                        report_content = completion.choices[0].message.content
+                    def make_generator(client):
+                        return AIReportGenerator(client, OPENAI_MODEL, token_budget=AI_TOKEN_BUDGET,
+                                                 workers=AI_WORKERS, max_retries=AI_MAX_RETRIES,
+                                                 cache=get_completion_cache())
+
+                    def progress(message):
+                        tasks[task_id]['message'] = message
+
+                    def check_cancelled():
+                        check_task_cancelled(task_id)
+
+                    async def generate_async():
+                        async with openai.AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0) as client:
+                            return await make_generator(client).agenerate(ai_records, check_cancelled=check_cancelled,
+                                                                          progress=progress)
+
+                    with REPORT_STAGE_SECONDS.time('ai'):
+                        if ASYNC_OPENAI:
+                            report_content = asyncio.run(generate_async())
+                        else:
+                            # Initialize OpenAI client; retries on rate limits are done with our own backoff
+                            client = openai.OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0)
+                            report_content = make_generator(client).generate(ai_records, check_cancelled=check_cancelled,
+                                                                             progress=progress)
+
+                    # Append the response to the file
+                    if report_content:
                         try:
                             with open(markdown_file, 'a') as f: # Open in append mode
                                 f.write("\n\n---\n\n# AI Enhanced Report\n\n") # Add separator
                                 f.write(report_content)
-                            tasks[task_id]['status'] = 'completed'
-                            tasks[task_id]['message'] = f'Basic report and AI enhanced report ({OPENAI_MODEL}) generated successfully.'
+                            complete_report(task_id, f'Basic report and AI enhanced report ({OPENAI_MODEL}) generated successfully.')
                             # file_path is already set
                             return # Task fully completed
                         except IOError as append_error:
@@ -264,10 +1033,11 @@ JSON data:
                             return
                     else:
                         # AI returned empty response, but basic report is done
-                        tasks[task_id]['status'] = 'completed'
-                        tasks[task_id]['message'] = 'Basic report generated. OpenAI API returned an empty response for enhancement.'
+                        complete_report(task_id, 'Basic report generated. OpenAI API returned an empty response for enhancement.')
                         return
 
+                except JobCancelled:
+                    raise # Not an AI failure: the outer handler marks the task cancelled
                 except openai.APIError as e:
                     error_msg = f"OpenAI API Error: {e}"
                 except openai.AuthenticationError:
@@ -278,139 +1048,610 @@ JSON data:
                     error_msg = f'Error during OpenAI report generation: {str(e)}'
 
                 # If any OpenAI exception occurred, update status but basic report is still available
-                tasks[task_id]['status'] = 'completed' # Mark as completed as basic report exists
-                tasks[task_id]['message'] = f'Basic report generated. AI enhancement failed: {error_msg}.'
+                complete_report(task_id, f'Basic report generated. AI enhancement failed: {error_msg}.')
                 return # Return as AI part failed
 
         # If use_openai was false, the function implicitly returns here
         # as the basic report generation already set status to 'completed'.
 
+    except JobCancelled:
+        if tasks[task_id]['status'] not in FINISHED_STATUSES: # A delivered report stays completed
+            tasks[task_id]['status'] = 'cancelled'
+            tasks[task_id]['message'] = 'Report generation was cancelled.'
     except Exception as e:
         # Catch-all for errors before or during basic report generation
         tasks[task_id]['status'] = 'error'
         tasks[task_id]['message'] = f"Error: {str(e)}"
 
+
+def run_report_job(task_id, use_openai, profile=False):
+    """Report job run by the queue: run_docker_info(), timed and, if asked to, under cProfile.
+
+    The profile covers the job's own thread (not the inspect worker threads)
+    and is saved as profile.pstats in the report directory.
+    """
+    profiler = cProfile.Profile() if profile else None
+    with REPORT_STAGE_SECONDS.time('total'):
+        if profiler is not None:
+            profiler.runcall(run_docker_info, task_id, use_openai)
+        else:
+            run_docker_info(task_id, use_openai)
+    task = tasks.get(task_id)
+    if profiler is not None and task is not None and os.path.isdir(task.get('task_dir') or ''):
+        profile_path = os.path.join(task['task_dir'], "profile.pstats")
+        profiler.dump_stats(profile_path)
+        task['profile_path'] = profile_path
+
+def read_report_page(task, page):
+    """Return (markdown, page, pages) for one page of a task's report.
+
+    Pages are cut at container section boundaries recorded in the report's
+    index file: the first page starts with the report header and the last one
+    runs to the end of the file (including any AI enhanced report). Reports
+    without an index are shown as a single page.
+    """
+    offsets = []
+    try:
+        with open(task['index_path'], 'r') as f:
+            offsets = json.load(f)['sections']
+    except (KeyError, OSError, ValueError):
+        pass
+    # Page boundaries: every VIEW_PAGE_SIZE-th section after the first page's
+    boundaries = offsets[VIEW_PAGE_SIZE::VIEW_PAGE_SIZE]
+    pages = len(boundaries) + 1
+    page = min(max(page, 1), pages)
+    start = boundaries[page - 2] if page > 1 else 0
+    end = boundaries[page - 1] if page < pages else None
+    with open(task['file_path'], 'rb') as f:
+        f.seek(start)
+        content = f.read() if end is None else f.read(end - start)
+    return content.decode(errors='replace'), page, pages
+
+def report_html_path(task, page):
+    """Path of the cached HTML of one report page (a .gz copy sits next to it)."""
+    return os.path.join(task['task_dir'], f"docker_containers_info.page-{page}.html")
+
+
+def _write_file_atomically(path, data):
+    # Viewers never see a half-written file, even while a report is re-rendered
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def render_report_html(task_id):
+    """Render a task's report to HTML once, page by page, and cache it next to the markdown.
+
+    Also writes docker_containers_info.html.json with the page count and the
+    page each heading anchor is on, used by /view?section=<anchor>.
+    """
+    task = tasks[task_id]
+    anchors = {}
+    page, pages = 1, 1
+    while page <= pages:
+        content, page, pages = read_report_page(task, page)
+        html, heading_ids = markdown_to_html(content)
+        for anchor in heading_ids:
+            anchors.setdefault(anchor, page)
+        with app.test_request_context(): # The page outlives the request; its links are built against APPLICATION_ROOT
+            document = render_template('view.html', content=html, task_id=task_id, page=page, pages=pages).encode()
+        path = report_html_path(task, page)
+        _write_file_atomically(path, document)
+        _write_file_atomically(f"{path}.gz", gzip.compress(document, compresslevel=6))
+        page += 1
+    _write_file_atomically(os.path.join(task['task_dir'], "docker_containers_info.html.json"),
+                           json.dumps({'pages': pages, 'anchors': anchors}).encode())
+
+
+def complete_report(task_id, message):
+    """Render the finished report to HTML, then mark the task completed (later cancels are ignored)."""
+    try:
+        with REPORT_STAGE_SECONDS.time('html'):
+            render_report_html(task_id)
+    except Exception as e:
+        # /view renders on demand if the cached HTML is missing
+        print(f"Warning: Could not render report {task_id} to HTML: {e}")
+    tasks[task_id]['status'] = 'completed'
+    tasks[task_id]['message'] = message
+
+
+# Note: request_hostname should only be passed when called from a request context
+def parse_ports(ports_str, request_hostname=None):
+    """Parses the port string from docker ps into structured data, avoiding duplicate links."""
+    parsed = []
+    linked_host_ports = set() # Track host ports already linked via wildcard
+
+    if not ports_str:
+        return parsed
+
+    # Example: "0.0.0.0:8080->80/tcp, :::8080->80/tcp, 6379/tcp"
+    parts = ports_str.split(',')
+    for part in parts:
+        part = part.strip()
+        port_info = {'host_ip': None, 'host_port': None, 'container_port': None, 'protocol': None, 'link': None}
+        
+        if '->' in part: # Host binding exists
+            host_part, container_part = part.split('->')
+            
+            # Extract container port/protocol
+            if '/' in container_part:
+                port_info['container_port'], port_info['protocol'] = container_part.split('/')
+            else:
+                port_info['container_port'] = container_part # Protocol might be missing? Default?
+                port_info['protocol'] = 'tcp' # Assume tcp if missing
+
+            # Extract host IP/port by splitting at the last colon
+            last_colon_index = host_part.rfind(':')
+            if last_colon_index != -1:
+                port_info['host_ip'] = host_part[:last_colon_index]
+                port_info['host_port'] = host_part[last_colon_index+1:]
+
+                # Only create links for ports bound to 0.0.0.0 or :: (likely reachable)
+                if port_info['host_ip'] in ['0.0.0.0', '::']:
+                    # Use request hostname if available, otherwise default to localhost
+                    host_link_ip = request_hostname if request_hostname else 'localhost'
+
+                    # Create link only if host port is valid AND not already linked via wildcard
+                    if port_info['host_port'].isdigit():
+                        host_port_num = port_info['host_port']
+                        # Check if this host port has already been linked via 0.0.0.0 or ::
+                        if host_port_num not in linked_host_ports:
+                            port_info['link'] = f"http://{host_link_ip}:{host_port_num}"
+                            linked_host_ports.add(host_port_num) # Mark this host port as linked
+                        # else: Link already created for this host port via the other wildcard IP
+                    else:
+                        PARSE_PORTS_WARNINGS.inc()
+                        print(f"Warning: Non-numeric host port detected for reachable binding: {port_info['host_port']} in {host_part}")
+                # else: Port is bound to a specific IP (e.g., 127.0.0.1), so don't create a link
+
+            else: # No colon found, might be just IP or hostname? Unlikely for port mapping.
+                PARSE_PORTS_WARNINGS.inc()
+                print(f"Warning: Could not find colon to separate host IP and port in: {host_part}")
+                # Assign the whole part as IP, port remains None
+                port_info['host_ip'] = host_part
+
+
+        else: # Only container port exposed (e.g., "6379/tcp")
+             if '/' in part:
+                port_info['container_port'], port_info['protocol'] = part.split('/')
+             else:
+                port_info['container_port'] = part
+                port_info['protocol'] = 'tcp' # Assume tcp
+
+        parsed.append(port_info)
+    return parsed
+
+
+def _simplify_container(container_data, request_hostname=None):
+    """Turns a `docker ps` JSON row into the dict used by the frontend."""
+    return {
+        'id': container_data.get('ID'),
+        'name': container_data.get('Names'),
+        'image': container_data.get('Image'),
+        'status': container_data.get('Status'),
+        'state': container_data.get('State'), # e.g., 'running', 'exited',
+        'created': _created_timestamp(container_data.get('CreatedAt')),
+        'ports_raw': container_data.get('Ports', ''), # Get the raw port string
+        # Pass hostname to parse_ports
+        'ports_parsed': parse_ports(container_data.get('Ports', ''), request_hostname=request_hostname),
+        'compose_project': _label_value(container_data.get('Labels'), 'com.docker.compose.project')
+    }
+
+
+def _created_timestamp(created_at):
+    """Unix time of a `docker ps` CreatedAt value ("2024-01-01 10:00:00 +0000 UTC"), or None."""
+    try:
+        return int(datetime.strptime(" ".join(created_at.split()[:3]), '%Y-%m-%d %H:%M:%S %z').timestamp())
+    except (AttributeError, ValueError):
+        return None
+
+
+def _label_value(labels, name):
+    """Value of one label in a `docker ps` Labels string ("key=value,key=value")."""
+    prefix = name + '='
+    for label in (labels or '').split(','):
+        if label.startswith(prefix):
+            return label[len(prefix):]
+    return None
+
+
+def get_container_cache():
+    """Return the running container state cache, or None if it is disabled.
+
+    The cache follows a single daemon's events, so fleet mode doesn't use it.
+    """
+    global _container_cache
+    if not CONTAINER_CACHE_ENABLED or get_fleet() is not None:
+        return None
+    if _container_cache is None:
+        with _docker_lock:
+            if _container_cache is None:
+                _container_cache = ContainerStateCache(get_docker, max_age=CONTAINER_CACHE_MAX_AGE,
+                                                       window=CONTAINER_CACHE_EVENT_WINDOW)
+                _container_cache.add_listener(lambda version: container_updates.publish('containers', {'type': 'changed'}))
+    _container_cache.start() # Lazily, so the debug reloader's parent process never starts it
+    return _container_cache
+
+
+def get_metrics_sampler():
+    """Return the running resource metrics sampler, or None if it is disabled (or in fleet mode)."""
+    global _metrics_sampler
+    if not METRICS_ENABLED or get_fleet() is not None:
+        return None
+    if _metrics_sampler is None:
+        with _docker_lock:
+            if _metrics_sampler is None:
+                _metrics_sampler = MetricsSampler(get_docker, interval=METRICS_INTERVAL,
+                                                  raw_points=METRICS_RAW_POINTS, minute_points=METRICS_MINUTE_POINTS,
+                                                  hour_points=METRICS_HOUR_POINTS, max_containers=METRICS_MAX_CONTAINERS)
+    _metrics_sampler.start() # Lazily, like the container cache
+    return _metrics_sampler
+
+
+_action_executor = ThreadPoolExecutor(max_workers=ACTION_WORKERS, thread_name_prefix="container-action")
+
+
+def start_container_operation(action, container_id, host=None):
+    """Queue a container action on the action pool and return its operation record.
+
+    host names the fleet host of the container (fleet mode only).
+    """
+    operation = {
+        'id': uuid.uuid4().hex,
+        'action': action,
+        'container_id': container_id,
+        'host': host,
+        'status': 'pending', # pending -> running -> succeeded | failed
+        'message': f"Waiting to {action} container {container_id}...",
+        'submitted': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+    with _operations_lock:
+        operations[operation['id']] = operation
+        while len(operations) > OPERATIONS_KEEP:
+            operations.popitem(last=False) # Forget the oldest
+    _action_executor.submit(_run_container_operation, operation)
+    return operation
+
+
+def _run_container_operation(operation):
+    action, container_id = operation['action'], operation['container_id']
+    operation['status'] = 'running'
+    operation['message'] = f"Running {action} on container {container_id}..."
+    try:
+        get_docker(operation.get('host')).container_action(action, container_id)
+        operation['status'] = 'succeeded'
+        operation['message'] = f"Container {container_id} {action}ed successfully."
+    except DockerError as e:
+        error_message = str(e) or f"Docker command failed for {action}."
+        operation['status'] = 'failed'
+        operation['message'] = f"Failed to {action} container {container_id}: {error_message}"
+    except Exception as e:
+        operation['status'] = 'failed'
+        operation['message'] = f"An unexpected error occurred: {str(e)}"
+    container_updates.publish('containers', {'type': 'operation', 'operation': dict(operation)})
+
+
+def _already_in_state(action, state):
+    """Whether a container in state needs no action (start of a running container, stop of a stopped one)."""
+    return (action == 'start' and state == 'running') or (action == 'stop' and state in ('created', 'exited', 'dead'))
+
+
+def create_bulk_operation(action, targets, parallelism=None, project=None):
+    """Register an action on many containers and return its operation record.
+
+    targets are container dicts with 'id' and optionally 'host', 'name' and
+    'state'; a known state that already matches the action is skipped. At
+    most `parallelism` of the containers are to be in flight at once, so a
+    large project doesn't take every action worker from single-container
+    actions. The caller runs the pending containers (see
+    start_bulk_operation()), reporting each through bulk_item_started() and
+    bulk_item_finished().
+    """
+    parallelism = max(1, min(parallelism or BULK_ACTION_PARALLELISM, ACTION_WORKERS))
+    items = []
+    for target in targets:
+        skipped = _already_in_state(action, target.get('state'))
+        items.append({
+            'container_id': target['id'],
+            'host': target.get('host'),
+            'name': target.get('name'),
+            'status': 'skipped' if skipped else 'pending', # pending -> running -> succeeded | failed, or skipped
+            'message': f"Already {target.get('state')}." if skipped else None,
+            'elapsed': None,
+        })
+    counts = {status: 0 for status in ('pending', 'running', 'succeeded', 'failed', 'skipped')}
+    for item in items:
+        counts[item['status']] += 1
+    operation = {
+        'id': uuid.uuid4().hex,
+        'action': action,
+        'bulk': True,
+        'project': project,
+        'parallelism': parallelism,
+        'status': 'pending', # pending -> running -> succeeded | failed (if any container failed)
+        'message': f"Waiting to {action} {_bulk_target_name(project, len(items))}...",
+        'submitted': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'total': len(items),
+        'counts': counts,
+        'containers': items,
+    }
+    with _operations_lock:
+        operations[operation['id']] = operation
+        while len(operations) > OPERATIONS_KEEP:
+            operations.popitem(last=False)
+        if counts['pending'] == 0: # Nothing to do (all skipped, or no containers)
+            _finish_bulk_operation(operation)
+    return operation
+
+
+def _bulk_target_name(project, total):
+    return f"compose project {project}" if project else f"{total} containers"
+
+
+def _finish_bulk_operation(operation):
+    # Called with _operations_lock held
+    counts = operation['counts']
+    operation['status'] = 'failed' if counts['failed'] else 'succeeded'
+    operation['message'] = (f"{operation['action'].capitalize()} "
+                            f"{_bulk_target_name(operation['project'], operation['total'])}: "
+                            f"{counts['succeeded']} succeeded, {counts['failed']} failed, {counts['skipped']} skipped.")
+
+
+def bulk_item_started(operation, item):
+    """Mark a container of a bulk operation as running; returns its start time for bulk_item_finished()."""
+    with _operations_lock:
+        operation['counts'][item['status']] -= 1
+        item['status'] = 'running'
+        operation['counts']['running'] += 1
+        operation['status'] = 'running'
+    return time.monotonic()
+
+
+def bulk_item_finished(operation, item, status, message, started):
+    """Record a container's result and publish it; returns True when it was the operation's last container."""
+    counts = operation['counts']
+    with _operations_lock:
+        counts['running'] -= 1
+        item.update(status=status, message=message, elapsed=round(time.monotonic() - started, 3))
+        counts[status] += 1
+        finished = counts['succeeded'] + counts['failed'] + counts['skipped']
+        operation['message'] = (f"{operation['action'].capitalize()} "
+                                f"{_bulk_target_name(operation['project'], operation['total'])}: "
+                                f"{finished} of {operation['total']} done...")
+        done = counts['pending'] == 0 and counts['running'] == 0
+        if done:
+            _finish_bulk_operation(operation)
+        update = {key: value for key, value in operation.items() if key != 'containers'}
+        update['counts'] = dict(counts)
+        update['container'] = dict(item)
+    container_updates.publish('containers', {'type': 'operation', 'operation': update})
+    return done
+
+
+def start_bulk_operation(action, targets, parallelism=None, project=None):
+    """Queue an action on many containers and return (operation record, event set when all are done).
+
+    See create_bulk_operation(). The containers run on the action pool, at
+    most the operation's parallelism at a time. Each finished container is
+    published as an 'operation' update with its own result and the counts so
+    far.
+    """
+    operation = create_bulk_operation(action, targets, parallelism=parallelism, project=project)
+    done = threading.Event()
+    if operation['counts']['pending'] == 0:
+        done.set()
+        return operation, done
+    queued = iter([item for item in operation['containers'] if item['status'] == 'pending'])
+    queued_lock = threading.Lock()
+
+    def submit_next():
+        with queued_lock:
+            item = next(queued, None)
+        if item is not None:
+            _action_executor.submit(run_item, item)
+
+    def run_item(item):
+        started = bulk_item_started(operation, item)
+        try:
+            get_docker(item['host']).container_action(action, item['container_id'])
+            status, message = 'succeeded', f"Container {item['container_id']} {action}ed successfully."
+        except DockerError as e:
+            status, message = 'failed', str(e) or f"Docker command failed for {action}."
+        except Exception as e:
+            status, message = 'failed', f"An unexpected error occurred: {str(e)}"
+        if bulk_item_finished(operation, item, status, message, started):
+            done.set()
+        else:
+            submit_next()
+
+    for _ in range(operation['parallelism']):
+        submit_next()
+    return operation, done
+
+
+def operation_view(operation):
+    """A consistent copy of an operation record (bulk records change while they run)."""
+    with _operations_lock:
+        view = dict(operation)
+        if 'containers' in view:
+            view['counts'] = dict(view['counts'])
+            view['containers'] = [dict(item) for item in view['containers']]
+    return view
+
+
 # Pass request_hostname=None by default for non-request contexts (like background task)
 def get_containers(show_all=False, request_hostname=None): 
     """Gets a list of Docker containers with parsed port info."""
-    cmd = ["docker", "ps", "--format", "{{json .}}"]
-    if show_all:
-        cmd.append("-a")
+    index = get_container_index(show_all=show_all, request_hostname=request_hostname)
+    return None if index is None else list(index.containers)
+
+
+def get_container_index(show_all=False, request_hostname=None):
+    """Gets the container list as a ContainerListIndex, for filtered and paginated queries; None on error."""
+    index = cached_container_index(show_all, request_hostname)
+    if index is not None:
+        return index
+    containers = _list_containers(show_all, request_hostname)
+    return None if containers is None else ContainerListIndex(containers, _container_key)
+
+
+def cached_container_index(show_all, request_hostname):
+    """The container list from the event-driven cache when it is current, else None. Never calls Docker."""
+    # The index (and the sort orders and search index it builds on demand) is
+    # memoized per (show_all, hostname) until the cache changes.
+    cache = get_container_cache()
+    snapshot = cache.snapshot(show_all) if cache else None
+    if snapshot is None:
+        return None
+    version, rows = snapshot
+    key = (show_all, request_hostname)
+    memo = _container_list_memo.get(key)
+    if memo is None or memo[0] != version:
+        if len(_container_list_memo) > 64: # Many distinct hostnames; don't grow forever
+            _container_list_memo.clear()
+        containers = [_simplify_container(row, request_hostname) for row in rows]
+        memo = _container_list_memo[key] = (version, ContainerListIndex(containers, _container_key))
+    CONTAINER_LIST_REQUESTS.inc('cache')
+    return memo[1]
+
+
+def parse_container_query(args):
+    """ContainerListIndex.query() arguments from the /api/containers query string (a MultiDict).
+
+    Raises ValueError with a message for the client on invalid parameters.
+    """
+    sort = args.get('sort') or None
+    descending = bool(sort and sort.startswith('-'))
+    if descending:
+        sort = sort[1:]
+    if sort is not None and sort not in SORT_FIELDS:
+        raise ValueError(f"Unknown sort field {sort!r}, expected one of {', '.join(SORT_FIELDS)}.")
+    limit = args.get('limit', type=int)
+    if limit is not None and not 0 < limit <= CONTAINER_PAGE_MAX:
+        raise ValueError(f"limit must be between 1 and {CONTAINER_PAGE_MAX}.")
+    cursor = args.get('cursor')
+    return {
+        'states': [s for s in args.get('state', '').split(',') if s],
+        'project': args.get('project'), 'host': args.get('host'),
+        'name': args.get('name'), 'image': args.get('image'), 'text': args.get('q'),
+        'sort': sort, 'descending': descending, 'limit': limit,
+        'cursor': decode_cursor(cursor, sort) if cursor else None,
+    }
 
-    containers = []
 
-    # Note: request_hostname should only be passed when called from a request context
-    def parse_ports(ports_str, request_hostname=None):
-        """Parses the port string from docker ps into structured data, avoiding duplicate links."""
-        parsed = []
-        linked_host_ports = set() # Track host ports already linked via wildcard
+def container_page(index, args, query, if_none_match):
+    """(status, containers or None, headers) answering a parsed /api/containers query.
 
-        if not ports_str:
-            return parsed
+    if_none_match is the request's If-None-Match header as werkzeug ETags.
+    """
+    # The same list and query give the same page: answer revalidations without building it
+    etag = hashlib.sha1(f"{index.digest}{sorted(args.items(multi=True))}".encode()).hexdigest()
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'} # Browsers revalidate with If-None-Match
+    if if_none_match.contains(etag):
+        return 304, None, headers
 
-        # Example: "0.0.0.0:8080->80/tcp, :::8080->80/tcp, 6379/tcp"
-        parts = ports_str.split(',')
-        for part in parts:
-            part = part.strip()
-            port_info = {'host_ip': None, 'host_port': None, 'container_port': None, 'protocol': None, 'link': None}
-            
-            if '->' in part: # Host binding exists
-                host_part, container_part = part.split('->')
-                
-                # Extract container port/protocol
-                if '/' in container_part:
-                    port_info['container_port'], port_info['protocol'] = container_part.split('/')
-                else:
-                    port_info['container_port'] = container_part # Protocol might be missing? Default?
-                    port_info['protocol'] = 'tcp' # Assume tcp if missing
-
-                # Extract host IP/port by splitting at the last colon
-                last_colon_index = host_part.rfind(':')
-                if last_colon_index != -1:
-                    port_info['host_ip'] = host_part[:last_colon_index]
-                    port_info['host_port'] = host_part[last_colon_index+1:]
-
-                    # Only create links for ports bound to 0.0.0.0 or :: (likely reachable)
-                    if port_info['host_ip'] in ['0.0.0.0', '::']:
-                        # Use request hostname if available, otherwise default to localhost
-                        host_link_ip = request_hostname if request_hostname else 'localhost'
-
-                        # Create link only if host port is valid AND not already linked via wildcard
-                        if port_info['host_port'].isdigit():
-                            host_port_num = port_info['host_port']
-                            # Check if this host port has already been linked via 0.0.0.0 or ::
-                            if host_port_num not in linked_host_ports:
-                                port_info['link'] = f"http://{host_link_ip}:{host_port_num}"
-                                linked_host_ports.add(host_port_num) # Mark this host port as linked
-                            # else: Link already created for this host port via the other wildcard IP
-                        else:
-                            print(f"Warning: Non-numeric host port detected for reachable binding: {port_info['host_port']} in {host_part}")
-                    # else: Port is bound to a specific IP (e.g., 127.0.0.1), so don't create a link
+    containers, total, next_cursor = index.query(**query)
+    headers['X-Total-Count'] = str(total)
+    if next_cursor:
+        next_args = args.to_dict()
+        next_args['cursor'] = next_cursor
+        headers['X-Next-Cursor'] = next_cursor
+        headers['Link'] = f'</api/containers?{urlencode(next_args)}>; rel="next"'
+    return 200, containers, headers
 
-                else: # No colon found, might be just IP or hostname? Unlikely for port mapping.
-                    print(f"Warning: Could not find colon to separate host IP and port in: {host_part}")
-                    # Assign the whole part as IP, port remains None
-                    port_info['host_ip'] = host_part
 
+def merge_host_listings(results, request_hostname):
+    """One container list from the HostResults of listing every fleet host; None if all failed."""
+    containers = []
+    for result in results:
+        if result.error:
+            CONTAINER_LIST_ERRORS.inc(result.host.name)
+            print(f"Error getting containers from {result.host.name}: {result.error}")
+            continue
+        hostname = result.host.link_hostname(request_hostname)
+        for container_data in result.value:
+            container = _simplify_container(container_data, hostname)
+            container['host'] = result.host.name
+            containers.append(container)
+    if all(result.error for result in results):
+        return None
+    return containers
 
-            else: # Only container port exposed (e.g., "6379/tcp")
-                 if '/' in part:
-                    port_info['container_port'], port_info['protocol'] = part.split('/')
-                 else:
-                    port_info['container_port'] = part
-                    port_info['protocol'] = 'tcp' # Assume tcp
 
-            parsed.append(port_info)
-        return parsed
+def _list_containers(show_all, request_hostname):
+    """Lists the containers straight from Docker (every host in fleet mode)."""
+    fleet = get_fleet()
+    if fleet is not None:
+        # Query every host at once; unreachable hosts are left out of the list
+        CONTAINER_LIST_REQUESTS.inc('fleet')
+        results = fleet.map(lambda host: host.backend.list_containers(show_all=show_all))
+        return merge_host_listings(results, request_hostname)
+
+    CONTAINER_LIST_REQUESTS.inc('docker')
+    containers = []
     try:
-        output = subprocess.check_output(cmd).decode().strip()
-        if not output:
-            return [] # No containers found
-        
-        # Each line is a JSON object
-        for line in output.splitlines():
-            try:
-                container_data = json.loads(line)
-                # Simplify data for frontend
-                containers.append({
-                    'id': container_data.get('ID'),
-                    'name': container_data.get('Names'),
-                    'image': container_data.get('Image'),
-                    'status': container_data.get('Status'),
-                    'state': container_data.get('State'), # e.g., 'running', 'exited',
-                    'ports_raw': container_data.get('Ports', ''), # Get the raw port string
-                    # Pass hostname to parse_ports
-                    'ports_parsed': parse_ports(container_data.get('Ports', ''), request_hostname=request_hostname) 
-                })
-            except json.JSONDecodeError:
-                print(f"Warning: Could not parse JSON line: {line}") # Log parsing errors
-                continue # Skip malformed lines
+        # Each entry has the shape of a `docker ps --format '{{json .}}'` line
+        for container_data in get_docker().list_containers(show_all=show_all):
+            # Simplify data for frontend
+            containers.append(_simplify_container(container_data, request_hostname))
                 
-    except (subprocess.SubprocessError, FileNotFoundError) as e:
+    except DockerError as e:
+        CONTAINER_LIST_ERRORS.inc('local')
         print(f"Error getting containers: {e}") # Log the error
         # Optionally, raise an exception or return an error indicator
         return None # Indicate an error occurred
         
     return containers
 
+
 # --- Routes ---
 
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # The URL rule (e.g. /view/<task_id>), so task and container IDs don't each get a series
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, request.method, route, response.status_code)
+    return response
+
+
 @app.route('/')
 def index():
     """Main page with form to generate report"""
     # Check if Docker is installed
     try:
-        subprocess.check_output(["docker", "--version"])
-        docker_available = True
-    except (subprocess.SubprocessError, FileNotFoundError):
-        docker_available = False
+        failed_hosts = check_docker()
+    except DockerError:
+        return render_index(None, None)
+
+    # Get hostname from request (strip port if present)
+    req_hostname = request.host.split(':')[0] if request and request.host else None
+    return render_index(failed_hosts, get_container_index(show_all=False, request_hostname=req_hostname))
+
+
+def render_index(failed_hosts, container_index):
+    """Render the main page; failed_hosts is None when Docker is unavailable, container_index None if listing failed."""
+    container_total, next_cursor = 0, None
+    docker_available = failed_hosts is not None
+    if not docker_available:
         running_containers = None # Indicate Docker issue
         flash("Docker command not found. Please ensure Docker is installed and in the system PATH.", "danger")
-
-    if docker_available:
-        # Get hostname from request (strip port if present)
-        req_hostname = request.host.split(':')[0] if request and request.host else None
-        running_containers = get_containers(show_all=False, request_hostname=req_hostname)
+    else:
+        for name, error in failed_hosts.items():
+            flash(f"Docker host {name} is unavailable: {error}", "warning")
+        # Only the first page; the rest is fetched from /api/containers as the user pages
+        if container_index is not None:
+            running_containers, container_total, next_cursor = container_index.query(limit=CONTAINER_PAGE_SIZE)
+        else:
+            running_containers = None
+        get_metrics_sampler() # Start collecting usage history
         if running_containers is None:
              # Error occurred in get_containers
              flash("Failed to fetch container status from Docker.", "danger")
@@ -422,31 +1663,103 @@ def index():
     return render_template('index.html',
                            docker_available=docker_available,
                            openai_available=openai_available,
-                           containers=running_containers) # Pass initial container list
+                           containers=running_containers, # Pass initial container list (first page)
+                           container_total=container_total,
+                           next_cursor=next_cursor,
+                           page_size=CONTAINER_PAGE_SIZE)
 
 
-@app.route('/generate', methods=['POST'])
-def generate_report():
-    """Start the report generation process"""
-    use_openai = request.form.get('use_openai') == 'true' # Check for use_openai
+def submit_report(use_openai, profile=False):
+    """Create and queue a report task and return its ID; raises QueueFull.
 
+    An identical request that is still queued or running is shared instead,
+    and its task ID returned.
+    """
     # Create a task ID and initialize task
-    task_id = str(int(time.time()))
-    tasks[task_id] = {
-        'status': 'starting',
-        'message': 'Initializing task...',
+    task_id = uuid.uuid4().hex
+    tasks[task_id] = Task(task_id, {
+        'status': 'queued',
+        'message': 'Waiting in queue...',
         'use_openai': use_openai, # Store use_openai flag
         'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    }
+    })
+
+    try:
+        # A profiled run is never shared with (or deduplicated into) an unprofiled one
+        queued_id, deduplicated = report_queue.submit(task_id, run_report_job, args=(task_id, use_openai, profile),
+                                                      key=None if profile else ('report', use_openai))
+    except QueueFull:
+        del tasks[task_id]
+        raise
+    if deduplicated:
+        del tasks[task_id]
+    return queued_id
+
+
+def queue_full_message(e):
+    return f"Too many reports are being generated ({e.queued} waiting). Please try again shortly."
 
-    # Start background task
-    thread = threading.Thread(target=run_docker_info, args=(task_id, use_openai)) # Pass use_openai
-    thread.daemon = True
-    thread.start()
+
+@app.route('/generate', methods=['POST'])
+def generate_report():
+    """Start the report generation process"""
+    use_openai = request.form.get('use_openai') == 'true' # Check for use_openai
+    profile = PROFILING_ENABLED and (request.values.get('profile') == 'true')
+
+    try:
+        task_id = submit_report(use_openai, profile)
+    except QueueFull as e:
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'error': queue_full_message(e), 'queued': e.queued}), 429, {'Retry-After': '30'}
+        flash(queue_full_message(e), "warning")
+        return index(), 429, {'Retry-After': '30'}
     
     return redirect(url_for('task_status', task_id=task_id))
 
 
+@app.route('/api/tasks/<task_id>/cancel', methods=['POST'])
+def api_cancel_task(task_id):
+    """API endpoint to cancel a queued or running report task"""
+    if task_id not in tasks:
+        return jsonify({'error': 'Task not found'}), 404
+    if tasks[task_id]['status'] in FINISHED_STATUSES: # Its job may still be wrapping up (e.g. saving a profile)
+        return jsonify({'error': f"Task is already {tasks[task_id]['status']}."}), 409
+
+    if not tasks.is_local(task_id): # Run by another worker process: ask it through the task store
+        if not tasks.request_cancel(task_id):
+            return jsonify({'error': f"Task is already {tasks[task_id]['status']}."}), 409
+        return jsonify({'success': True, 'status': tasks[task_id]['status'],
+                        'message': 'Cancellation requested; the worker running the task stops it at its next checkpoint.'}), 202
+
+    state = report_queue.cancel(task_id)
+    if state is None:
+        return jsonify({'error': f"Task is already {tasks[task_id]['status']}."}), 409
+    if state == 'queued':
+        tasks[task_id]['status'] = 'cancelled'
+        tasks[task_id]['message'] = 'Report generation was cancelled.'
+    else:
+        tasks[task_id]['message'] = 'Cancelling...' # The task stops at its next checkpoint
+    return jsonify({'success': True, 'status': tasks[task_id]['status']})
+
+
+@app.route('/api/tasks/<task_id>/profile')
+def api_task_profile(task_id):
+    """cProfile stats of a profiled report run as text (?sort=cumulative|tottime|ncalls&limit=N),
+    or the raw stats file with ?format=pstats"""
+    task = tasks.get(task_id)
+    profile_path = task.get('profile_path') if task else None
+    if not profile_path or not os.path.exists(profile_path):
+        return jsonify({'error': 'No profile for this task (yet). Request the report with profile=true and PROFILING=true.'}), 404
+    if request.args.get('format') == 'pstats':
+        return send_file(profile_path, as_attachment=True, download_name=f"report-{task_id}.pstats")
+
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'ncalls'):
+        return jsonify({'error': 'Invalid sort'}), 400
+    output = io.StringIO()
+    pstats.Stats(profile_path, stream=output).sort_stats(sort).print_stats(request.args.get('limit', 40, type=int))
+    return Response(output.getvalue(), mimetype='text/plain')
+
 @app.route('/status/<task_id>')
 def task_status(task_id):
     """Show status of a task"""
@@ -465,6 +1778,16 @@ def api_task_status(task_id):
     return jsonify(tasks[task_id])
 
 
+@app.route('/api/status/<task_id>/stream')
+def api_task_status_stream(task_id):
+    """Server-Sent Events stream of task status changes"""
+    if task_id not in tasks:
+        return jsonify({'error': 'Task not found'}), 404
+
+    return Response(stream_task_status(task_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/download/<task_id>')
 def download_report(task_id):
     """Download the generated report"""
@@ -472,62 +1795,419 @@ def download_report(task_id):
         return "Report not available", 404
     
     file_path = tasks[task_id]['file_path']
-    return send_file(file_path, as_attachment=True, download_name='docker_containers_info.md')
+    # send_file streams the file from disk in blocks and supports Range requests
+    return send_file(file_path, as_attachment=True, download_name='docker_containers_info.md', conditional=True)
 
 
 @app.route('/view/<task_id>')
 def view_report(task_id):
-    """View the generated report in the browser"""
+    """View the generated report in the browser, served from the HTML rendered at completion"""
     if task_id not in tasks or tasks[task_id]['status'] != 'completed':
         return "Report not available", 404
-    
+
+    task = tasks[task_id]
     try:
-        with open(tasks[task_id]['file_path'], 'r') as f:
-            content = f.read()
-        return render_template('view.html', content=content, task_id=task_id)
+        html_index_path = os.path.join(task['task_dir'], "docker_containers_info.html.json")
+        if not os.path.exists(html_index_path):
+            render_report_html(task_id) # Rendering at completion failed
+        with open(html_index_path, 'r') as f:
+            html_index = json.load(f)
     except Exception as e:
         return f"Error reading report: {str(e)}", 500
 
+    # ?section=<anchor> jumps to the page holding that heading
+    section = request.args.get('section')
+    if section:
+        page = html_index['anchors'].get(section)
+        if page is None:
+            return "Section not found", 404
+        return redirect(url_for('view_report', task_id=task_id, page=page, _anchor=section))
+
+    page = min(max(request.args.get('page', 1, type=int), 1), html_index['pages'])
+    path = report_html_path(task, page)
+    if request.accept_encodings['gzip']:
+        response = send_file(f"{path}.gz", mimetype='text/html', conditional=True)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = send_file(path, mimetype='text/html', conditional=True)
+    # ETag and Last-Modified come from the cached file; revalidate on every view (304 if unchanged)
+    response.cache_control.no_cache = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint: latency histograms, queue depth, task counts and cache hit ratios"""
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # --- API Routes ---
 
 @app.route('/api/containers')
 def api_get_containers():
-    """API endpoint to get container list (running or all)"""
+    """API endpoint to get container list (running or all), filtered, sorted and paginated
+
+    Query parameters: state (comma-separated), project, host, name, image and
+    q (name or image substring), sort (a field, "-field" for descending),
+    limit and cursor (from the X-Next-Cursor header of the previous page).
+    """
     show_all = request.args.get('all', 'false').lower() == 'true'
-    
     try:
-        subprocess.check_output(["docker", "--version"])
-    except (subprocess.SubprocessError, FileNotFoundError):
-         return jsonify({"error": "Docker command not found."}), 500
-
+        query = parse_container_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
     # Get hostname from request (strip port if present)
     req_hostname = request.host.split(':')[0] if request and request.host else None
-    containers = get_containers(show_all=show_all, request_hostname=req_hostname)
+    # A current event-driven cache is served from memory, without asking the daemon anything
+    index = cached_container_index(show_all, req_hostname)
+    if index is None:
+        try:
+            if get_fleet() is None: # In fleet mode get_containers() copes with unreachable hosts
+                get_docker().version()
+        except DockerError:
+             return jsonify({"error": "Docker command not found."}), 500
+        index = get_container_index(show_all=show_all, request_hostname=req_hostname)
 
-    if containers is None:
+    if index is None:
         return jsonify({"error": "Failed to fetch container status from Docker."}), 500
-        
-    return jsonify(containers)
 
-@app.route('/api/container/<action>/<container_id>', methods=['POST'])
-def api_container_action(action, container_id):
-    """API endpoint to start or stop a container"""
-    if action not in ['start', 'stop']:
-        return jsonify({"error": "Invalid action"}), 400
+    status, containers, headers = container_page(index, request.args, query, request.if_none_match)
+    response = Response(status=304) if status == 304 else jsonify(containers)
+    response.headers.update(headers)
+    return response
+
+@app.route('/api/hosts')
+def api_hosts():
+    """API endpoint listing the Docker hosts (the fleet, or the single local host)"""
+    fleet = get_fleet()
+    if fleet is not None and request.args.get('check', 'false').lower() == 'true':
+        fleet.map(lambda host: host.backend.version()) # Refresh last_call of every host
+    return jsonify(describe_hosts())
+
+def describe_hosts():
+    fleet = get_fleet()
+    if fleet is None:
+        docker = get_docker()
+        return {'fleet': False, 'hosts': [{'name': 'local', 'endpoint': getattr(docker, 'endpoint', None),
+                                           'backend': docker.name, 'last_call': None}]}
+    return {'fleet': True, 'timeout': fleet.timeout, 'hosts': fleet.describe()}
+
+@app.route('/api/containers/<container_id>/metrics')
+def api_container_metrics(container_id):
+    """API endpoint to get a window of a container's resource usage series"""
+    tier = request.args.get('tier', 'raw')
+    fields = [f for f in request.args.get('fields', '').split(',') if f]
+    if not container_id.isalnum():
+        return jsonify({"error": "Invalid container ID."}), 400
+    if tier not in METRIC_TIERS:
+        return jsonify({"error": f"Unknown tier {tier!r}, expected one of {', '.join(METRIC_TIERS)}."}), 400
+    unknown = [f for f in fields if f not in METRIC_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Unknown fields: {', '.join(unknown)}."}), 400
+
+    sampler = get_metrics_sampler()
+    if sampler is None:
+        return jsonify({"error": "Metrics are disabled."}), 404
+    series = sampler.series(container_id, tier=tier, since=request.args.get('since', type=float), fields=fields)
+    if series is None:
+        return jsonify({"error": f"No metrics for container {container_id} (yet)."}), 404
+    return jsonify(series)
+
+@app.route('/api/containers/stream')
+def api_stream_containers():
+    """Server-Sent Events stream of container list changes (running or all)"""
+    show_all = request.args.get('all', 'false').lower() == 'true'
+    req_hostname = request.host.split(':')[0] if request and request.host else None
+    send_snapshot = request.args.get('snapshot', 'true').lower() == 'true'
+    return Response(stream_container_changes(show_all, req_hostname, send_snapshot), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def topology_is_fresh():
+    return topology.updated_at is not None and time.time() - topology.updated_at < TOPOLOGY_MAX_AGE
+
+def _fresh_topology():
+    """Refresh the topology index if it is stale (or ?refresh=true); returns an error response or None."""
+    force = request.args.get('refresh', 'false').lower() == 'true'
+    try:
+        refresh_collection(is_fresh=None if force else topology_is_fresh)
+    except (ContainerInspectError, DockerError, RuntimeError) as e:
+        return topology_refresh_failed(e)
+    return None
+
+def topology_refresh_failed(e):
+    """Error response when the topology index could not be refreshed, or None to serve the previous one."""
+    if topology.updated_at is None:
+        return jsonify({"error": f"Failed to collect containers from Docker: {e}"}), 500
+    print(f"Warning: Could not refresh the topology index, serving the previous one: {e}")
+    return None
+
+@app.route('/api/topology')
+def api_topology():
+    """API endpoint with the number of networks, volumes, images and host ports indexed"""
+    return _fresh_topology() or jsonify(topology.summary())
+
+@app.route('/api/topology/<kind>')
+@app.route('/api/topology/<kind>/<path:name>')
+def api_topology_lookup(kind, name=None):
+    """API endpoint mapping networks, volumes (and bind mount sources), images or host ports to containers
+
+    With a name, just that entry: e.g. /api/topology/ports/8080/tcp (the
+    protocol defaults to tcp) or /api/topology/volumes/srv/data for the bind
+    mount source /srv/data.
+    """
+    if kind not in TOPOLOGY_KINDS:
+        return jsonify({"error": f"Unknown topology {kind!r}, expected one of {', '.join(TOPOLOGY_KINDS)}."}), 404
+    return _fresh_topology() or topology_lookup(kind, name, request.args.get('host'))
+
+def topology_lookup(kind, name, host):
+    """Response to a topology lookup of a kind (or one name of it), limited to host if given."""
+    if name is not None and kind == 'ports' and '/' not in name:
+        name += '/tcp'
+    hosts = {host} if host is not None else None
+    entries = topology.lookup(kind, name=name, hosts=hosts)
+    if name is not None and not entries and kind == 'volumes' and not name.startswith('/'):
+        name = '/' + name # URLs lose the leading slash of bind mount sources
+        entries = topology.lookup(kind, name=name, hosts=hosts)
+    if name is not None:
+        if name not in entries:
+            return jsonify({"error": f"No container uses {kind[:-1]} {name!r}."}), 404
+        return jsonify({'name': name, 'updated_at': topology.updated_at, 'containers': entries[name]})
+    return jsonify({'updated_at': topology.updated_at, kind: entries})
+
+def parse_export_request(args):
+    """(format, fields, gzip) of an /api/export query string; raises ValueError for a 400."""
+    format = args.get('format', 'jsonl')
+    fields = parse_fields(args.get('fields'))
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format {format!r}, expected one of {', '.join(EXPORT_FORMATS)}.")
+    return format, fields, args.get('gzip', 'false').lower() == 'true'
+
+def export_is_fresh():
+    collected_at = dataset_collected_at(EXPORT_DATASET)
+    return collected_at is not None and time.time() - collected_at < EXPORT_MAX_AGE
+
+def export_refresh_failed(e):
+    """Error response when the export dataset could not be refreshed, or None to export the previous one."""
+    if dataset_collected_at(EXPORT_DATASET) is None:
+        return jsonify({"error": f"Failed to collect containers from Docker: {e}"}), 500
+    print(f"Warning: Could not refresh the export dataset, exporting the previous one: {e}")
+    return None
+
+def export_response(format, fields, compress):
+    """Streaming response exporting the current dataset (error response if there is none)."""
+    try:
+        collected_at, chunks = export(EXPORT_DATASET, format, fields=fields, gzip=compress)
+    except (OSError, ValueError) as e:
+        return jsonify({"error": f"No export data available: {e}"}), 500
+
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"containers-{datetime.fromtimestamp(collected_at).strftime('%Y%m%d-%H%M%S')}.{extension}"
+    headers = {'Content-Disposition': f'attachment; filename="{filename}.gz"' if compress
+               else f'attachment; filename="{filename}"',
+               'X-Collected-At': f"{collected_at:.3f}", 'Cache-Control': 'no-cache'}
+    return Response(chunks, mimetype='application/gzip' if compress else media_type, headers=headers)
+
+@app.route('/api/export')
+def api_export():
+    """API endpoint streaming the extracted fields of the running containers
+
+    Query parameters: format (jsonl, csv or columns), fields (comma-separated,
+    default all), gzip=true, and refresh=true to collect first even if the
+    latest collection is recent.
+    """
+    if not EXPORT_DATASET:
+        return jsonify({"error": "Exports are disabled."}), 404
+    try:
+        format, fields, compress = parse_export_request(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        refresh_collection(is_fresh=None if request.args.get('refresh', 'false').lower() == 'true' else export_is_fresh)
+    except (ContainerInspectError, DockerError, RuntimeError) as e:
+        error = export_refresh_failed(e)
+        if error:
+            return error
+    return export_response(format, fields, compress)
+
+@app.route('/api/snapshots')
+def api_snapshots():
+    """API endpoint listing the stored collection snapshots, newest first"""
+    history = get_history()
+    if history is None:
+        return jsonify({"error": "Snapshot history is disabled."}), 404
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit < 1:
+        return jsonify({"error": "limit must be at least 1."}), 400
+    return jsonify({'snapshots': history.records(limit=limit), 'storage': history.stats()})
+
+@app.route('/api/snapshots/diff')
+def api_snapshot_diff():
+    """API endpoint diffing two snapshots
+
+    Query parameters: to (a snapshot ID, default "latest"), from (default the
+    snapshot before it) and details=true for the changed values.
+    """
+    history = get_history()
+    if history is None:
+        return jsonify({"error": "Snapshot history is disabled."}), 404
+    new = history.get(request.args.get('to', 'latest'))
+    if new is None:
+        return jsonify({"error": f"Unknown snapshot {request.args.get('to', 'latest')!r}."}), 404
+    old = history.get(request.args['from']) if 'from' in request.args else history.previous(new['id'])
+    if old is None:
+        return jsonify({"error": f"Unknown snapshot {request.args['from']!r}." if 'from' in request.args
+                        else f"No snapshot before {new['id']}."}), 404
+    details = request.args.get('details', 'false').lower() == 'true'
+    return jsonify(history.diff(old, new, details=details))
+
+@app.route('/api/snapshots/<snapshot_id>')
+def api_snapshot(snapshot_id):
+    """API endpoint with a snapshot's record and container list ("latest" for the newest)"""
+    history = get_history()
+    record = history.get(snapshot_id) if history is not None else None
+    if record is None:
+        return jsonify({"error": f"Unknown snapshot {snapshot_id!r}."}), 404
+    containers = [{k: v for k, v in entry.items() if k != 'fields'} for entry in history.manifest(record)]
+    return jsonify(dict(record, containers=containers))
+
+@app.route('/api/snapshots/<snapshot_id>/containers/<container>')
+def api_snapshot_container(snapshot_id, container):
+    """API endpoint with the inspect document of a container (name or ID) as stored in a snapshot"""
+    history = get_history()
+    record = history.get(snapshot_id) if history is not None else None
+    if record is None:
+        return jsonify({"error": f"Unknown snapshot {snapshot_id!r}."}), 404
+    document = history.document(record, container, host=request.args.get('host'))
+    if document is None:
+        return jsonify({"error": f"No container {container!r} in snapshot {record['id']}."}), 404
+    return jsonify(document)
+
+def container_action_error(action, container_id, host):
+    """Returns why an action request is invalid, or None."""
+    if action not in CONTAINER_ACTIONS:
+        return "Invalid action"
 
     # Basic validation for container ID (prevent command injection)
     if not container_id or not container_id.isalnum():
-         return jsonify({"error": "Invalid container ID"}), 400
+         return "Invalid container ID"
+
+    # In fleet mode ?host= names the container's host (default: the first host)
+    fleet = get_fleet()
+    if host and (fleet is None or not any(h.name == host for h in fleet.hosts)):
+        return "Unknown Docker host"
+    return None
+
+def _validate_container_action(action, container_id):
+    """Returns an error response for an invalid action request, or None."""
+    error = container_action_error(action, container_id, request.args.get('host'))
+    return (jsonify({"error": error}), 400) if error else None
+
+@app.route('/api/operations/<action>/<container_id>', methods=['POST'])
+def api_start_operation(action, container_id):
+    """API endpoint to start, stop or restart a container without waiting for it"""
+    invalid = _validate_container_action(action, container_id)
+    if invalid:
+        return invalid
+
+    operation = start_container_operation(action, container_id, host=request.args.get('host'))
+    return jsonify(operation), 202, {'Location': url_for('api_operation_status', operation_id=operation['id'])}
+
+def parse_bulk_request(action, body):
+    """(container keys, project, host, parallelism) of a bulk action request; raises ValueError for a 400."""
+    if action not in CONTAINER_ACTIONS:
+        raise ValueError("Invalid action")
+    body = body if isinstance(body, dict) else {}
+    keys, project, host = body.get('containers'), body.get('project'), body.get('host')
+    if bool(keys) == bool(project):
+        raise ValueError("Give either a list of containers or a compose project.")
+    parallelism = body.get('parallelism')
+    if parallelism is not None and (not isinstance(parallelism, int) or parallelism < 1):
+        raise ValueError("parallelism must be a positive integer.")
+    if host and host not in _fleet_host_names():
+        raise ValueError("Unknown Docker host")
+    if keys and not isinstance(keys, list):
+        raise ValueError("containers must be a list.")
+    return keys, project, host, parallelism
+
+def _fleet_host_names():
+    fleet = get_fleet()
+    return {h.name for h in fleet.hosts} if fleet is not None else set()
+
+def project_targets(index, project, host):
+    """Bulk action targets of a compose project; raises LookupError if it has no containers, ValueError if too many."""
+    targets = index.query(project=str(project), host=host)[0]
+    if not targets:
+        raise LookupError(f"No containers in compose project {project!r}.")
+    return _check_bulk_size(targets)
+
+def keyed_targets(keys, host):
+    """Bulk action targets from container keys as in the list ("<host>/<id>" in fleet mode); raises ValueError."""
+    host_names = _fleet_host_names()
+    targets = []
+    for key in keys:
+        container_host, _, container_id = str(key).rpartition('/')
+        if not container_id.isalnum():
+            raise ValueError(f"Invalid container ID {key!r}")
+        if container_host and container_host not in host_names:
+            raise ValueError(f"Unknown Docker host in {key!r}")
+        targets.append({'id': container_id, 'host': container_host or host})
+    return _check_bulk_size(targets)
+
+def _check_bulk_size(targets):
+    if len(targets) > BULK_ACTION_MAX_CONTAINERS:
+        raise ValueError(f"At most {BULK_ACTION_MAX_CONTAINERS} containers per bulk action.")
+    return targets
+
+@app.route('/api/operations/bulk/<action>', methods=['POST'])
+def api_bulk_operation(action):
+    """API endpoint to start, stop or restart many containers, or a whole compose project
+
+    JSON body: {"containers": ["<id>" or "<host>/<id>", ...]} or {"project": "<name>"}
+    (optionally with "host" to limit a project to one fleet host), and
+    optionally "parallelism". Returns 202 with the operation; with ?wait=true
+    returns the aggregated results once every container is done.
+    """
+    try:
+        keys, project, host, parallelism = parse_bulk_request(action, request.get_json(silent=True))
+        if project:
+            index = get_container_index(show_all=True)
+            if index is None:
+                return jsonify({"error": "Failed to fetch container status from Docker."}), 500
+            targets = project_targets(index, project, host)
+        else:
+            targets = keyed_targets(keys, host)
+    except LookupError as e:
+        return jsonify({"error": e.args[0]}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    operation, done = start_bulk_operation(action, targets, parallelism=parallelism, project=project)
+    if request.args.get('wait', 'false').lower() == 'true':
+        done.wait(BULK_ACTION_WAIT)
+        return jsonify(operation_view(operation)), 200 if done.is_set() else 202
+    return jsonify(operation_view(operation)), 202, {'Location': url_for('api_operation_status', operation_id=operation['id'])}
+
+@app.route('/api/operations/<operation_id>')
+def api_operation_status(operation_id):
+    """API endpoint to get the status of a container operation"""
+    operation = operations.get(operation_id)
+    if operation is None:
+        return jsonify({'error': 'Operation not found'}), 404
+    return jsonify(operation_view(operation))
+
+@app.route('/api/container/<action>/<container_id>', methods=['POST'])
+def api_container_action(action, container_id):
+    """API endpoint to start, stop or restart a container"""
+    invalid = _validate_container_action(action, container_id)
+    if invalid:
+        return invalid
 
-    cmd = ["docker", action, container_id]
-    
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        get_docker(request.args.get('host')).container_action(action, container_id)
         return jsonify({"success": True, "message": f"Container {container_id} {action}ed successfully."})
-    except FileNotFoundError:
-        return jsonify({"error": "Docker command not found."}), 500
-    except subprocess.CalledProcessError as e:
-        error_message = e.stderr.strip() if e.stderr else f"Docker command failed for {action}."
+    except DockerError as e:
+        error_message = str(e) or f"Docker command failed for {action}."
         return jsonify({"error": f"Failed to {action} container {container_id}: {error_message}"}), 500
     except Exception as e:
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
@@ -0,0 +1,718 @@
+"""Asynchronous (ASGI) serving mode.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5010   # any ASGI server
+    python asgi.py --port 5010                     # the same, with uvicorn
+
+Every route that waits on Docker or on other clients runs as a coroutine on
+one event loop, with asyncio socket/subprocess I/O to the daemon
+(async_docker.py): the main page, /generate, the container list, hosts,
+topology and export collections, the container and task status streams and
+the blocking and bulk container actions. Each open stream or slow daemon
+call is a suspended coroutine rather than a parked thread, so one process
+serves hundreds of dashboard and API clients. Once the Docker I/O is done,
+these routes render through the same app.py helpers (templates, flashed
+messages, JSON) as the threaded mode (python app.py). The remaining routes
+only read task state, report files and metrics; they are the Flask views
+themselves, run on a bounded thread pool (WSGI_THREADS). AI reports are
+generated with openai.AsyncOpenAI (ASYNC_OPENAI defaults to true here).
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, unquote
+
+import uvicorn
+from werkzeug.datastructures import MIMEAccept, MultiDict
+from werkzeug.http import parse_accept_header, parse_etags
+
+os.environ.setdefault("ASYNC_OPENAI", "true") # Read when app is imported
+
+import app as flask_app  # noqa: E402
+from async_docker import async_backend_for  # noqa: E402
+from container_index import ContainerListIndex  # noqa: E402
+from docker_backend import DockerError  # noqa: E402
+from job_queue import QueueFull  # noqa: E402
+from task_store import FINISHED_STATUSES  # noqa: E402
+
+# Flask views of the remaining routes run on this many threads
+WSGI_THREADS = int(os.environ.get("WSGI_THREADS", "32"))
+# Concurrent requests (connections) to the Docker daemon, per host
+DOCKER_ASYNC_POOL_SIZE = int(os.environ.get("DOCKER_ASYNC_POOL_SIZE", "32"))
+
+_wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="wsgi")
+_async_backends = {} # Fleet host name (None for the single host) -> async backend
+_in_flight = {} # Key -> task of a Docker call that concurrent requests share, see shared()
+
+
+async def get_async_docker(host=None):
+    """The asynchronous backend for the daemon get_docker(host) talks to."""
+    backend = _async_backends.get(host)
+    if backend is None:
+        # The first get_docker() may probe the socket; keep that off the event loop
+        sync_backend = await asyncio.to_thread(flask_app.get_docker, host)
+        backend = _async_backends.setdefault(host, async_backend_for(sync_backend, pool_size=DOCKER_ASYNC_POOL_SIZE))
+    return backend
+
+
+async def shared(key, make_call):
+    """Await make_call() once per key at a time: concurrent callers share the call in progress.
+
+    A caller may get a result fetched up to one daemon round trip before it
+    arrived, much like the container cache; in exchange a burst of identical
+    requests costs one Docker call instead of one each.
+    """
+    task = _in_flight.get(key)
+    if task is None:
+        task = _in_flight[key] = asyncio.ensure_future(make_call())
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    return await asyncio.shield(task) # A client going away doesn't cancel the others' call
+
+
+async def _docker_version(host=None):
+    return await (await get_async_docker(host)).version()
+
+
+async def check_docker():
+    """check_docker() of app.py over asyncio I/O: {name: error} of the fleet hosts that failed to answer."""
+    fleet = flask_app.get_fleet()
+    if fleet is None:
+        await shared(('version',), _docker_version)
+        return {}
+    results = await fleet.amap(lambda host: shared(('version', host.name), lambda: _docker_version(host.name)))
+    failed = {result.host.name: result.error for result in results if result.error}
+    if len(failed) == len(fleet.hosts):
+        raise DockerError("No Docker host answered: " + "; ".join(f"{name}: {error}" for name, error in failed.items()))
+    return failed
+
+
+async def container_index(show_all, request_hostname):
+    """get_container_index() without blocking: the cached list, or a listing over asyncio I/O."""
+    # Memoized, but the first read after a change simplifies and indexes every row
+    index = await asyncio.to_thread(flask_app.cached_container_index, show_all, request_hostname)
+    if index is not None:
+        return index
+    return await shared(('containers', show_all, request_hostname), lambda: _list_container_index(show_all, request_hostname))
+
+
+async def _list_container_index(show_all, request_hostname):
+    fleet = flask_app.get_fleet()
+    if fleet is not None:
+        flask_app.CONTAINER_LIST_REQUESTS.inc('fleet')
+
+        async def list_host(host):
+            return await (await get_async_docker(host.name)).list_containers(show_all=show_all)
+
+        containers = flask_app.merge_host_listings(await fleet.amap(list_host), request_hostname)
+    else:
+        flask_app.CONTAINER_LIST_REQUESTS.inc('docker')
+        try:
+            rows = await (await get_async_docker()).list_containers(show_all=show_all)
+        except DockerError as e:
+            flask_app.CONTAINER_LIST_ERRORS.inc('local')
+            print(f"Error getting containers: {e}")
+            return None
+        containers = [flask_app._simplify_container(row, request_hostname) for row in rows]
+    return None if containers is None else ContainerListIndex(containers, flask_app._container_key)
+
+
+# --- Collections (topology index and export dataset) ---
+
+async def inspect_containers(backend, container_ids):
+    """iter_inspected_containers() of app.py over asyncio I/O: yields the documents in order.
+
+    At most INSPECT_WORKERS chunks of INSPECT_CHUNK_SIZE containers are in
+    flight at a time.
+    """
+    chunk_size, workers = max(1, flask_app.INSPECT_CHUNK_SIZE), max(1, flask_app.INSPECT_WORKERS)
+    chunks = [container_ids[i:i + chunk_size] for i in range(0, len(container_ids), chunk_size)]
+
+    async def inspect_chunk(chunk):
+        start = time.perf_counter()
+        try:
+            return await backend.inspect(chunk)
+        finally:
+            elapsed = time.perf_counter() - start
+            flask_app.INSPECT_CHUNK_SECONDS.observe(elapsed)
+            flask_app.INSPECT_CONTAINER_SECONDS.observe(elapsed / len(chunk))
+
+    pending = deque()
+    next_chunk = 0
+    try:
+        for _ in chunks:
+            while next_chunk < len(chunks) and len(pending) < workers:
+                pending.append(asyncio.ensure_future(inspect_chunk(chunks[next_chunk])))
+                next_chunk += 1
+            for container_info in await pending.popleft():
+                yield container_info
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def list_collection_sources():
+    """list_collection_sources() of app.py over asyncio I/O: (listed_at, sources, host errors)."""
+    fleet = flask_app.get_fleet()
+    listed_at = time.time()
+    if fleet is None:
+        return listed_at, [(None, await (await get_async_docker()).list_containers())], {}
+
+    async def list_host(host):
+        return await (await get_async_docker(host.name)).list_containers()
+
+    results = await fleet.amap(list_host)
+    return (listed_at, [(result.host, result.value) for result in results if result.error is None],
+            {result.host.name: result.error for result in results if result.error})
+
+
+async def collect_container_snapshots(sources, listed_at, host_errors):
+    """collect_container_snapshots() of app.py over asyncio I/O, one host after the other."""
+    for host, rows in sources:
+        backend = await get_async_docker(host.name if host is not None else None)
+        collected = flask_app.get_snapshot_cache(host).acollect(backend, rows, listed_at,
+                                                              lambda ids: inspect_containers(backend, ids))
+        try:
+            async for container_info, fingerprint in collected:
+                yield host, container_info, fingerprint
+        except (DockerError, RuntimeError) as e:
+            if host is None:
+                raise
+            print(f"Warning: Inspecting containers on {host.name} failed: {e}")
+            host_errors[host.name] = f"inspect failed: {e}"
+
+
+_collection_lock = asyncio.Lock()
+
+
+async def refresh_collection(is_fresh=None):
+    """refresh_collection() of app.py over asyncio I/O."""
+    async with _collection_lock:
+        if is_fresh is not None and await asyncio.to_thread(is_fresh): # May read the export dataset's header
+            return
+        listed_at, sources, host_errors = await list_collection_sources()
+        # Indexing and writing the dataset happen on a thread, a batch of containers at a time
+        update = await asyncio.to_thread(flask_app.CollectionUpdate)
+        batch_size = max(1, flask_app.INSPECT_CHUNK_SIZE)
+
+        def add(batch):
+            for host, container_info, fingerprint in batch:
+                update.add(host, container_info, fingerprint)
+
+        try:
+            batch = []
+            async for collected in collect_container_snapshots(sources, listed_at, host_errors):
+                batch.append(collected)
+                if len(batch) == batch_size:
+                    await asyncio.to_thread(add, batch)
+                    batch = []
+            await asyncio.to_thread(add, batch)
+            await asyncio.to_thread(update.commit, sources, host_errors)
+        finally:
+            await asyncio.to_thread(update.close)
+
+
+class AsyncSubscription:
+    """Broadcaster subscriber for coroutines; publish() may call put_nowait() from any thread."""
+    def __init__(self, buffer_size):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(buffer_size)
+
+    def put_nowait(self, update):
+        try:
+            self._loop.call_soon_threadsafe(self._put, update)
+        except RuntimeError:
+            pass # Event loop already closed
+
+    def _put(self, update):
+        if self._queue.full(): # Drop the oldest, like the thread queues do
+            self._queue.get_nowait()
+        self._queue.put_nowait(update)
+
+    async def get(self, timeout):
+        """The next update; raises asyncio.TimeoutError after timeout seconds."""
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+    def drain(self):
+        updates = []
+        while not self._queue.empty():
+            updates.append(self._queue.get_nowait())
+        return updates
+
+
+# --- Request and response helpers ---
+
+class Request:
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.body = body
+        self.args = MultiDict(parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True))
+        self.headers = {}
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').lower()
+            value = value.decode('latin-1')
+            self.headers[name] = f"{self.headers[name]}, {value}" if name in self.headers else value
+        # Hostname for port links, like request.host in the Flask views (port stripped)
+        self.hostname = self.headers.get('host', '').split(':')[0] or None
+        self.scope = scope
+        self.mimetype = self.headers.get('content-type', '').split(';')[0].strip().lower()
+
+    def flag(self, name, default='false'):
+        return self.args.get(name, default).lower() == 'true'
+
+    def form(self):
+        """Fields of a urlencoded form body, like request.form."""
+        if self.mimetype != 'application/x-www-form-urlencoded':
+            return MultiDict()
+        return MultiDict(parse_qsl(self.body.decode('latin-1'), keep_blank_values=True))
+
+    def json(self):
+        """The JSON body, or None if there is none or it doesn't parse (like request.get_json(silent=True))."""
+        if self.mimetype != 'application/json':
+            return None
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return None
+
+
+async def send_response(send, status, body=b"", headers=None, content_type="application/json"):
+    header_list = [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]
+    header_list += [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in (headers or {}).items()]
+    await send({'type': 'http.response.start', 'status': status, 'headers': header_list})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, data, status=200, headers=None):
+    await send_response(send, status, json.dumps(data).encode(), headers)
+
+
+async def send_flask(send, request, view, *args):
+    """Send what view(*args) returns, run in a Flask request context on the WSGI threads.
+
+    For the parts of the Flask views that come after the Docker I/O done
+    here (templates, JSON, flashed messages, streaming an export): rendering
+    and reading, encoding or compressing files happen off the event loop,
+    one response chunk at a time.
+    """
+    loop = asyncio.get_running_loop()
+
+    def respond():
+        with flask_app.app.request_context(_environ(request.scope, request.body)):
+            return flask_app.app.process_response(flask_app.app.make_response(view(*args)))
+
+    response = await loop.run_in_executor(_wsgi_executor, respond)
+    try:
+        await send({'type': 'http.response.start', 'status': response.status_code,
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                for name, value in response.headers.to_wsgi_list()]})
+        chunks = response.iter_encoded()
+        chunk = await loop.run_in_executor(_wsgi_executor, next, chunks, None)
+        while chunk is not None:
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            chunk = await loop.run_in_executor(_wsgi_executor, next, chunks, None)
+        await send({'type': 'http.response.body', 'body': b""})
+    finally:
+        await loop.run_in_executor(_wsgi_executor, response.close)
+
+
+async def send_event_stream(send, events):
+    """Send an async generator of Server-Sent Events text as a streaming response."""
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': [(b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache"),
+                            (b"x-accel-buffering", b"no")]})
+    try:
+        async for event in events:
+            await send({'type': 'http.response.body', 'body': event.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b""})
+    finally:
+        await events.aclose() # Unsubscribes when the client went away mid-stream
+
+
+# --- Native asynchronous routes ---
+
+async def api_containers(request, send):
+    """/api/containers (see api_get_containers() in app.py)"""
+    try:
+        query = flask_app.parse_container_query(request.args)
+    except ValueError as e:
+        return await send_json(send, {"error": str(e)}, 400)
+    # A current event-driven cache is served from memory, without asking the daemon anything
+    index = await asyncio.to_thread(flask_app.cached_container_index, request.flag('all'), request.hostname)
+    if index is None:
+        if flask_app.get_fleet() is None:
+            try:
+                await shared(('version',), lambda: _docker_version())
+            except DockerError:
+                return await send_json(send, {"error": "Docker command not found."}, 500)
+        index = await container_index(request.flag('all'), request.hostname)
+    if index is None:
+        return await send_json(send, {"error": "Failed to fetch container status from Docker."}, 500)
+    status, containers, headers = flask_app.container_page(index, request.args, query,
+                                                           parse_etags(request.headers.get('if-none-match')))
+    if status == 304:
+        return await send_response(send, 304, headers=headers)
+    await send_json(send, containers, headers=headers)
+
+
+async def container_changes(show_all, request_hostname, send_snapshot):
+    """stream_container_changes() of app.py as an async generator."""
+    updates = AsyncSubscription(flask_app.CONTAINER_STREAM_BUFFER)
+    flask_app.container_updates.subscribe('containers', updates)
+    try:
+        index = await container_index(show_all, request_hostname)
+        if index is None:
+            yield f"event: error\ndata: {json.dumps({'error': 'Failed to fetch container status from Docker.'})}\n\n"
+            return
+        current = {flask_app._container_key(c): c for c in index.containers}
+        if send_snapshot:
+            yield f"retry: 3000\nevent: snapshot\ndata: {json.dumps(index.containers)}\n\n"
+        else:
+            yield f"retry: 3000\nevent: ready\ndata: {json.dumps({'total': len(index.containers)})}\n\n"
+
+        deadline = time.monotonic() + flask_app.CONTAINER_STREAM_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                pending = [await updates.get(flask_app.CONTAINER_STREAM_HEARTBEAT)]
+            except asyncio.TimeoutError:
+                pending = []
+                yield ": heartbeat\n\n"
+            pending += updates.drain() # Coalesce bursts (e.g. a mass stop) into a single diff
+            for update in pending:
+                if update['type'] == 'operation':
+                    yield f"event: operation\ndata: {json.dumps(update['operation'])}\n\n"
+
+            index = await container_index(show_all, request_hostname)
+            if index is None:
+                continue # Docker hiccup; try again on the next change or heartbeat
+            previous, current = current, {flask_app._container_key(c): c for c in index.containers}
+            diff = flask_app._diff_containers(previous, current)
+            if diff['added'] or diff['removed'] or diff['changed']:
+                yield f"event: diff\ndata: {json.dumps(diff)}\n\n"
+    finally:
+        flask_app.container_updates.unsubscribe('containers', updates)
+
+
+async def api_containers_stream(request, send):
+    """/api/containers/stream"""
+    await send_event_stream(send, container_changes(request.flag('all'), request.hostname, request.flag('snapshot', 'true')))
+
+
+async def task_status_changes(task_id):
+    """stream_task_status() of app.py as an async generator."""
+    updates = AsyncSubscription(flask_app.TASK_STREAM_BUFFER)
+    flask_app.task_updates.subscribe(task_id, updates) # Subscribe first so no transition is missed
+
+    async def read_task():
+        task = await asyncio.to_thread(flask_app.tasks.get, task_id, {}) # SQLite store: a file read
+        return {'status': task.get('status'), 'message': task.get('message')}
+
+    try:
+        update = await read_task()
+        yield f"retry: 3000\ndata: {json.dumps(update)}\n\n"
+        deadline = time.monotonic() + flask_app.TASK_STREAM_TIMEOUT
+        while update['status'] not in FINISHED_STATUSES:
+            if time.monotonic() > deadline:
+                return
+            # Tasks run by another worker process don't publish here; re-read those every second
+            local = flask_app.tasks.is_local(task_id)
+            try:
+                update = await updates.get(flask_app.TASK_STREAM_HEARTBEAT if local else 1)
+            except asyncio.TimeoutError:
+                latest = await read_task()
+                if local or latest == update:
+                    yield ": heartbeat\n\n"
+                    continue
+                update = latest
+            yield f"data: {json.dumps(update)}\n\n"
+
+        # The final message is often set right after the final status; pass it on too
+        while True:
+            try:
+                yield f"data: {json.dumps(await updates.get(0.25))}\n\n"
+            except asyncio.TimeoutError:
+                break
+        yield "event: end\ndata: {}\n\n"
+    finally:
+        flask_app.task_updates.unsubscribe(task_id, updates)
+
+
+async def api_task_status_stream(request, send, task_id):
+    """/api/status/<task_id>/stream"""
+    if not await asyncio.to_thread(flask_app.tasks.__contains__, task_id):
+        return await send_json(send, {'error': 'Task not found'}, 404)
+    await send_event_stream(send, task_status_changes(task_id))
+
+
+async def api_container_action(request, send, action, container_id):
+    """/api/container/<action>/<container_id>: waits for the action without holding a thread"""
+    host = request.args.get('host')
+    error = flask_app.container_action_error(action, container_id, host)
+    if error:
+        return await send_json(send, {"error": error}, 400)
+    try:
+        await (await get_async_docker(host)).container_action(action, container_id)
+        await send_json(send, {"success": True, "message": f"Container {container_id} {action}ed successfully."})
+    except DockerError as e:
+        error_message = str(e) or f"Docker command failed for {action}."
+        await send_json(send, {"error": f"Failed to {action} container {container_id}: {error_message}"}, 500)
+
+
+async def index(request, send):
+    """/ (see index() in app.py)"""
+    try:
+        failed_hosts = await check_docker()
+    except DockerError:
+        return await send_flask(send, request, flask_app.render_index, None, None)
+    await send_flask(send, request, flask_app.render_index, failed_hosts, await container_index(False, request.hostname))
+
+
+async def generate_report(request, send):
+    """/generate (see generate_report() in app.py)"""
+    form = request.form()
+    use_openai = form.get('use_openai') == 'true'
+    profile = flask_app.PROFILING_ENABLED and 'true' in (request.args.get('profile'), form.get('profile'))
+    try:
+        task_id = await asyncio.to_thread(flask_app.submit_report, use_openai, profile) # SQLite store: a file write
+    except QueueFull as e:
+        message = flask_app.queue_full_message(e)
+        if parse_accept_header(request.headers.get('accept'), MIMEAccept).best == 'application/json':
+            return await send_json(send, {'error': message, 'queued': e.queued}, 429, {'Retry-After': '30'})
+        try:
+            failed_hosts = await check_docker()
+        except DockerError:
+            failed_hosts = None
+        index = await container_index(False, request.hostname) if failed_hosts is not None else None
+
+        def queue_full_page():
+            flask_app.flash(message, "warning")
+            return flask_app.render_index(failed_hosts, index), 429, {'Retry-After': '30'}
+        return await send_flask(send, request, queue_full_page)
+    await send_flask(send, request, lambda: flask_app.redirect(flask_app.url_for('task_status', task_id=task_id)))
+
+
+async def api_hosts(request, send):
+    """/api/hosts"""
+    fleet = flask_app.get_fleet()
+    if fleet is None:
+        await get_async_docker() # The first get_docker() may probe the socket
+    elif request.flag('check'):
+        await fleet.amap(lambda host: _docker_version(host.name)) # Refresh last_call of every host
+    await send_json(send, flask_app.describe_hosts())
+
+
+async def _refresh_failed(request, is_fresh):
+    """Refresh the collection unless is_fresh() (or with ?refresh=true); returns the error if that failed."""
+    try:
+        await refresh_collection(is_fresh=None if request.flag('refresh') else is_fresh)
+    except (DockerError, RuntimeError) as e:
+        return e
+    return None
+
+
+async def api_topology(request, send):
+    """/api/topology"""
+    error = await _refresh_failed(request, flask_app.topology_is_fresh)
+    await send_flask(send, request, lambda: (error and flask_app.topology_refresh_failed(error)) or
+                     flask_app.jsonify(flask_app.topology.summary()))
+
+
+async def api_topology_lookup(request, send, kind, name=None):
+    """/api/topology/<kind> and /api/topology/<kind>/<path:name>"""
+    if kind not in flask_app.TOPOLOGY_KINDS:
+        return await send_json(send, {"error": f"Unknown topology {kind!r}, "
+                                               f"expected one of {', '.join(flask_app.TOPOLOGY_KINDS)}."}, 404)
+    error = await _refresh_failed(request, flask_app.topology_is_fresh)
+    await send_flask(send, request, lambda: (error and flask_app.topology_refresh_failed(error)) or
+                     flask_app.topology_lookup(kind, name, request.args.get('host')))
+
+
+async def api_export(request, send):
+    """/api/export: collects over asyncio I/O, then streams the export from the WSGI threads"""
+    if not flask_app.EXPORT_DATASET:
+        return await send_json(send, {"error": "Exports are disabled."}, 404)
+    try:
+        format, fields, compress = flask_app.parse_export_request(request.args)
+    except ValueError as e:
+        return await send_json(send, {"error": str(e)}, 400)
+    error = await _refresh_failed(request, flask_app.export_is_fresh)
+    await send_flask(send, request, lambda: (error and flask_app.export_refresh_failed(error)) or
+                     flask_app.export_response(format, fields, compress))
+
+
+_bulk_operations = set() # Running bulk operation tasks (the event loop only keeps weak references)
+
+
+async def run_bulk_operation(operation):
+    """Run the pending containers of a bulk operation, at most its parallelism at a time."""
+    action = operation['action']
+    slots = asyncio.Semaphore(operation['parallelism'])
+
+    async def run_item(item):
+        async with slots:
+            started = flask_app.bulk_item_started(operation, item)
+            try:
+                await (await get_async_docker(item['host'])).container_action(action, item['container_id'])
+                status, message = 'succeeded', f"Container {item['container_id']} {action}ed successfully."
+            except DockerError as e:
+                status, message = 'failed', str(e) or f"Docker command failed for {action}."
+            except Exception as e:
+                status, message = 'failed', f"An unexpected error occurred: {str(e)}"
+            flask_app.bulk_item_finished(operation, item, status, message, started)
+
+    await asyncio.gather(*(run_item(item) for item in operation['containers'] if item['status'] == 'pending'))
+
+
+async def api_bulk_operation(request, send, action):
+    """/api/operations/bulk/<action> (see api_bulk_operation() in app.py)"""
+    try:
+        keys, project, host, parallelism = flask_app.parse_bulk_request(action, request.json())
+        if project:
+            index = await container_index(True, None)
+            if index is None:
+                return await send_json(send, {"error": "Failed to fetch container status from Docker."}, 500)
+            targets = flask_app.project_targets(index, project, host)
+        else:
+            targets = flask_app.keyed_targets(keys, host)
+    except LookupError as e:
+        return await send_json(send, {"error": e.args[0]}, 404)
+    except ValueError as e:
+        return await send_json(send, {"error": str(e)}, 400)
+
+    operation = flask_app.create_bulk_operation(action, targets, parallelism=parallelism, project=project)
+    task = asyncio.ensure_future(run_bulk_operation(operation))
+    _bulk_operations.add(task)
+    task.add_done_callback(_bulk_operations.discard)
+    if request.flag('wait'):
+        done, _ = await asyncio.wait([task], timeout=flask_app.BULK_ACTION_WAIT) # The client going away doesn't cancel it
+        return await send_json(send, flask_app.operation_view(operation), 200 if done else 202)
+    await send_json(send, flask_app.operation_view(operation), 202, {'Location': f"/api/operations/{operation['id']}"})
+
+
+# (method, path pattern, URL rule as Flask names it for /metrics, handler)
+ROUTES = [
+    ('GET', re.compile(r'^/$'), '/', index),
+    ('POST', re.compile(r'^/generate$'), '/generate', generate_report),
+    ('GET', re.compile(r'^/api/hosts$'), '/api/hosts', api_hosts),
+    ('GET', re.compile(r'^/api/topology$'), '/api/topology', api_topology),
+    ('GET', re.compile(r'^/api/topology/([^/]+)$'), '/api/topology/<kind>', api_topology_lookup),
+    ('GET', re.compile(r'^/api/topology/([^/]+)/(.+)$'), '/api/topology/<kind>/<path:name>', api_topology_lookup),
+    ('GET', re.compile(r'^/api/export$'), '/api/export', api_export),
+    ('POST', re.compile(r'^/api/operations/bulk/([^/]+)$'), '/api/operations/bulk/<action>', api_bulk_operation),
+    ('GET', re.compile(r'^/api/containers$'), '/api/containers', api_containers),
+    ('GET', re.compile(r'^/api/containers/stream$'), '/api/containers/stream', api_containers_stream),
+    ('GET', re.compile(r'^/api/status/([^/]+)/stream$'), '/api/status/<task_id>/stream', api_task_status_stream),
+    ('POST', re.compile(r'^/api/container/([^/]+)/([^/]+)$'), '/api/container/<action>/<container_id>',
+     api_container_action),
+]
+
+
+# --- Everything else: the Flask views on the thread pool ---
+
+def _environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def call_flask(scope, body, send):
+    """Run the Flask app for one request on the WSGI threads, streaming its response."""
+    loop = asyncio.get_running_loop()
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = headers
+
+    def first_chunk():
+        result = flask_app.app(_environ(scope, body), start_response)
+        chunks = iter(result)
+        return result, chunks, next(chunks, None) # Generators call start_response on first next()
+
+    result, chunks, chunk = await loop.run_in_executor(_wsgi_executor, first_chunk)
+    try:
+        await send({'type': 'http.response.start', 'status': started['status'],
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                for name, value in started['headers']]})
+        while chunk is not None:
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            chunk = await loop.run_in_executor(_wsgi_executor, next, chunks, None)
+        await send({'type': 'http.response.body', 'body': b""})
+    finally:
+        if hasattr(result, 'close'):
+            await loop.run_in_executor(_wsgi_executor, result.close)
+
+
+async def app(scope, receive, send):
+    """The ASGI application."""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await asyncio.to_thread(flask_app.get_docker) # Pick the backend before the first request
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get('body', b"")
+        if not message.get('more_body'):
+            break
+
+    for method, pattern, rule, handler in ROUTES:
+        match = pattern.match(scope['path'])
+        if match and scope['method'] == method:
+            break
+    else:
+        return await call_flask(scope, body, send) # Timed by the Flask request hooks
+
+    started = time.perf_counter()
+
+    async def timed_send(message):
+        if message['type'] == 'http.response.start':
+            flask_app.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method, rule, message['status'])
+        await send(message)
+
+    await handler(Request(scope, body), timed_send, *(unquote(group) for group in match.groups()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the app asynchronously (ASGI)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5010)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
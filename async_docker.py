@@ -0,0 +1,279 @@
+"""Non-blocking Docker access for the asynchronous serving mode (see asgi.py).
+
+AsyncAPIBackend speaks HTTP/1.1 (framed by h11) to the Engine API over
+asyncio streams (unix socket or TCP) and AsyncCLIBackend runs the docker binary as an asyncio
+subprocess. They mirror the request-path and collection methods of the backends in
+docker_backend.py and return the same shapes, so a slow daemon only holds up
+the coroutines waiting for it instead of a thread each.
+"""
+import asyncio
+import functools
+import json
+import time
+from urllib.parse import quote, urlencode
+
+import h11
+
+from docker_backend import DOCKER_CALL_ERRORS, DOCKER_CALL_SECONDS, APIBackend, CLIBackend, DockerError
+
+
+def _timed(operation):
+    """Coroutine version of docker_backend._timed(): same metrics, same labels."""
+    def decorate(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await method(self, *args, **kwargs)
+            except DockerError:
+                DOCKER_CALL_ERRORS.inc(self.name, operation)
+                raise
+            finally:
+                DOCKER_CALL_SECONDS.observe(time.perf_counter() - start, self.name, operation)
+        return wrapper
+    return decorate
+
+
+READ_SIZE = 64 * 1024
+
+
+async def _exchange(connection, method, url, headers):
+    """Send one request on a (reader, writer, h11.Connection) and read the response: (status, body)."""
+    reader, writer, http = connection
+    writer.write(http.send(h11.Request(method=method, target=url, headers=headers)))
+    writer.write(http.send(h11.EndOfMessage()))
+    await writer.drain()
+    status, body = None, []
+    while True:
+        event = http.next_event()
+        if event is h11.NEED_DATA:
+            http.receive_data(await reader.read(READ_SIZE)) # b"" at EOF, which h11 turns into an error or the end
+        elif isinstance(event, h11.Response):
+            status = event.status_code
+        elif isinstance(event, h11.Data):
+            body.append(event.data)
+        elif isinstance(event, h11.EndOfMessage):
+            return status, b"".join(body)
+        elif isinstance(event, h11.ConnectionClosed):
+            raise ConnectionResetError("Connection closed before a response")
+
+
+class AsyncAPIBackend:
+    """Talks HTTP to the Docker Engine API over pooled asyncio connections (unix socket or TCP)."""
+    name = "api"
+
+    def __init__(self, socket_path=None, tcp_address=None, pool_size=32, timeout=60, prefix=""):
+        self.socket_path = socket_path
+        self.tcp_address = tcp_address
+        self.endpoint = f"tcp://{tcp_address[0]}:{tcp_address[1]}" if tcp_address else f"unix://{socket_path}"
+        self.prefix = prefix
+        self.timeout = timeout
+        self._idle = [] # Idle keep-alive (reader, writer, h11.Connection), most recently used last
+        self._slots = asyncio.Semaphore(pool_size) # At most pool_size requests (connections) at a time
+
+    async def _open(self):
+        if self.tcp_address:
+            reader, writer = await asyncio.open_connection(*self.tcp_address)
+        else:
+            reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        return reader, writer, h11.Connection(h11.CLIENT)
+
+    @staticmethod
+    def _discard(connection):
+        if connection is not None:
+            connection[1].close()
+
+    def _release(self, connection):
+        """Keep a connection whose exchange completed for the next request, unless either side is closing it."""
+        http = connection[2]
+        if http.our_state is h11.DONE and http.their_state is h11.DONE:
+            http.start_next_cycle()
+            self._idle.append(connection)
+        else:
+            self._discard(connection)
+
+    async def request(self, method, path, params=None, container_id=None):
+        """Send one request and return (status, decoded JSON body or None)."""
+        url = self.prefix + path
+        if params:
+            url += "?" + urlencode(params)
+        headers = [("Host", "docker"), ("Content-Length", "0")]
+        async with self._slots:
+            # An idle keep-alive connection may have been closed by the daemon in
+            # the meantime; retry once on a fresh connection in that case.
+            for attempt in range(2):
+                connection = self._idle.pop() if self._idle else None
+                reused = connection is not None
+                try:
+                    if connection is None:
+                        connection = await asyncio.wait_for(self._open(), self.timeout)
+                    status, body = await asyncio.wait_for(_exchange(connection, method, url, headers), self.timeout)
+                except asyncio.TimeoutError:
+                    self._discard(connection)
+                    raise DockerError(f"Docker daemon at {self.endpoint} did not answer within {self.timeout}s",
+                                      container_id=container_id)
+                except (OSError, h11.ProtocolError) as e:
+                    self._discard(connection)
+                    if reused and attempt == 0:
+                        continue
+                    if isinstance(e, h11.ProtocolError):
+                        raise DockerError(f"Invalid response from Docker daemon at {self.endpoint}: {e!r}",
+                                          container_id=container_id)
+                    if isinstance(e, (ConnectionResetError, BrokenPipeError)):
+                        raise DockerError(f"Docker daemon closed the connection: {e}", container_id=container_id)
+                    raise DockerError(f"Cannot connect to Docker daemon at {self.endpoint}: {e}", container_id=container_id)
+                except BaseException: # Cancelled mid-exchange: the connection is in an unknown state
+                    self._discard(connection)
+                    raise
+                self._release(connection)
+                break
+
+        data = None
+        if body:
+            try:
+                data = json.loads(body)
+            except json.JSONDecodeError:
+                data = body.decode(errors="replace").strip()
+        if status >= 400:
+            error = data.get("message") if isinstance(data, dict) else data
+            raise DockerError(error or f"Docker API returned HTTP {status}", container_id=container_id, status=status)
+        return status, data
+
+    @_timed("version")
+    async def version(self):
+        _, data = await self.request("GET", "/version")
+        return f"Docker version {data.get('Version', 'unknown')} (API {data.get('ApiVersion', '?')})"
+
+    @_timed("list_containers")
+    async def list_containers(self, show_all=False):
+        _, data = await self.request("GET", "/containers/json", params={"all": "1"} if show_all else None)
+        return [APIBackend._row(c) for c in data or []]
+
+    @_timed("container_row")
+    async def container_row(self, container_id):
+        _, data = await self.request("GET", "/containers/json",
+                                     params={"all": "1", "filters": json.dumps({"id": [container_id]})})
+        return APIBackend._row(data[0]) if data else None
+
+    async def events(self, since, until, types=("container",)):
+        """Events of the given object types between the since and until unix timestamps, as a list.
+
+        Uses a dedicated connection because the response streams until `until`.
+        """
+        params = {"since": f"{since:.3f}", "until": f"{until:.3f}", "filters": json.dumps({"type": list(types)})}
+        timeout = max(until - time.time(), 0) + 30
+        connection = None
+        try:
+            connection = await asyncio.wait_for(self._open(), self.timeout)
+            status, body = await asyncio.wait_for(
+                _exchange(connection, "GET", f"{self.prefix}/events?{urlencode(params)}",
+                          [("Host", "docker"), ("Connection", "close")]), timeout)
+            if status >= 400:
+                raise DockerError(f"Docker API returned HTTP {status} for events")
+            return [json.loads(line) for line in body.splitlines() if line.strip()]
+        except (asyncio.TimeoutError, OSError, ValueError, h11.ProtocolError) as e:
+            raise DockerError(f"Docker event stream interrupted: {e!r}")
+        finally:
+            self._discard(connection)
+
+    @_timed("inspect")
+    async def inspect(self, container_ids):
+        # Concurrently, as far as the pool allows; results in the order asked for
+        results = await asyncio.gather(*(
+            self.request("GET", f"/containers/{quote(container_id, safe='')}/json", container_id=container_id)
+            for container_id in container_ids))
+        return [data for _, data in results]
+
+    @_timed("container_action")
+    async def container_action(self, action, container_id):
+        await self.request("POST", f"/containers/{quote(container_id, safe='')}/{action}", container_id=container_id)
+
+    def close(self):
+        while self._idle:
+            self._discard(self._idle.pop())
+
+
+class AsyncCLIBackend:
+    """Runs the `docker` binary on PATH as asyncio subprocesses."""
+    name = "cli"
+    endpoint = "cli"
+    VERSION_TTL = CLIBackend.VERSION_TTL
+
+    def __init__(self):
+        self._version = None
+        self._version_checked = 0
+
+    async def _run(self, args, container_id=None):
+        try:
+            process = await asyncio.create_subprocess_exec("docker", *args, stdout=asyncio.subprocess.PIPE,
+                                                           stderr=asyncio.subprocess.PIPE)
+        except FileNotFoundError:
+            raise DockerError("Docker command not found.", container_id=container_id)
+        stdout, stderr = await process.communicate()
+        if process.returncode != 0:
+            message = stderr.decode(errors="replace").strip()
+            raise DockerError(message or f"docker {args[0]} exited with status {process.returncode}",
+                              container_id=container_id)
+        return stdout.decode()
+
+    @_timed("version")
+    async def version(self):
+        if self._version and time.monotonic() - self._version_checked < self.VERSION_TTL:
+            return self._version
+        self._version = (await self._run(["--version"])).strip()
+        self._version_checked = time.monotonic()
+        return self._version
+
+    @_timed("list_containers")
+    async def list_containers(self, show_all=False):
+        args = ["ps", "--format", "{{json .}}"]
+        if show_all:
+            args.append("-a")
+        return CLIBackend._parse_rows(await self._run(args))
+
+    @_timed("container_row")
+    async def container_row(self, container_id):
+        rows = CLIBackend._parse_rows(await self._run(["ps", "-a", "--filter", f"id={container_id}",
+                                                       "--format", "{{json .}}"]))
+        return rows[0] if rows else None
+
+    async def events(self, since, until, types=("container",)):
+        output = await self._run(["events", "--format", "{{json .}}", *(f"--filter=type={t}" for t in types),
+                                  "--since", f"{since:.3f}", "--until", f"{until:.3f}"])
+        events = []
+        for line in output.splitlines():
+            if line.strip():
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"Warning: Could not parse event line: {line!r}")
+        return events
+
+    @_timed("inspect")
+    async def inspect(self, container_ids):
+        try:
+            return json.loads(await self._run(["inspect", *container_ids]))
+        except (DockerError, json.JSONDecodeError):
+            pass # Find the culprit one container at a time, like CLIBackend.inspect()
+        inspected = []
+        for container_id in container_ids:
+            try:
+                inspected.extend(json.loads(await self._run(["inspect", container_id], container_id=container_id)))
+            except json.JSONDecodeError as e:
+                raise DockerError(str(e), container_id=container_id)
+        return inspected
+
+    @_timed("container_action")
+    async def container_action(self, action, container_id):
+        await self._run([action, container_id], container_id=container_id)
+
+    def close(self):
+        pass
+
+
+def async_backend_for(backend, pool_size=32):
+    """The asynchronous counterpart of a docker_backend backend, talking to the same daemon."""
+    if isinstance(backend, APIBackend):
+        return AsyncAPIBackend(socket_path=backend.socket_path, tcp_address=backend.tcp_address,
+                               pool_size=pool_size, timeout=backend.timeout, prefix=backend.prefix)
+    return AsyncCLIBackend()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Time the AI report against the stub OpenAI server.
+
+Compares the old single request carrying the whole indented inspect JSON with
+the projected map-reduce generation, then re-runs it to check that unchanged
+input is served from the completion cache without any API request:
+
+    python bench/bench_ai.py --containers 500 --latency 0.5 --rate-limit-every 7
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openai  # noqa: E402
+
+from ai_report import AIReportGenerator, CompletionCache, estimate_tokens, project_container  # noqa: E402
+from fake_docker import synthetic_container  # noqa: E402
+from fake_openai import serve  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--containers", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub server seconds per completion")
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    parser.add_argument("--token-budget", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    server, state, base_url = serve(latency=args.latency, rate_limit_every=args.rate_limit_every)
+    client = openai.OpenAI(api_key="stub", base_url=base_url, max_retries=0)
+    documents = [synthetic_container(i) for i in range(args.containers)]
+    records = [project_container(doc) for doc in documents]
+
+    full_json = json.dumps(documents, indent=2)
+    projected_json = json.dumps(records, separators=(',', ':'))
+    print(f"{args.containers} containers: full inspect JSON ~{estimate_tokens(full_json)} tokens, "
+          f"projected ~{estimate_tokens(projected_json)} tokens")
+
+    # Old behaviour: one request with everything
+    start = time.perf_counter()
+    client.chat.completions.create(model="stub", messages=[{"role": "user", "content": full_json}], timeout=180)
+    print(f"  single request (full JSON):  {time.perf_counter() - start:6.2f}s")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = CompletionCache(cache_dir)
+        generator = AIReportGenerator(client, "stub", token_budget=args.token_budget, workers=args.workers,
+                                      cache=cache)
+        start = time.perf_counter()
+        report = generator.generate(records)
+        elapsed = time.perf_counter() - start
+        print(f"  map-reduce (projected):      {elapsed:6.2f}s, {generator.requests} requests "
+              f"({state.rate_limited} rate limited, at most {state.max_in_flight} concurrent)")
+        assert report
+
+        before = state.requests
+        start = time.perf_counter()
+        assert generator.generate(records) == report
+        print(f"  repeat with cache:           {time.perf_counter() - start:6.2f}s, "
+              f"{state.requests - before} requests ({cache.hits} cache hits)")
+        assert state.requests == before, "unchanged input must not reach the API"
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""Compare the threaded server (python app.py) with the asynchronous one (asgi.py).
+
+Starts a fake Docker daemon that answers every request after --latency
+seconds, then runs the app in each mode in its own process, with the
+container cache off so that every /api/containers request waits on the
+daemon. Against each server it
+
+- opens --streams idle /api/containers/stream clients (dashboards left open)
+- runs --clients concurrent clients against /api/containers?limit=50 for --duration seconds
+- loads the main page now and then during that load
+
+and reports throughput, latency percentiles, errors and the server's
+threads and memory:
+
+    python bench/bench_async.py --streams 200 --clients 100 --latency 0.05
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_daemon import serve  # noqa: E402
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def serve_threaded(port):
+    """The threaded mode as `python app.py` runs it, minus the debug reloader."""
+    from werkzeug.serving import make_server
+    import app
+    make_server('127.0.0.1', port, app.app, threaded=True).serve_forever()
+
+
+def process_stats(pid):
+    """(threads, resident MiB) of a process, from /proc."""
+    threads = rss = None
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("Threads:"):
+                threads = int(line.split()[1])
+            elif line.startswith("VmRSS:"):
+                rss = int(line.split()[1]) / 1024
+    return threads, rss
+
+
+# --- Async HTTP client ---
+
+async def get(port, path, timeout=60):
+    """GET path with Connection: close; returns (status, seconds)."""
+    start = time.perf_counter()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+        return int(response.split(b" ", 2)[1]), time.perf_counter() - start
+    finally:
+        writer.close()
+
+
+async def open_stream(port, timeout=60):
+    """Open a container stream and wait for its first event; returns the open writer."""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    writer.write(f"GET /api/containers/stream?snapshot=false HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n\r\n".encode())
+    await writer.drain()
+    await asyncio.wait_for(reader.readuntil(b"event: ready"), timeout)
+    return writer
+
+
+async def load(port, streams, clients, duration):
+    results = {}
+    start = time.perf_counter()
+    opened = await asyncio.gather(*(open_stream(port) for _ in range(streams)), return_exceptions=True)
+    writers = [w for w in opened if not isinstance(w, BaseException)]
+    results['streams_open'] = len(writers)
+    results['streams_open_s'] = time.perf_counter() - start
+
+    latencies, page_latencies, errors = [], [], 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            try:
+                status, elapsed = await get(port, "/api/containers?limit=50")
+                if status == 200:
+                    latencies.append(elapsed)
+                    continue
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                pass
+            errors += 1
+
+    async def page_loads():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            try:
+                status, elapsed = await get(port, "/")
+                if status == 200:
+                    page_latencies.append(elapsed)
+                else:
+                    errors += 1
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                errors += 1
+            await asyncio.sleep(0.2)
+
+    start = time.perf_counter()
+    await asyncio.gather(page_loads(), *(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    for writer in writers:
+        writer.close()
+
+    latencies.sort()
+    page_latencies.sort()
+    results.update({
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.5) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 0.99) * 1000 if latencies else None,
+        'page_p50_ms': percentile(page_latencies, 0.5) * 1000 if page_latencies else None,
+    })
+    return results
+
+
+def run_mode(mode, port, env, args):
+    if mode == "threaded":
+        command = [sys.executable, os.path.abspath(__file__), "--serve-threaded", str(port)]
+    else:
+        command = [sys.executable, os.path.join(ROOT, "asgi.py"), "--host", "127.0.0.1", "--port", str(port)]
+    log = tempfile.TemporaryFile() # Not a pipe: a full pipe would block the server's request logging
+    server = subprocess.Popen(command, env=env, cwd=ROOT, stdout=log, stderr=log)
+    try:
+        for _ in range(100): # Wait for it to listen
+            try:
+                asyncio.run(get(port, "/api/containers?limit=1", timeout=5))
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            log.seek(0)
+            raise SystemExit(f"{mode} server did not start: {log.read().decode(errors='replace')}")
+        results = asyncio.run(load(port, args.streams, args.clients, args.duration))
+        results['threads'], results['rss_mb'] = process_stats(server.pid)
+        return results
+    finally:
+        server.kill()
+        server.wait()
+        log.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--containers", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the fake daemon takes per request")
+    parser.add_argument("--streams", type=int, default=200, help="Idle container streams held open")
+    parser.add_argument("--clients", type=int, default=100, help="Concurrent /api/containers clients")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds of load per mode")
+    parser.add_argument("--pool-size", type=int, default=32, help="Daemon connections per server (both modes)")
+    parser.add_argument("--port", type=int, default=5311)
+    parser.add_argument("--serve-threaded", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_threaded:
+        serve_threaded(args.serve_threaded)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, "docker.sock")
+        daemon, _ = serve(socket_path, args.containers, args.latency)
+        env = dict(os.environ, DOCKER_BACKEND="api", DOCKER_SOCKET=socket_path, CONTAINER_CACHE="false",
+                   METRICS="false", DOCKER_POOL_SIZE=str(args.pool_size), DOCKER_ASYNC_POOL_SIZE=str(args.pool_size))
+        for name in ("DOCKER_HOSTS", "TASK_STORE_DB"):
+            env.pop(name, None)
+        print(f"{args.containers} containers, {args.latency * 1000:.0f} ms per daemon request, {args.streams} open "
+              f"streams, {args.clients} clients for {args.duration:g}s, {args.pool_size} daemon connections")
+        for mode in ("threaded", "async"):
+            r = run_mode(mode, args.port, env, args)
+            p50 = f"{r['p50_ms']:.0f}" if r['p50_ms'] is not None else "-"
+            p99 = f"{r['p99_ms']:.0f}" if r['p99_ms'] is not None else "-"
+            page = f"{r['page_p50_ms']:.0f}" if r['page_p50_ms'] is not None else "-"
+            print(f"  {mode:<9} streams {r['streams_open']}/{args.streams} in {r['streams_open_s']:.1f}s; "
+                  f"/api/containers {r['rps']:.0f} req/s, p50 {p50} ms, p99 {p99} ms, {r['errors']} errors; "
+                  f"/ p50 {page} ms; server {r['threads']} threads, {r['rss_mb']:.0f} MiB")
+        daemon.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Compare the CLI backend with the Engine API backend.
+
+Starts the fake daemon on a temporary unix socket and the fake docker binary
+on PATH (both serving the same synthetic containers), checks that both
+backends return the same data and times the calls the routes make:
+
+    python bench/bench_backend.py --containers 200 --rounds 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docker_backend import APIBackend, CLIBackend, DockerError  # noqa: E402
+from fake_daemon import serve  # noqa: E402
+from fake_docker import install_fake_docker  # noqa: E402
+
+
+def timed(label, rounds, fn):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {elapsed / rounds * 1000:8.2f} ms/call")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--containers", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        install_fake_docker(tmp)
+        os.environ["PATH"] = tmp + os.pathsep + os.environ["PATH"]
+        os.environ["FAKE_DOCKER_CONTAINERS"] = str(args.containers)
+        server, state = serve(os.path.join(tmp, "docker.sock"), args.containers)
+
+        cli = CLIBackend()
+        cli.VERSION_TTL = 0 # Measure the real fork/exec cost
+        api = APIBackend(os.path.join(tmp, "docker.sock"), pool_size=4)
+
+        # Both backends must produce identical rows for the routes
+        for show_all in (False, True):
+            cli_rows = cli.list_containers(show_all=show_all)
+            api_rows = api.list_containers(show_all=show_all)
+            for cli_row, api_row in zip(cli_rows, api_rows):
+                for key in ("ID", "Names", "Image", "State", "Ports"):
+                    assert cli_row[key] == api_row[key], (key, cli_row[key], api_row[key])
+            assert len(cli_rows) == len(api_rows)
+        ids = [row["ID"] for row in api.list_containers()]
+        assert [c["Id"] for c in cli.inspect(ids)] == [c["Id"] for c in api.inspect(ids)]
+        try:
+            api.inspect(["doesnotexist"])
+            raise AssertionError("expected DockerError for unknown container")
+        except DockerError as e:
+            assert e.container_id == "doesnotexist" and e.status == 404
+
+        for name, backend in (("cli", cli), ("api", api)):
+            print(f"{name} backend ({args.containers} containers):")
+            timed("version()", args.rounds, backend.version)
+            timed("list_containers(all)", args.rounds, lambda: backend.list_containers(show_all=True))
+            timed(f"inspect({len(ids)} ids)", max(1, args.rounds // 10), lambda: backend.inspect(ids))
+            timed("container_action(restart)", args.rounds, lambda: backend.container_action("restart", ids[0]))
+
+        print(f"api backend used {state.connections} connection(s) for {state.requests} requests")
+        api.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
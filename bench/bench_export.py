@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Time /api/export's formats on a collected dataset of synthetic containers.
+
+Writes the dataset a collection would (the report's extracted fields of
+--containers synthetic inspect documents), then streams it out in every
+format, with and without gzip and with a 3-field projection, reporting
+time, output size and peak traced memory (of a separate run) of each:
+
+    python bench/bench_export.py --containers 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_docker import synthetic_container  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--containers", type=int, default=10000)
+    args = parser.parse_args()
+
+    import app
+    from container_export import FORMATS, DatasetWriter, export
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "export.jsonl")
+        start = time.perf_counter()
+        dataset = DatasetWriter(path)
+        for index in range(args.containers):
+            dataset.add(app.export_record(synthetic_container(index), None))
+        dataset.commit()
+        print(f"{args.containers} containers: dataset written in {time.perf_counter() - start:.2f}s "
+              f"({os.path.getsize(path) / 1024:.0f} KiB)")
+
+        for fields in (None, ['name', 'image', 'status']):
+            for format in FORMATS:
+                for compress in (False, True):
+                    start = time.perf_counter()
+                    size = sum(len(chunk) for chunk in export(path, format, fields=fields, gzip=compress)[1])
+                    elapsed = time.perf_counter() - start
+                    # Memory on a second run: tracing slows it down several times
+                    tracemalloc.start()
+                    for _ in export(path, format, fields=fields, gzip=compress)[1]:
+                        pass
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                    label = f"{format}{'.gz' if compress else ''}"
+                    print(f"  {label:<11} {'all fields' if fields is None else ','.join(fields):<17} "
+                          f"{elapsed * 1000:6.0f} ms  {size / 1024:7.0f} KiB  peak {peak / 1024:5.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
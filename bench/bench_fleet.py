@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Time fleet aggregation over several fake Docker daemons.
+
+Starts fake daemons on unix sockets and TCP ports, plus one that answers
+slower than the per-host timeout and one endpoint with nothing listening,
+then compares querying the hosts one after another with the concurrent
+fan-out of Fleet.map(), and checks that the broken hosts are reported without
+holding up or failing the healthy ones:
+
+    python bench/bench_fleet.py --hosts 6 --containers 200 --latency 0.05
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docker_backend import DockerError  # noqa: E402
+from fake_daemon import serve, serve_tcp  # noqa: E402
+from fleet import Fleet  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=6, help="Healthy fake daemons (half unix, half TCP)")
+    parser.add_argument("--containers", type=int, default=200, help="Containers per host")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds of delay per daemon request")
+    parser.add_argument("--timeout", type=float, default=1.0, help="Per-host timeout")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        servers, endpoints = [], []
+        for i in range(args.hosts):
+            if i % 2 == 0:
+                socket_path = os.path.join(tmp, f"docker-{i}.sock")
+                servers.append(serve(socket_path, args.containers, args.latency)[0])
+                endpoints.append(f"host-{i}=unix://{socket_path}")
+            else:
+                server, _, address = serve_tcp(args.containers, args.latency)
+                servers.append(server)
+                endpoints.append(f"host-{i}={address}")
+        slow, _, slow_address = serve_tcp(args.containers, latency=args.timeout * 3)
+        servers.append(slow)
+        endpoints.append(f"slow={slow_address}")
+        endpoints.append(f"missing=unix://{os.path.join(tmp, 'missing.sock')}")
+
+        fleet = Fleet.from_spec(",".join(endpoints), timeout=args.timeout)
+        healthy = fleet.hosts[:args.hosts]
+        print(f"{args.hosts} healthy hosts x {args.containers} containers, {args.latency * 1000:.0f} ms per request, "
+              f"plus a slow and a missing host ({args.timeout:g}s timeout)")
+
+        # Healthy hosts only, one after another vs. all at once
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            for host in healthy:
+                host.backend.list_containers()
+        sequential = (time.perf_counter() - start) / args.rounds
+        healthy_fleet = Fleet(healthy, timeout=args.timeout)
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            results = healthy_fleet.map(lambda host: host.backend.list_containers())
+        fan_out = (time.perf_counter() - start) / args.rounds
+        assert all(r.error is None and len(r.value) == len(results[0].value) for r in results)
+        print(f"  list, sequential:          {sequential * 1000:8.1f} ms")
+        print(f"  list, concurrent fan-out:  {fan_out * 1000:8.1f} ms ({sequential / fan_out:.1f}x)")
+
+        # Inspect containers of every host, as a report does (the fake daemon
+        # answers one inspect request per container, so keep it to a sample)
+        def inspect_all(host):
+            return host.backend.inspect([row["ID"] for row in host.backend.list_containers()][:20])
+
+        start = time.perf_counter()
+        results = healthy_fleet.map(inspect_all, timeout=args.timeout * 10)
+        assert all(r.error is None for r in results), [r.error for r in results]
+        print(f"  inspect 20 each, fan-out:  {(time.perf_counter() - start) * 1000:8.1f} ms "
+              f"({sum(len(r.value) for r in results)} containers)")
+
+        # Failure isolation: the whole fleet takes about one timeout, not one per broken host
+        start = time.perf_counter()
+        results = fleet.map(lambda host: host.backend.list_containers())
+        elapsed = time.perf_counter() - start
+        print(f"  list with broken hosts:    {elapsed * 1000:8.1f} ms")
+        for result in results:
+            outcome = f"{len(result.value)} containers" if result.error is None else f"failed: {result.error}"
+            print(f"    {result.host.name:<10} {outcome}")
+        assert [r.error is None for r in results] == [True] * args.hosts + [False, False]
+        assert elapsed < args.timeout * 2, "a slow host must not hold up the others"
+        try:
+            fleet.get("missing").backend.version()
+            raise AssertionError("expected DockerError for the missing host")
+        except DockerError:
+            pass
+
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
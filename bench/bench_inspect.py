@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Compare per-container `docker inspect` calls with batched inspection.
+
+Runs both collection paths against the fake docker binary with a synthetic
+fixture (1,000 containers by default):
+
+    python bench/bench_inspect.py --containers 1000 --latency 0.01
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from fake_docker import container_id, install_fake_docker  # noqa: E402
+
+
+def inspect_one_by_one(container_ids):
+    """The original collection loop: one `docker inspect` process per container."""
+    all_container_info = []
+    for cid in container_ids:
+        inspect_output = subprocess.check_output(["docker", "inspect", cid]).decode()
+        all_container_info.extend(json.loads(inspect_output))
+    return all_container_info
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--containers", type=int, default=1000, help="Number of synthetic containers")
+    parser.add_argument("--latency", type=float, default=0.0, help="Extra seconds per docker invocation")
+    parser.add_argument("--chunk-size", type=int, default=app.INSPECT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=app.INSPECT_WORKERS)
+    parser.add_argument("--skip-serial", action="store_true", help="Only time the batched path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as bin_dir:
+        install_fake_docker(bin_dir)
+        os.environ["PATH"] = bin_dir + os.pathsep + os.environ["PATH"]
+        os.environ["FAKE_DOCKER_CONTAINERS"] = str(args.containers)
+        os.environ["FAKE_DOCKER_LATENCY"] = str(args.latency)
+        ids = [container_id(i)[:12] for i in range(args.containers)]
+
+        start = time.perf_counter()
+        batched = app.inspect_containers(ids, chunk_size=args.chunk_size, workers=args.workers)
+        batched_time = time.perf_counter() - start
+        print(f"batched ({args.chunk_size}/call, {args.workers} workers): "
+              f"{len(batched)} containers in {batched_time:.2f}s")
+
+        if not args.skip_serial:
+            start = time.perf_counter()
+            serial = inspect_one_by_one(ids)
+            serial_time = time.perf_counter() - start
+            print(f"one inspect per container: {len(serial)} containers in {serial_time:.2f}s")
+            assert [c["Id"] for c in serial] == [c["Id"] for c in batched], "paths returned different results"
+            print(f"speedup: {serial_time / batched_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
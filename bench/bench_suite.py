@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Benchmark and load-test suite on the fake docker binary.
+
+For each container count (10, 100, 1,000 and 5,000 by default) a fresh
+process with the fake `docker` on PATH measures:
+
+- /generate end to end: a cold report, then the best of --runs warm ones (reusing the snapshot cache)
+- /api/containers throughput and latency percentiles with concurrent clients over HTTP
+- peak memory while generating a cold report (tracemalloc peak and process max RSS)
+- parse_ports throughput
+
+Results are written as JSON. --compare checks a run against a baseline and
+exits with status 1 if any metric regressed by more than --tolerance:
+
+    python bench/bench_suite.py --output bench/results.json
+    python bench/bench_suite.py --sizes 10,100 --compare bench/baseline.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_docker import install_fake_docker, ps_entry  # noqa: E402
+
+DEFAULT_SIZES = "10,100,1000,5000"
+
+# Direction of each metric, for --compare
+LOWER_IS_BETTER = ("generate_cold_s", "generate_warm_s", "containers_p50_ms", "containers_p99_ms",
+                   "report_peak_traced_mb", "max_rss_mb")
+HIGHER_IS_BETTER = ("containers_rps", "parse_ports_per_s")
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+# --- Measurements (run in the worker process) ---
+
+def time_generate(app, client):
+    """Seconds from POST /generate until the report task is finished."""
+    start = time.perf_counter()
+    response = client.post('/generate', data={})
+    task_id = response.headers['Location'].rsplit('/', 1)[-1]
+    while app.tasks[task_id]['status'] not in app.FINISHED_STATUSES:
+        time.sleep(0.005)
+    elapsed = time.perf_counter() - start
+    task = app.tasks[task_id]
+    if task['status'] != 'completed':
+        raise RuntimeError(f"report failed: {task['message']}")
+    return elapsed
+
+
+def load_test_containers(app, clients, duration):
+    """Hammer GET /api/containers from concurrent clients over real HTTP for duration seconds."""
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def request_once():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        try:
+            conn.request('GET', '/api/containers')
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        finally:
+            conn.close()
+
+    request_once() # Warm up (first listing, container cache seeding)
+    deadline = time.perf_counter() + duration
+
+    def client_loop():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status = request_once()
+            except OSError as e:
+                status = str(e)
+            elapsed = time.perf_counter() - start
+            with lock:
+                (latencies if status == 200 else errors).append(elapsed)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client_loop) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    latencies.sort()
+    return {
+        'containers_requests': len(latencies),
+        'containers_errors': len(errors),
+        'containers_rps': len(latencies) / elapsed,
+        'containers_p50_ms': percentile(latencies, 0.50) * 1000 if latencies else None,
+        'containers_p99_ms': percentile(latencies, 0.99) * 1000 if latencies else None,
+    }
+
+
+def time_parse_ports(app, count, rounds=3, min_seconds=0.3):
+    """parse_ports() calls per second over the `docker ps` port strings of count containers (best round)."""
+    ports = [ps_entry(index)['Ports'] for index in range(count)]
+    best = 0
+    for _ in range(rounds):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            for ports_str in ports:
+                app.parse_ports(ports_str, 'localhost')
+            calls += len(ports)
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_seconds:
+                break
+        best = max(best, calls / elapsed)
+    return best
+
+
+def run_worker(args):
+    """Measure one container count; prints the results as JSON."""
+    import app
+    from snapshot_cache import InspectSnapshotCache
+
+    count = args.worker
+    client = app.app.test_client()
+    results = {'containers': count}
+    results['generate_cold_s'] = time_generate(app, client)
+    results['generate_warm_s'] = min(time_generate(app, client) for _ in range(args.runs))
+
+    # Memory: a cold report again (fresh snapshot cache), traced
+    app.snapshots = InspectSnapshotCache(max_containers=app.SNAPSHOT_CACHE_CONTAINERS,
+                                         max_fragments=app.SNAPSHOT_CACHE_FRAGMENTS)
+    tracemalloc.start()
+    time_generate(app, client)
+    results['report_peak_traced_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    tracemalloc.stop()
+
+    results.update(load_test_containers(app, args.clients, args.duration))
+    results['parse_ports_per_s'] = time_parse_ports(app, count)
+    results['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # KiB on Linux
+    print(json.dumps(results))
+
+
+# --- Driver ---
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, tolerance):
+    """Print current vs. baseline per metric; returns the regressed (size, metric) pairs."""
+    regressions = []
+    print(f"\nCompared with baseline from {baseline['meta'].get('date')} ({baseline['meta'].get('revision')}), "
+          f"tolerance {tolerance:.0%}:")
+    for size, results in current['results'].items():
+        reference = baseline['results'].get(size)
+        if reference is None:
+            print(f"  {size:>5} containers: not in baseline")
+            continue
+        for metric in (*LOWER_IS_BETTER, *HIGHER_IS_BETTER):
+            now, then = results.get(metric), reference.get(metric)
+            if not now or not then:
+                continue
+            change = now / then - 1
+            regressed = change > tolerance if metric in LOWER_IS_BETTER else change < -tolerance
+            if regressed:
+                regressions.append((size, metric))
+            print(f"  {size:>5} containers  {metric:<22} {then:12.3f} -> {now:12.3f}  {change:+7.1%}"
+                  f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated container counts")
+    parser.add_argument("--latency", type=float, default=0.0, help="Extra seconds per docker invocation")
+    parser.add_argument("--runs", type=int, default=3, help="Warm /generate runs per size (the fastest counts)")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent /api/containers clients")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds of /api/containers load per size")
+    parser.add_argument("--container-cache", action="store_true",
+                        help="Serve /api/containers from the event-driven cache (default: list on every request)")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed relative regression (default 0.3)")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        run_worker(args)
+        return 0
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    current = {
+        'meta': {
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'latency': args.latency,
+            'runs': args.runs,
+            'clients': args.clients,
+            'duration': args.duration,
+            'container_cache': args.container_cache,
+        },
+        'results': {},
+    }
+    with tempfile.TemporaryDirectory() as bin_dir:
+        install_fake_docker(bin_dir)
+        for size in sizes:
+            # A fresh process per size: clean caches, and a max RSS of its own
+            env = dict(os.environ,
+                       PATH=bin_dir + os.pathsep + os.environ["PATH"],
+                       FAKE_DOCKER_CONTAINERS=str(size),
+                       FAKE_DOCKER_LATENCY=str(args.latency),
+                       DOCKER_BACKEND="cli",
+                       CONTAINER_CACHE="true" if args.container_cache else "false",
+                       METRICS="false",
+                       AI_CACHE_DIR="")
+            for name in ("DOCKER_HOSTS", "TASK_STORE_DB", "OPENAI_API_KEY"):
+                env.pop(name, None)
+            worker = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", str(size),
+                                     "--runs", str(args.runs), "--clients", str(args.clients), "--duration", str(args.duration)],
+                                    env=env, capture_output=True, text=True)
+            if worker.returncode != 0:
+                print(worker.stderr, file=sys.stderr)
+                raise SystemExit(f"Benchmark worker for {size} containers failed")
+            results = json.loads(worker.stdout.strip().splitlines()[-1])
+            current['results'][str(size)] = results
+            print(f"{size:>5} containers: generate {results['generate_cold_s']:.2f}s cold / "
+                  f"{results['generate_warm_s']:.2f}s warm, peak {results['report_peak_traced_mb']:.1f} MiB traced "
+                  f"({results['max_rss_mb']:.0f} MiB RSS); /api/containers {results['containers_rps']:.1f} req/s, "
+                  f"p50 {results['containers_p50_ms']:.1f} ms, p99 {results['containers_p99_ms']:.1f} ms "
+                  f"({results['containers_errors']} errors); parse_ports {results['parse_ports_per_s']:,.0f}/s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s)")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""Fake Docker Engine API server on a unix socket (or a TCP port).
+
+Serves the same synthetic containers as fake_docker.py over HTTP/1.1 with
+keep-alive, so the API backend (and its connection pool) can be exercised
+without a real daemon:
+
+    python bench/fake_daemon.py /tmp/fake-docker.sock --containers 100
+    DOCKER_BACKEND=api DOCKER_SOCKET=/tmp/fake-docker.sock python app.py
+
+Several of them make a fleet (see DOCKER_HOSTS):
+
+    python bench/fake_daemon.py --port 2375 --containers 50
+    DOCKER_HOSTS="a=unix:///tmp/fake-docker.sock,b=tcp://127.0.0.1:2375" python app.py
+"""
+import argparse
+import json
+import os
+import re
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+from fake_docker import CREATED_EPOCH, container_id, container_state, synthetic_container, synthetic_stats
+
+
+class FakeDockerState:
+    """Mutable state of the fake daemon: container count and running flags."""
+    def __init__(self, count, latency=0.0):
+        self.count = count
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.running = {i: container_state(i) == "running" for i in range(count)}
+        self.ids = {container_id(i)[:12]: i for i in range(count)}
+        self.connections = 0 # Accepted connections, to check pooling
+        self.requests = 0
+        self.events = [] # Container and network events, as the daemon's /events endpoint reports them
+        self.events_changed = threading.Condition(self.lock)
+
+    def record_event(self, index, action):
+        """Append a container event; caller must hold self.lock."""
+        now = time.time()
+        info = synthetic_container(index)
+        self.events.append({
+            "status": action, "id": info["Id"], "from": info["Config"]["Image"],
+            "Type": "container", "Action": action,
+            "Actor": {"ID": info["Id"], "Attributes": {"image": info["Config"]["Image"], "name": info["Name"][1:]}},
+            "scope": "local", "time": int(now), "timeNano": int(now * 1e9),
+        })
+        self.events_changed.notify_all()
+
+    def record_network_event(self, index, network, action):
+        """Append a network connect/disconnect event for a container; caller must hold self.lock."""
+        now = time.time()
+        self.events.append({
+            "Type": "network", "Action": action,
+            "Actor": {"ID": f"{network}-network-id", "Attributes": {"container": container_id(index), "name": network,
+                                                                   "type": "bridge"}},
+            "scope": "local", "time": int(now), "timeNano": int(now * 1e9),
+        })
+        self.events_changed.notify_all()
+
+    def resolve(self, ref):
+        ref = ref.lstrip("/")
+        if ref.startswith("bench-") and ref[6:].isdigit() and int(ref[6:]) < self.count:
+            return int(ref[6:])
+        index = self.ids.get(ref[:12])
+        if index is not None and container_id(index).startswith(ref):
+            return index
+        return None
+
+    def inspect(self, index):
+        info = synthetic_container(index)
+        running = self.running[index]
+        info["State"]["Status"] = "running" if running else "exited"
+        info["State"]["Running"] = running
+        return info
+
+    def stats(self, index):
+        """Engine API stats document for container number index."""
+        stats = synthetic_stats(index)
+        cpus = 4
+        system_usage = int(stats["elapsed"] * 1e9 * cpus)
+        return {
+            "read": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "cpu_stats": {"cpu_usage": {"total_usage": int(system_usage * stats["cpu_percent"] / 100 / cpus)},
+                          "system_cpu_usage": system_usage, "online_cpus": cpus},
+            "memory_stats": {"usage": stats["memory_usage"] + 4096, "limit": stats["memory_limit"],
+                             "stats": {"inactive_file": 4096}},
+            "networks": {"eth0": {"rx_bytes": stats["net_rx"], "tx_bytes": stats["net_tx"]}},
+            "blkio_stats": {"io_service_bytes_recursive": [
+                {"major": 8, "minor": 0, "op": "read", "value": stats["block_read"]},
+                {"major": 8, "minor": 0, "op": "write", "value": stats["block_write"]}]},
+        }
+
+    def summary(self, index):
+        """Entry of GET /containers/json for container number index."""
+        info = self.inspect(index)
+        ports = []
+        for container_port, bindings in info["NetworkSettings"]["Ports"].items():
+            if not info["State"]["Running"]:
+                break # Stopped containers report no ports, like the real daemon
+            private, proto = container_port.split("/")
+            for binding in bindings or [None]:
+                port = {"PrivatePort": int(private), "Type": proto}
+                if binding:
+                    port.update(IP=binding["HostIp"], PublicPort=int(binding["HostPort"]))
+                ports.append(port)
+        return {
+            "Id": info["Id"],
+            "Names": [info["Name"]],
+            "Image": info["Config"]["Image"],
+            "Created": CREATED_EPOCH - index * 60,
+            "State": info["State"]["Status"],
+            "Status": "Up 2 hours" if info["State"]["Running"] else "Exited (137) 3 hours ago",
+            "Ports": ports,
+            "Labels": info["Config"]["Labels"],
+            "NetworkSettings": {"Networks": info["NetworkSettings"]["Networks"]},
+        }
+
+
+class FakeDockerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, like the real daemon
+    state = None # Set by serve()
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.state.lock:
+            self.state.connections += 1
+
+    def address_string(self):
+        return "unix"
+
+    def send_json(self, status, data=None):
+        body = json.dumps(data).encode() if data is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_events(self, since, until, types=None):
+        """Stream events (of the given types) from `since` as chunked JSON lines until `until` has passed."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        state = self.state
+        sent = 0
+        while True:
+            with state.lock:
+                pending = [e for e in state.events[sent:] if since <= e["timeNano"] / 1e9 <= until
+                           and (not types or e["Type"] in types)]
+                sent = len(state.events)
+                if not pending:
+                    remaining = until - time.time()
+                    if remaining <= 0:
+                        break
+                    state.events_changed.wait(min(remaining, 1.0))
+                    continue
+            for event in pending:
+                line = json.dumps(event).encode() + b"\n"
+                self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+        self.close_connection = True
+
+    def route(self, method):
+        state = self.state
+        with state.lock:
+            state.requests += 1
+        if state.latency:
+            time.sleep(state.latency)
+        url = urlparse(self.path)
+        path = re.sub(r"^/v[0-9.]+", "", url.path)
+        query = parse_qs(url.query)
+
+        if path == "/_ping":
+            return self.send_json(200, "OK")
+        if path == "/version":
+            return self.send_json(200, {"Version": "24.0.0-fake", "ApiVersion": "1.43"})
+        if path == "/containers/json" and method == "GET":
+            show_all = query.get("all", ["0"])[0] in ("1", "true")
+            ids = json.loads(query.get("filters", ["{}"])[0]).get("id")
+            return self.send_json(200, [state.summary(i) for i in range(state.count)
+                                        if (show_all or state.running[i])
+                                        and (not ids or any(container_id(i).startswith(f) for f in ids))])
+        if path == "/events" and method == "GET":
+            return self.stream_events(float(query.get("since", ["0"])[0]),
+                                      float(query.get("until", [str(time.time())])[0]),
+                                      json.loads(query.get("filters", ["{}"])[0]).get("type"))
+
+        match = re.match(r"^/containers/([^/]+)/(json|stats|start|stop|restart)$", path)
+        if match:
+            index = state.resolve(match.group(1))
+            if index is None:
+                return self.send_json(404, {"message": f"No such container: {match.group(1)}"})
+            action = match.group(2)
+            if action == "json" and method == "GET":
+                return self.send_json(200, state.inspect(index))
+            if action == "stats" and method == "GET":
+                return self.send_json(200, state.stats(index))
+            if method == "POST" and action not in ("json", "stats"):
+                with state.lock:
+                    wanted = action != "stop"
+                    if action != "restart" and state.running[index] == wanted:
+                        return self.send_json(304)
+                    state.running[index] = wanted
+                    events = {"start": ("start",), "stop": ("die", "stop"), "restart": ("die", "start", "restart")}
+                    for event in events[action]:
+                        state.record_event(index, event)
+                return self.send_json(204)
+        return self.send_json(404, {"message": "page not found"})
+
+    def do_GET(self):
+        self.route("GET")
+
+    def do_POST(self):
+        self.route("POST")
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128 # Like dockerd; the default 5 resets bursts of new connections
+
+
+class ThreadingTCPHTTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    request_queue_size = 128
+    allow_reuse_address = True
+
+
+def serve(socket_path, count=10, latency=0.0):
+    """Start the fake daemon in a background thread; returns (server, state)."""
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    state = FakeDockerState(count, latency)
+    handler = type("BoundFakeDockerHandler", (FakeDockerHandler,), {"state": state})
+    server = ThreadingUnixHTTPServer(socket_path, handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def serve_tcp(count=10, latency=0.0, port=0):
+    """Like serve(), but on 127.0.0.1:port; returns (server, state, "tcp://127.0.0.1:<port>")."""
+    state = FakeDockerState(count, latency)
+    handler = type("BoundFakeDockerHandler", (FakeDockerHandler,), {"state": state})
+    server = ThreadingTCPHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"tcp://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("socket_path", nargs="?")
+    parser.add_argument("--port", type=int, help="Listen on 127.0.0.1:PORT instead of a unix socket")
+    parser.add_argument("--containers", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of delay per request")
+    args = parser.parse_args()
+    if args.port is not None:
+        server, _, address = serve_tcp(args.containers, args.latency, args.port)
+    elif args.socket_path:
+        server, _ = serve(args.socket_path, args.containers, args.latency)
+        address = args.socket_path
+    else:
+        parser.error("give a socket path or --port")
+    print(f"Fake Docker daemon with {args.containers} containers on {address}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
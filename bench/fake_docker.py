@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""Scripted stand-in for the `docker` CLI used by the benchmarks.
+
+Emits `ps` / `inspect` output for FAKE_DOCKER_CONTAINERS synthetic containers
+and sleeps FAKE_DOCKER_LATENCY seconds per invocation to model CLI/daemon
+overhead. Use install_fake_docker() to put a `docker` shim on PATH.
+"""
+import hashlib
+import json
+import os
+import stat
+import sys
+import time
+
+COMPOSE_PROJECTS = ["shop", "monitoring", "auth", "batch"]
+IMAGES = ["nginx:1.25", "redis:7", "postgres:16", "python:3.11-slim", "grafana/grafana:10.2.0"]
+NETWORKS = ["bridge", "backend", "frontend"]
+CREATED_EPOCH = 1704067200 # 2024-01-01 UTC: container 0 is the newest, each next one a minute older
+
+
+def container_id(index):
+    """Stable 64-character container ID for synthetic container number index."""
+    return hashlib.sha256(f"container-{index}".encode()).hexdigest()
+
+
+def container_state(index):
+    """Every fifth synthetic container is exited, the rest are running."""
+    return "exited" if index % 5 == 4 else "running"
+
+
+def synthetic_container(index):
+    """Build a `docker inspect` document for synthetic container number index."""
+    state = container_state(index)
+    image = IMAGES[index % len(IMAGES)]
+    network = NETWORKS[index % len(NETWORKS)]
+    labels = {"maintainer": "bench@example.com"}
+    if index % 3 != 2:
+        project = COMPOSE_PROJECTS[index % len(COMPOSE_PROJECTS)]
+        labels["com.docker.compose.project"] = project
+        labels["com.docker.compose.service"] = f"svc{index % 7}"
+    ports = {f"{8000 + index % 50}/tcp": None}
+    if state == "running" and index % 2 == 0:
+        ports[f"{80 + index % 3}/tcp"] = [
+            {"HostIp": "0.0.0.0", "HostPort": str(20000 + index)},
+            {"HostIp": "::", "HostPort": str(20000 + index)},
+        ]
+    return {
+        "Id": container_id(index),
+        "Created": time.strftime("%Y-%m-%dT%H:%M:%S.000000000Z", time.gmtime(CREATED_EPOCH - index * 60)),
+        "Path": "/docker-entrypoint.sh",
+        "Args": ["--serve", f"--worker={index}"],
+        "State": {
+            "Status": state,
+            "Running": state == "running",
+            "ExitCode": 0 if state == "running" else 137,
+            "StartedAt": "2024-01-02T00:00:00.000000000Z",
+            "FinishedAt": "0001-01-01T00:00:00Z",
+        },
+        "Image": "sha256:" + hashlib.sha256(image.encode()).hexdigest(),
+        "Name": f"/bench-{index}",
+        "RestartCount": 0,
+        "HostConfig": {
+            "CpuShares": 512 if index % 4 == 0 else 0,
+            "Memory": (256 * 1024 * 1024) if index % 2 == 0 else 0,
+            "NetworkMode": network,
+            "RestartPolicy": {"Name": "unless-stopped", "MaximumRetryCount": 0},
+        },
+        "Mounts": [
+            {"Type": "volume", "Name": f"data{index % 10}", "Source": f"/var/lib/docker/volumes/data{index % 10}/_data",
+             "Destination": "/data", "RW": True},
+            {"Type": "bind", "Source": "/etc/localtime", "Destination": "/etc/localtime", "RW": False},
+        ],
+        "Config": {
+            "Hostname": container_id(index)[:12],
+            "Image": image,
+            "Env": [f"WORKER_ID={index}", "PATH=/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin",
+                    "LANG=C.UTF-8"],
+            "Labels": labels,
+        },
+        "NetworkSettings": {
+            "Ports": ports,
+            "Networks": {
+                network: {
+                    "IPAddress": f"172.{18 + index % 3}.{index // 250 % 250}.{index % 250 + 2}",
+                    "Gateway": f"172.{18 + index % 3}.0.1",
+                    "MacAddress": "02:42:ac:11:00:02",
+                },
+            },
+        },
+    }
+
+
+def synthetic_stats(index, now=None):
+    """Resource usage of synthetic container number index: constant rates, cumulative counters."""
+    elapsed = (now or time.time()) - 1_700_000_000 # Counters grow from a fixed epoch
+    rate = index % 10 + 1
+    return {
+        "cpu_percent": float(index * 7 % 50) + 0.5,
+        "memory_usage": (50 + index % 20 * 10) * 1024 * 1024,
+        "memory_limit": (256 * 1024 * 1024) if index % 2 == 0 else 8 * 1024 ** 3,
+        "net_rx": int(elapsed * rate * 1000),
+        "net_tx": int(elapsed * rate * 400),
+        "block_read": int(elapsed * rate * 50),
+        "block_write": int(elapsed * rate * 200),
+        "elapsed": elapsed,
+    }
+
+
+def _human(size, binary=False):
+    """Format bytes like `docker stats` (decimal units for I/O, binary for memory)."""
+    step, units = (1024.0, ["B", "KiB", "MiB", "GiB", "TiB"]) if binary else (1000.0, ["B", "kB", "MB", "GB", "TB"])
+    for unit in units:
+        if size < step or unit == units[-1]:
+            return f"{size:.4g}{unit}"
+        size /= step
+
+
+def stats_entry(index, now=None):
+    """`docker stats --format '{{json .}}'` line for synthetic container number index."""
+    stats = synthetic_stats(index, now)
+    return {
+        "BlockIO": f"{_human(stats['block_read'])} / {_human(stats['block_write'])}",
+        "CPUPerc": f"{stats['cpu_percent']:.2f}%",
+        "Container": container_id(index)[:12],
+        "ID": container_id(index)[:12],
+        "MemPerc": f"{stats['memory_usage'] / stats['memory_limit'] * 100:.2f}%",
+        "MemUsage": f"{_human(stats['memory_usage'], binary=True)} / {_human(stats['memory_limit'], binary=True)}",
+        "Name": f"bench-{index}",
+        "NetIO": f"{_human(stats['net_rx'])} / {_human(stats['net_tx'])}",
+        "PIDs": str(index % 30 + 1),
+    }
+
+
+def format_ports(info):
+    """Render NetworkSettings.Ports the way `docker ps` prints the Ports column."""
+    parts = []
+    for container_port, bindings in info["NetworkSettings"]["Ports"].items():
+        if bindings:
+            for binding in bindings:
+                host_ip = binding["HostIp"]
+                host_ip = f"[{host_ip}]" if ":" in host_ip and host_ip != "::" else host_ip
+                parts.append(f"{host_ip}:{binding['HostPort']}->{container_port}")
+        else:
+            parts.append(container_port)
+    return ", ".join(parts)
+
+
+def ps_entry(index):
+    """`docker ps --format '{{json .}}'` line for synthetic container number index."""
+    info = synthetic_container(index)
+    running = info["State"]["Running"]
+    return {
+        "ID": info["Id"][:12],
+        "Names": info["Name"].lstrip("/"),
+        "Image": info["Config"]["Image"],
+        "CreatedAt": time.strftime("%Y-%m-%d %H:%M:%S +0000 UTC", time.gmtime(CREATED_EPOCH - index * 60)),
+        "Status": "Up 2 hours" if running else "Exited (137) 3 hours ago",
+        "State": info["State"]["Status"],
+        "Ports": format_ports(info) if running else "",
+        "Labels": ",".join(f"{k}={v}" for k, v in info["Config"]["Labels"].items()),
+    }
+
+
+def _count():
+    return int(os.environ.get("FAKE_DOCKER_CONTAINERS", "10"))
+
+
+_short_ids = {}
+
+
+def _index_for(ref, count):
+    """Resolve a full/short (12 character) ID or name to a synthetic container index."""
+    ref = ref.lstrip("/")
+    if ref.startswith("bench-") and ref[6:].isdigit() and int(ref[6:]) < count:
+        return int(ref[6:])
+    if not _short_ids:
+        _short_ids.update((container_id(index)[:12], index) for index in range(count))
+    index = _short_ids.get(ref[:12])
+    if index is not None and container_id(index).startswith(ref):
+        return index
+    return None
+
+
+def main(argv):
+    time.sleep(float(os.environ.get("FAKE_DOCKER_LATENCY", "0")))
+    count = _count()
+    if not argv or argv[0] in ("--version", "version"):
+        print("Docker version 24.0.0-fake, build bench")
+        return 0
+
+    command, args = argv[0], argv[1:]
+    if command == "ps":
+        show_all = "-a" in args or "--all" in args
+        as_json = "{{json .}}" in args
+        id_filter = next((a[3:] for a in args if a.startswith("id=")), None)
+        for index in range(count):
+            if not show_all and container_state(index) != "running":
+                continue
+            if id_filter and not container_id(index).startswith(id_filter):
+                continue
+            print(json.dumps(ps_entry(index)) if as_json else container_id(index)[:12])
+        return 0
+
+    if command == "inspect":
+        found, missing = [], []
+        for ref in args:
+            index = _index_for(ref, count)
+            if index is None:
+                missing.append(ref)
+            else:
+                found.append(synthetic_container(index))
+        print(json.dumps(found, indent=4))
+        for ref in missing:
+            print(f"Error: No such object: {ref}", file=sys.stderr)
+        return 1 if missing else 0
+
+    if command == "events":
+        # The fake CLI is stateless, so nothing ever happens: wait for --until and exit
+        if "--until" in args:
+            time.sleep(max(0.0, float(args[args.index("--until") + 1]) - time.time()))
+        return 0
+
+    if command == "stats":
+        # Redraw all running containers every FAKE_DOCKER_STATS_INTERVAL seconds, like the real CLI
+        interval = float(os.environ.get("FAKE_DOCKER_STATS_INTERVAL", "1"))
+        running = [index for index in range(count) if container_state(index) == "running"]
+        while True:
+            now = time.time()
+            lines = [json.dumps(stats_entry(index, now)) for index in running]
+            sys.stdout.write("\x1b[2J\x1b[H" + "\n".join(lines) + "\n")
+            sys.stdout.flush()
+            if "--no-stream" in args:
+                return 0
+            time.sleep(interval)
+
+    if command in ("start", "stop", "restart"):
+        for ref in args:
+            if _index_for(ref, count) is None:
+                print(f"Error response from daemon: No such container: {ref}", file=sys.stderr)
+                return 1
+            print(ref)
+        return 0
+
+    print(f"fake docker: unsupported command {command!r}", file=sys.stderr)
+    return 1
+
+
+def install_fake_docker(directory):
+    """Write an executable `docker` shim into directory that runs this script."""
+    shim = os.path.join(directory, "docker")
+    with open(shim, "w") as f:
+        f.write(f"#!/bin/sh\nexec {sys.executable} {os.path.abspath(__file__)} \"$@\"\n")
+    os.chmod(shim, os.stat(shim).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return directory
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
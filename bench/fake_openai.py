@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Stub OpenAI-compatible chat completions server.
+
+Answers POST /v1/chat/completions with a short deterministic markdown reply
+describing the request, optionally after a delay and with every Nth request
+rejected as rate limited (HTTP 429 with Retry-After), so the AI report can be
+generated and timed without an API key:
+
+    python bench/fake_openai.py --port 8099 --latency 0.5 --rate-limit-every 5
+    OPENAI_API_KEY=test OPENAI_BASE_URL=http://127.0.0.1:8099/v1 python app.py
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOpenAIState:
+    """Request counters of the stub server."""
+    def __init__(self, latency=0.0, rate_limit_every=0, retry_after=0.05):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+        self.completed = 0
+        self.prompt_chars = 0 # Characters of user prompts in completed requests
+        self.in_flight = 0
+        self.max_in_flight = 0 # Highest number of concurrent requests seen
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None # Set on the subclass created by serve()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+
+        state = self.state
+        with state.lock:
+            state.requests += 1
+            limited = state.rate_limit_every and state.requests % state.rate_limit_every == 0
+            if limited:
+                state.rate_limited += 1
+            else:
+                state.in_flight += 1
+                state.max_in_flight = max(state.max_in_flight, state.in_flight)
+        if limited:
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                            headers={"Retry-After": str(state.retry_after)})
+            return
+
+        try:
+            time.sleep(state.latency)
+            prompt = body["messages"][-1]["content"]
+            containers = prompt.count('"id":')
+            reply = (f"## Stub report\n\n"
+                     f"- Prompt: {prompt.splitlines()[0][:120]}\n"
+                     f"- Containers in request: {containers}\n"
+                     f"- Prompt digest: {hashlib.sha1(prompt.encode()).hexdigest()[:12]}\n")
+            with state.lock:
+                state.completed += 1
+                state.prompt_chars += len(prompt)
+            self._send_json(200, {
+                "id": f"chatcmpl-{state.requests}", "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": reply}}],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(reply) // 4,
+                          "total_tokens": (len(prompt) + len(reply)) // 4},
+            })
+        finally:
+            with state.lock:
+                state.in_flight -= 1
+
+
+def serve(port=0, latency=0.0, rate_limit_every=0, retry_after=0.05):
+    """Start the stub server on 127.0.0.1 in a background thread; returns (server, state, base_url)."""
+    state = FakeOpenAIState(latency, rate_limit_every, retry_after)
+    handler = type("BoundFakeOpenAIHandler", (FakeOpenAIHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of delay per completion")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every Nth request with 429")
+    args = parser.parse_args()
+    server, _, base_url = serve(args.port, args.latency, args.rate_limit_every)
+    print(f"Stub OpenAI API on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
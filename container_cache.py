@@ -0,0 +1,128 @@
+"""In-memory container list kept current from the Docker event stream.
+
+A background thread seeds the cache from one full listing and then applies
+container events as they arrive, refreshing only the container an event is
+about. The cache is only served while it is known to be current: a broken
+event stream drops it until the next successful resync, and a full resync is
+done at least every `max_age` seconds so status texts ("Up 5 minutes") do not
+drift.
+"""
+import threading
+import time
+
+# Events that change what `docker ps` shows for a container. Anything else
+# (exec_*, attach, resize, top, ...) is ignored.
+STATE_ACTIONS = {"create", "start", "restart", "stop", "die", "kill", "pause", "unpause",
+                 "rename", "update", "oom", "health_status"}
+
+
+class ContainerStateCache:
+    def __init__(self, get_backend, max_age=60, window=5):
+        self.get_backend = get_backend
+        self.max_age = max_age # Seconds between full resyncs; also the staleness bound
+        self.window = window # Seconds per event stream request
+        self._lock = threading.Lock()
+        self._rows = {} # Short container ID -> `docker ps` row, newest first
+        self._lists = {} # show_all -> (version, rows), rebuilt after a change
+        self._synced_at = None # time.monotonic() of the last full listing
+        self._confirmed_at = None # time.monotonic() when the cache was last known current
+        self._thread = None
+        self._stop = threading.Event()
+        self._listeners = [] # Called with the new version after every change
+        self.version = 0 # Bumped on every change
+        self.resyncs = 0
+        self.events_applied = 0
+
+    def start(self):
+        """Start the background thread (idempotent)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="container-cache", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def add_listener(self, callback):
+        """Register callback(version), called from the cache thread after every change."""
+        self._listeners.append(callback)
+
+    def _notify(self, version):
+        for callback in self._listeners:
+            try:
+                callback(version)
+            except Exception as e:
+                print(f"Warning: Container cache listener failed: {e}")
+
+    def is_current(self):
+        confirmed_at = self._confirmed_at
+        return confirmed_at is not None and time.monotonic() - confirmed_at <= self.max_age
+
+    def snapshot(self, show_all=False):
+        """Return (version, rows) from memory, or None if the cache is not current.
+
+        rows is shared between callers and must not be modified.
+        """
+        if not self.is_current():
+            return None
+        with self._lock:
+            cached = self._lists.get(show_all)
+            if cached is None or cached[0] != self.version:
+                rows = [r for r in self._rows.values() if show_all or r.get('State') == 'running']
+                cached = self._lists[show_all] = (self.version, rows)
+            return cached
+
+    # --- Background thread ---
+
+    def _run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                since = time.time()
+                self._resync()
+                backoff = 1
+                # Follow the event stream in back-to-back windows (each one
+                # starts where the previous ended, so nothing falls in between)
+                # until the next full resync is due.
+                while not self._stop.is_set() and time.monotonic() - self._synced_at < self.max_age:
+                    until = time.time() + self.window
+                    for event in self.get_backend().events(since, until):
+                        self._apply(event)
+                    since = until
+                    self._confirmed_at = time.monotonic()
+            except Exception as e: # DockerError or anything unexpected: don't let the thread die
+                # Gap in the event stream: stop serving from memory until a resync succeeds
+                self._confirmed_at = None
+                print(f"Warning: Container cache lost sync with Docker, resyncing in {backoff}s: {e}")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def _resync(self):
+        rows = self.get_backend().list_containers(show_all=True)
+        with self._lock:
+            self._rows = {row['ID']: row for row in rows}
+            self.version += 1
+            self.resyncs += 1
+            version = self.version
+        self._synced_at = self._confirmed_at = time.monotonic()
+        self._notify(version)
+
+    def _apply(self, event):
+        action = (event.get('Action') or event.get('status') or '').split(':')[0]
+        container_id = ((event.get('Actor') or {}).get('ID') or event.get('id') or '')[:12]
+        if not container_id or (action != 'destroy' and action not in STATE_ACTIONS):
+            return
+
+        row = None if action == 'destroy' else self.get_backend().container_row(container_id)
+        with self._lock:
+            if row is None:
+                self._rows.pop(container_id, None)
+            elif container_id in self._rows:
+                self._rows[container_id] = row
+            else:
+                self._rows = {container_id: row, **self._rows} # New containers go first, like `docker ps`
+            self.version += 1
+            self.events_applied += 1
+            version = self.version
+        self._notify(version)
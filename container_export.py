@@ -0,0 +1,194 @@
+"""Streaming exports of the extracted container fields: JSON Lines, CSV and columns.
+
+Each collection writes a dataset file: a header line, then one JSON array
+per container holding the fields the report extracts (FIELDS, in order).
+Exports read it a line at a time, project the requested fields and yield
+the output in chunks of about CHUNK_SIZE bytes, optionally gzip-compressed,
+so memory use doesn't grow with the number of containers.
+
+The "columns" format is JSON Lines too: a header with the typed schema,
+then one object per group of up to ROW_GROUP_SIZE containers holding a list
+per field. String fields with few distinct values (image, status, host,
+...) are dictionary-encoded as {"dictionary": [...], "indices": [...]}.
+"""
+import csv
+import json
+import os
+import threading
+import time
+import types
+import zlib
+
+# Exported fields and their types: string, int (may be null), list (of strings) or map (string -> string)
+FIELDS = (
+    ('host', 'string'),
+    ('id', 'string'),
+    ('name', 'string'),
+    ('image', 'string'),
+    ('created', 'string'),
+    ('status', 'string'),
+    ('compose_project', 'string'),
+    ('compose_service', 'string'),
+    ('ports', 'list'),
+    ('networks', 'list'),
+    ('mounts', 'list'),
+    ('env', 'list'),
+    ('cpu_shares', 'int'),
+    ('memory_limit', 'int'),
+    ('labels', 'map'),
+)
+FIELD_NAMES = tuple(name for name, _ in FIELDS)
+FORMATS = {'jsonl': ('application/x-ndjson', 'jsonl'),
+           'csv': ('text/csv; charset=utf-8', 'csv'),
+           'columns': ('application/x-ndjson', 'columns.jsonl')} # Media type, file extension
+CHUNK_SIZE = 64 * 1024
+ROW_GROUP_SIZE = 1024
+
+
+def _compact(value):
+    return json.dumps(value, separators=(',', ':'))
+
+
+class DatasetWriter:
+    """Writes a collection's dataset next to path and replaces path with it on commit()."""
+    def __init__(self, path):
+        self.path = path
+        self._tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self._file = open(self._tmp_path, 'w')
+        self._file.write(_compact({'fields': FIELD_NAMES, 'collected_at': time.time()}) + "\n")
+        self.count = 0
+
+    def add(self, record):
+        self._file.write(_compact([record.get(name) for name in FIELD_NAMES]) + "\n")
+        self.count += 1
+
+    def commit(self):
+        self._file.close()
+        os.replace(self._tmp_path, self.path) # Exports already streaming keep reading the previous file
+
+    def close(self):
+        """Discard the dataset unless it was committed."""
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+def dataset_collected_at(path):
+    """time.time() of the collection a dataset file holds, or None if there is none."""
+    try:
+        with open(path) as f:
+            return json.loads(f.readline())['collected_at']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def parse_fields(value):
+    """The fields asked for with ?fields=a,b (all if empty); raises ValueError for unknown ones."""
+    fields = [f for f in (value or '').split(',') if f]
+    unknown = [f for f in fields if f not in FIELD_NAMES]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(FIELD_NAMES)}.")
+    return fields or list(FIELD_NAMES)
+
+
+def _rows(path, fields):
+    """(collected_at, iterator of projected rows as lists) of a dataset file; the file closes with the iterator."""
+    f = open(path)
+    header = json.loads(f.readline())
+    positions = [header['fields'].index(name) if name in header['fields'] else None for name in fields]
+
+    def rows():
+        with f:
+            for line in f:
+                row = json.loads(line)
+                yield [row[p] if p is not None else None for p in positions]
+    return header['collected_at'], rows()
+
+
+def _chunked(pieces):
+    """Join small strings into chunks of about CHUNK_SIZE bytes."""
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield "".join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+def _jsonl(rows, fields):
+    for row in rows:
+        yield _compact(dict(zip(fields, row))) + "\n"
+
+
+def _csv(rows, fields):
+    # Lists and maps are written as JSON, so the cells can be parsed back losslessly
+    lines = []
+    writer = csv.writer(types.SimpleNamespace(write=lines.append))
+    structured = [dict(FIELDS)[name] in ('list', 'map') for name in fields]
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow(['' if value is None else _compact(value) if is_structured else value
+                         for value, is_structured in zip(row, structured)])
+        yield from lines
+        lines.clear()
+
+
+def _encode_column(kind, values):
+    if kind == 'string':
+        distinct = {}
+        indices = [distinct.setdefault(value, len(distinct)) for value in values]
+        if len(distinct) * 2 <= len(values): # Repetitive: worth a dictionary
+            return {'dictionary': list(distinct), 'indices': indices}
+    return values
+
+
+def _columns(rows, fields, collected_at):
+    types = dict(FIELDS)
+    yield _compact({'format': 'columns', 'version': 1, 'collected_at': collected_at,
+                    'fields': [{'name': name, 'type': types[name]} for name in fields]}) + "\n"
+    group = []
+    for row in rows:
+        group.append(row)
+        if len(group) == ROW_GROUP_SIZE:
+            yield _row_group(group, fields, types)
+            group = []
+    if group:
+        yield _row_group(group, fields, types)
+
+
+def _row_group(group, fields, types):
+    columns = {name: _encode_column(types[name], [row[i] for row in group]) for i, name in enumerate(fields)}
+    return _compact({'rows': len(group), 'columns': columns}) + "\n"
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(path, format, fields=None, gzip=False):
+    """(collected_at, iterator of bytes) exporting a dataset file in format with the given fields.
+
+    Raises ValueError for an unknown format and OSError if there is no dataset at path.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format!r}, expected one of {', '.join(FORMATS)}.")
+    fields = list(fields or FIELD_NAMES)
+    collected_at, rows = _rows(path, fields)
+    if format == 'jsonl':
+        pieces = _jsonl(rows, fields)
+    elif format == 'csv':
+        pieces = _csv(rows, fields)
+    else:
+        pieces = _columns(rows, fields, collected_at)
+    chunks = _chunked(pieces)
+    return collected_at, (_gzip(chunks) if gzip else chunks)
@@ -0,0 +1,164 @@
+"""In-memory indexes over a container list for filtered, sorted, paginated queries.
+
+A ContainerListIndex is built once per container list (the app keeps one per
+container cache version) and answers /api/containers queries without scanning
+the whole list: postings per state, compose project and host, a trigram index
+for name/image substring search, and one sorted order per sort key, built the
+first time that key is asked for. Pages are addressed with keyset cursors
+(the sort value and key of the last row), so following a cursor costs a
+binary search instead of skipping rows.
+"""
+import base64
+import binascii
+import hashlib
+import json
+import threading
+from bisect import bisect_left, bisect_right
+
+SORT_FIELDS = ('name', 'image', 'state', 'status', 'id', 'project', 'host')
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def encode_cursor(sort, value):
+    return base64.urlsafe_b64encode(json.dumps([sort, value]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """The sort key a cursor points after, or raise ValueError if it is malformed or for another sort."""
+    try:
+        cursor_sort, value = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if cursor_sort != sort:
+        raise ValueError("Cursor belongs to a different sort order")
+    # Sort keys are (field value, container key), or (-creation time, container key) for the default order
+    first_types = (int, float) if sort is None else str
+    if not (isinstance(value, list) and len(value) == 2 and isinstance(value[0], first_types)
+            and not isinstance(value[0], bool) and isinstance(value[1], str)):
+        raise ValueError("Invalid cursor: unexpected sort key")
+    return tuple(value)
+
+
+class _Order:
+    """Containers sorted by one field: sort keys ascending, and each container's rank."""
+    def __init__(self, containers, key_fn):
+        keyed = sorted((key_fn(position, container), position) for position, container in enumerate(containers))
+        self.keys = [key for key, _ in keyed]
+        self.positions = [position for _, position in keyed]
+        self.rank = [0] * len(containers)
+        for rank, position in enumerate(self.positions):
+            self.rank[position] = rank
+
+
+class ContainerListIndex:
+    def __init__(self, containers, key_fn):
+        self.containers = containers
+        self.key_fn = key_fn # Unique key of a container (host/id in fleet mode)
+        self.by_state = {}
+        self.by_project = {}
+        self.by_host = {}
+        for position, container in enumerate(containers):
+            self.by_state.setdefault(container.get('state') or '', []).append(position)
+            self.by_project.setdefault(container.get('compose_project') or '', []).append(position)
+            self.by_host.setdefault(container.get('host') or '', []).append(position)
+        self._digest = None
+        self._orders = {}
+        self._trigram_index = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.containers)
+
+    @property
+    def digest(self):
+        """Hash of the list's content, for ETags."""
+        if self._digest is None:
+            self._digest = hashlib.sha1(json.dumps(self.containers, sort_keys=True).encode()).hexdigest()
+        return self._digest
+
+    # --- Lazily built indexes ---
+
+    def _order(self, sort):
+        with self._lock:
+            order = self._orders.get(sort)
+            if order is None:
+                if sort is None: # Newest first, like docker ps; by key so cursors stay valid as the list changes
+                    key_fn = lambda position, container: (-(container.get('created') or 0), self.key_fn(container))
+                else:
+                    field = {'project': 'compose_project'}.get(sort, sort)
+                    key_fn = lambda position, container: ((container.get(field) or '').lower(), self.key_fn(container))
+                order = self._orders[sort] = _Order(self.containers, key_fn)
+            return order
+
+    def _search(self, field, text):
+        """Positions whose field contains text (case-insensitive)."""
+        text = text.lower()
+        with self._lock:
+            if self._trigram_index is None:
+                index = {}
+                for position, container in enumerate(self.containers):
+                    for name in ('name', 'image'):
+                        for trigram in _trigrams((container.get(name) or '').lower()):
+                            index.setdefault((name, trigram), set()).add(position)
+                self._trigram_index = index
+            index = self._trigram_index
+        if len(text) >= 3:
+            # Only containers having every trigram of the text can contain it
+            candidates = None
+            for trigram in _trigrams(text):
+                postings = index.get((field, trigram), set())
+                candidates = set(postings) if candidates is None else candidates & postings
+                if not candidates:
+                    return set()
+        else:
+            candidates = range(len(self.containers))
+        return {p for p in candidates if text in (self.containers[p].get(field) or '').lower()}
+
+    # --- Queries ---
+
+    def query(self, states=None, project=None, host=None, name=None, image=None, text=None,
+              sort=None, descending=False, cursor=None, limit=None):
+        """One page of matching containers: (containers, total matches, next cursor or None).
+
+        states is a collection of states; name and image are substrings; text
+        matches name or image. cursor comes from a previous page's result.
+        """
+        candidates = None
+
+        def narrow(positions):
+            nonlocal candidates
+            positions = set(positions)
+            candidates = positions if candidates is None else candidates & positions
+
+        if states:
+            narrow(p for state in states for p in self.by_state.get(state, ()))
+        if project is not None:
+            narrow(self.by_project.get(project, ()))
+        if host is not None:
+            narrow(self.by_host.get(host, ()))
+        if name:
+            narrow(self._search('name', name))
+        if image:
+            narrow(self._search('image', image))
+        if text:
+            narrow(self._search('name', text) | self._search('image', text))
+
+        order = self._order(sort)
+        # Ranks of the matches in ascending sort order
+        ranks = range(len(self.containers)) if candidates is None else sorted(order.rank[p] for p in candidates)
+
+        if descending:
+            end = len(ranks) if cursor is None else bisect_left(ranks, bisect_left(order.keys, cursor))
+            page = ranks[max(0, end - limit):end][::-1] if limit else ranks[:end][::-1]
+            more = limit is not None and end > limit
+        else:
+            start = 0 if cursor is None else bisect_left(ranks, bisect_right(order.keys, cursor))
+            page = ranks[start:start + limit] if limit else ranks[start:]
+            more = limit is not None and start + limit < len(ranks)
+
+        page = list(page)
+        next_cursor = encode_cursor(sort, list(order.keys[page[-1]])) if more and page else None
+        return [self.containers[order.positions[rank]] for rank in page], len(ranks), next_cursor
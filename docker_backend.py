@@ -0,0 +1,571 @@
+"""Docker access layer: Engine API over the unix socket, with the CLI as fallback.
+
+Both backends expose the same methods and return data in the shapes the app
+already works with (`docker ps --format '{{json .}}'` rows and `docker inspect`
+documents), so callers don't care which one is active.
+"""
+import functools
+import http.client
+import json
+import os
+import queue
+import re
+import socket
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlencode
+
+from instrumentation import Counter, Histogram
+
+DEFAULT_SOCKET = "/var/run/docker.sock"
+
+DOCKER_CALL_SECONDS = Histogram("docker_call_seconds", "Latency of Docker backend calls (CLI: one docker subprocess)",
+                                ("backend", "operation"))
+DOCKER_CALL_ERRORS = Counter("docker_call_errors_total", "Docker backend calls that failed", ("backend", "operation"))
+
+
+class DockerError(Exception):
+    """A Docker call failed: daemon error, CLI error or unreachable daemon."""
+    def __init__(self, message, container_id=None, status=None):
+        super().__init__(message)
+        self.container_id = container_id
+        self.status = status # HTTP status from the Engine API, if any
+
+
+# --- Engine API backend ---
+
+def _timed(operation):
+    """Record the latency and failures of a backend method in DOCKER_CALL_SECONDS / DOCKER_CALL_ERRORS."""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            except DockerError:
+                DOCKER_CALL_ERRORS.inc(self.name, operation)
+                raise
+            finally:
+                DOCKER_CALL_SECONDS.observe(time.perf_counter() - start, self.name, operation)
+        return wrapper
+    return decorate
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection that connects to a unix domain socket instead of TCP."""
+    def __init__(self, socket_path, timeout=60):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class ConnectionPool:
+    """Small LIFO pool of persistent (keep-alive) connections.
+
+    At most `size` connections exist at a time; callers block in get() until
+    one is returned when they are all in use, for at most `wait` seconds.
+    """
+    def __init__(self, factory, size=8, wait=60):
+        self.factory = factory
+        self.size = size
+        self.wait = wait
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.created = 0 # Total connections opened, handy for checking reuse
+
+    def get(self):
+        if not self._slots.acquire(timeout=self.wait):
+            raise DockerError(f"All {self.size} Docker connections stayed busy for {self.wait}s")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            conn = self.factory()
+        except BaseException:
+            self._slots.release()
+            raise
+        self.created += 1
+        return conn
+
+    def put(self, conn, discard=False):
+        if discard:
+            conn.close()
+        else:
+            self._idle.put(conn)
+        self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def format_api_ports(ports):
+    """Render Engine API port entries the way `docker ps` prints its Ports column."""
+    parts = []
+    for port in ports or []:
+        container_port = f"{port.get('PrivatePort')}/{port.get('Type', 'tcp')}"
+        if port.get('PublicPort'):
+            host_ip = port.get('IP', '0.0.0.0')
+            if ':' in host_ip and host_ip != '::':
+                host_ip = f"[{host_ip}]"
+            part = f"{host_ip}:{port['PublicPort']}->{container_port}"
+        else:
+            part = container_port
+        if part not in parts:
+            parts.append(part)
+    return ", ".join(parts)
+
+
+def _api_stats_sample(container_id, name, stats, previous):
+    """Convert an Engine API stats document to a stats sample (see stats()).
+
+    CPU usage is computed against the previous document of the same container
+    like `docker stats` does; it is None for the first one.
+    """
+    cpu_stats = stats.get('cpu_stats') or {}
+    cpu_usage = (cpu_stats.get('cpu_usage') or {}).get('total_usage')
+    system_usage = cpu_stats.get('system_cpu_usage')
+    cpu_percent = None
+    if previous and cpu_usage is not None and system_usage is not None:
+        cpu_delta = cpu_usage - previous[0]
+        system_delta = system_usage - previous[1]
+        cpus = cpu_stats.get('online_cpus') or len((cpu_stats.get('cpu_usage') or {}).get('percpu_usage') or []) or 1
+        if system_delta > 0 and cpu_delta >= 0:
+            cpu_percent = cpu_delta / system_delta * cpus * 100.0
+
+    memory_stats = stats.get('memory_stats') or {}
+    memory_detail = memory_stats.get('stats') or {}
+    # Page cache is reclaimable; `docker stats` leaves it out too (cgroup v2: inactive_file, v1: cache)
+    cache = memory_detail.get('inactive_file', memory_detail.get('total_inactive_file', memory_detail.get('cache', 0)))
+    networks = (stats.get('networks') or {}).values()
+    block_read = block_write = 0
+    for entry in (stats.get('blkio_stats') or {}).get('io_service_bytes_recursive') or []:
+        op = (entry.get('op') or '').lower()
+        if op == 'read':
+            block_read += entry.get('value', 0)
+        elif op == 'write':
+            block_write += entry.get('value', 0)
+    return {
+        'ID': container_id[:12],
+        'Name': name,
+        'cpu_percent': cpu_percent,
+        'memory_usage': max(memory_stats.get('usage', 0) - cache, 0),
+        'memory_limit': memory_stats.get('limit', 0),
+        'net_rx': sum(n.get('rx_bytes', 0) for n in networks),
+        'net_tx': sum(n.get('tx_bytes', 0) for n in networks),
+        'block_read': block_read,
+        'block_write': block_write,
+    }, (cpu_usage, system_usage)
+
+
+class APIBackend:
+    """Talks HTTP to the Docker Engine API over pooled unix socket (or TCP) connections."""
+    name = "api"
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, pool_size=8, timeout=60, api_version=None, tcp_address=None,
+                 stats_pool_size=2):
+        self.socket_path = socket_path
+        self.tcp_address = tcp_address # (host, port) of a daemon listening on TCP instead of the socket
+        self.endpoint = f"tcp://{tcp_address[0]}:{tcp_address[1]}" if tcp_address else f"unix://{socket_path}"
+        self.prefix = f"/v{api_version}" if api_version else ""
+        self.timeout = timeout
+        self.pool = ConnectionPool(lambda: self._connect(timeout), size=pool_size, wait=timeout)
+        # The stats sampler's own connections, so its rounds never take the ones requests need
+        self.stats_pool = ConnectionPool(lambda: self._connect(timeout), size=stats_pool_size, wait=timeout)
+
+    def _connect(self, timeout):
+        if self.tcp_address:
+            return http.client.HTTPConnection(*self.tcp_address, timeout=timeout)
+        return UnixHTTPConnection(self.socket_path, timeout=timeout)
+
+    def request(self, method, path, params=None, container_id=None, pool=None):
+        """Send one request (on a connection of pool, self.pool by default) and return (status, decoded JSON body or None)."""
+        pool = pool or self.pool
+        url = self.prefix + path
+        if params:
+            url += "?" + urlencode(params)
+        # A pooled keep-alive connection may have been closed by the daemon in
+        # the meantime; retry once on a fresh connection in that case.
+        for attempt in range(2):
+            conn = pool.get()
+            discard = True # Unless the exchange completed, the connection is in an unknown state
+            try:
+                conn.request(method, url, headers={"Host": "docker"})
+                response = conn.getresponse()
+                body = response.read()
+                discard = response.will_close
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                if attempt == 0:
+                    continue
+                raise DockerError(f"Docker daemon closed the connection: {e}", container_id=container_id)
+            except OSError as e:
+                raise DockerError(f"Cannot connect to Docker daemon at {self.endpoint}: {e}", container_id=container_id)
+            except http.client.HTTPException as e:
+                raise DockerError(f"Invalid response from Docker daemon at {self.endpoint}: {e!r}",
+                                  container_id=container_id)
+            finally:
+                pool.put(conn, discard=discard)
+            break
+
+        data = None
+        if body:
+            try:
+                data = json.loads(body)
+            except json.JSONDecodeError:
+                data = body.decode(errors="replace").strip()
+        if response.status >= 400:
+            message = data.get("message") if isinstance(data, dict) else data
+            raise DockerError(message or f"Docker API returned HTTP {response.status}",
+                              container_id=container_id, status=response.status)
+        return response.status, data
+
+    @_timed("version")
+    def version(self):
+        _, data = self.request("GET", "/version")
+        return f"Docker version {data.get('Version', 'unknown')} (API {data.get('ApiVersion', '?')})"
+
+    @_timed("list_containers")
+    def list_containers(self, show_all=False):
+        _, data = self.request("GET", "/containers/json", params={"all": "1"} if show_all else None)
+        return [self._row(c) for c in data or []]
+
+    @staticmethod
+    def _row(c):
+        """Convert an Engine API container summary to a `docker ps` JSON row."""
+        return {
+            'ID': c.get('Id', '')[:12],
+            'Names': ",".join(name.lstrip('/') for name in c.get('Names') or []),
+            'Image': c.get('Image'),
+            'CreatedAt': time.strftime("%Y-%m-%d %H:%M:%S +0000 UTC", time.gmtime(c['Created'])) if c.get('Created') else None,
+            'Status': c.get('Status'),
+            'State': c.get('State'),
+            'Ports': format_api_ports(c.get('Ports')),
+            'Networks': ",".join(((c.get('NetworkSettings') or {}).get('Networks') or {}).keys()),
+            'Labels': ",".join(f"{k}={v}" for k, v in (c.get('Labels') or {}).items()),
+        }
+
+    @_timed("container_row")
+    def container_row(self, container_id):
+        """`list_containers` entry for one container (running or not), or None if it is gone."""
+        _, data = self.request("GET", "/containers/json",
+                               params={"all": "1", "filters": json.dumps({"id": [container_id]})})
+        if not data:
+            return None
+        return self._row(data[0])
+
+    def events(self, since, until, types=("container",)):
+        """Yield events of the given object types between the since and until unix timestamps.
+
+        Uses a dedicated connection because the response streams until `until`.
+        """
+        params = {"since": f"{since:.3f}", "until": f"{until:.3f}",
+                  "filters": json.dumps({"type": list(types)})}
+        conn = self._connect(timeout=max(until - time.time(), 0) + 30)
+        try:
+            conn.request("GET", f"{self.prefix}/events?{urlencode(params)}", headers={"Host": "docker"})
+            response = conn.getresponse()
+            if response.status >= 400:
+                raise DockerError(f"Docker API returned HTTP {response.status} for events")
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+        except (OSError, http.client.HTTPException, json.JSONDecodeError) as e:
+            raise DockerError(f"Docker event stream interrupted: {e}")
+        finally:
+            conn.close()
+
+    @_timed("inspect")
+    def inspect(self, container_ids):
+        inspected = []
+        for container_id in container_ids:
+            _, data = self.request("GET", f"/containers/{quote(container_id, safe='')}/json", container_id=container_id)
+            inspected.append(data)
+        return inspected
+
+    def stats(self, interval):
+        """Yield one list of stats samples for all running containers every interval seconds.
+
+        The Engine API only reports stats per container, so each round asks
+        every running container for a one-shot document (no second sample
+        for precpu_stats; CPU usage is computed against the previous round).
+        They are fetched a few at a time over stats_pool, its own small
+        pool, so sampling never competes with requests for connections.
+        """
+        def fetch(container):
+            container_id = container.get('Id', '')
+            try:
+                _, data = self.request("GET", f"/containers/{quote(container_id, safe='')}/stats",
+                                       params={"stream": "false", "one-shot": "true"}, container_id=container_id,
+                                       pool=self.stats_pool)
+            except DockerError as e:
+                if e.status == 404:
+                    return container, None # Removed since the listing
+                raise
+            return container, data or {}
+
+        previous = {} # Container ID -> (CPU usage, system CPU usage) of the previous round
+        with ThreadPoolExecutor(max_workers=self.stats_pool.size, thread_name_prefix="docker-stats") as executor:
+            while True:
+                started = time.monotonic()
+                _, containers = self.request("GET", "/containers/json")
+                samples, current = [], {}
+                for container, data in executor.map(fetch, containers or []):
+                    if data is None:
+                        continue
+                    container_id = container.get('Id', '')
+                    name = ",".join(n.lstrip('/') for n in container.get('Names') or [])
+                    sample, current[container_id] = _api_stats_sample(container_id, name, data, previous.get(container_id))
+                    samples.append(sample)
+                previous = current
+                yield samples
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    @_timed("container_action")
+    def container_action(self, action, container_id):
+        # 304 means the container already is in the requested state, which the CLI treats as success
+        self.request("POST", f"/containers/{quote(container_id, safe='')}/{action}", container_id=container_id)
+
+    def close(self):
+        self.pool.close()
+        self.stats_pool.close()
+
+
+# --- CLI backend ---
+
+SIZE_UNITS = {'b': 1, 'kb': 1000, 'mb': 1000 ** 2, 'gb': 1000 ** 3, 'tb': 1000 ** 4,
+              'kib': 1024, 'mib': 1024 ** 2, 'gib': 1024 ** 3, 'tib': 1024 ** 4}
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*[A-Za-z]')
+
+
+def parse_size(text):
+    """Bytes in a size as `docker stats` prints it ("1.5MiB", "12.3kB", "0B")."""
+    match = re.match(r'^\s*([0-9.]+)\s*([A-Za-z]*)\s*$', text or '')
+    if not match:
+        return 0
+    return int(round(float(match.group(1)) * SIZE_UNITS.get(match.group(2).lower(), 1)))
+
+
+def _cli_stats_sample(row):
+    """Convert a `docker stats --format '{{json .}}'` row to a stats sample (see stats())."""
+    memory = (row.get('MemUsage') or '').split('/')
+    net = (row.get('NetIO') or '').split('/')
+    block = (row.get('BlockIO') or '').split('/')
+    cpu = (row.get('CPUPerc') or '').rstrip('%')
+    return {
+        'ID': (row.get('ID') or row.get('Container') or '')[:12],
+        'Name': row.get('Name'),
+        'cpu_percent': float(cpu) if cpu.replace('.', '', 1).isdigit() else None,
+        'memory_usage': parse_size(memory[0]),
+        'memory_limit': parse_size(memory[1]) if len(memory) > 1 else 0,
+        'net_rx': parse_size(net[0]),
+        'net_tx': parse_size(net[1]) if len(net) > 1 else 0,
+        'block_read': parse_size(block[0]),
+        'block_write': parse_size(block[1]) if len(block) > 1 else 0,
+    }
+
+
+class CLIBackend:
+    """Shells out to the `docker` binary on PATH."""
+    name = "cli"
+    endpoint = "cli"
+
+    # `docker --version` only tells us the binary exists, so remember a
+    # successful answer for a while instead of forking on every page load.
+    VERSION_TTL = 30
+
+    def __init__(self):
+        self._version = None
+        self._version_checked = 0
+
+    def _run(self, args, container_id=None):
+        try:
+            return subprocess.run(["docker", *args], capture_output=True, check=True).stdout.decode()
+        except FileNotFoundError:
+            raise DockerError("Docker command not found.", container_id=container_id)
+        except subprocess.CalledProcessError as e:
+            stderr = e.stderr.decode(errors="replace").strip() if e.stderr else ""
+            raise DockerError(stderr or str(e), container_id=container_id)
+
+    @_timed("version")
+    def version(self):
+        if self._version and time.monotonic() - self._version_checked < self.VERSION_TTL:
+            return self._version
+        self._version = self._run(["--version"]).strip()
+        self._version_checked = time.monotonic()
+        return self._version
+
+    @_timed("list_containers")
+    def list_containers(self, show_all=False):
+        args = ["ps", "--format", "{{json .}}"]
+        if show_all:
+            args.append("-a")
+        return self._parse_rows(self._run(args))
+
+    @staticmethod
+    def _parse_rows(output):
+        containers = []
+        for line in output.strip().splitlines():
+            try:
+                containers.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"Warning: Could not parse JSON line: {line}") # Log parsing errors
+        return containers
+
+    @_timed("container_row")
+    def container_row(self, container_id):
+        rows = self._parse_rows(self._run(["ps", "-a", "--filter", f"id={container_id}", "--format", "{{json .}}"]))
+        return rows[0] if rows else None
+
+    def events(self, since, until, types=("container",)):
+        args = ["docker", "events", "--format", "{{json .}}", *(f"--filter=type={t}" for t in types),
+                "--since", f"{since:.3f}", "--until", f"{until:.3f}"]
+        try:
+            process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            raise DockerError("Docker command not found.")
+        try:
+            for line in process.stdout:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        print(f"Warning: Could not parse event line: {line!r}")
+            if process.wait() != 0:
+                raise DockerError(process.stderr.read().decode(errors="replace").strip() or "docker events failed")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            process.stderr.close()
+
+    @_timed("inspect")
+    def inspect(self, container_ids):
+        result = subprocess.run(["docker", "inspect", *container_ids], capture_output=True)
+        if result.returncode == 0:
+            try:
+                return json.loads(result.stdout.decode())
+            except json.JSONDecodeError:
+                pass # Fall through and find the culprit one container at a time
+
+        # The bulk call failed (e.g. a container vanished in the meantime);
+        # inspect one by one so the error names the offending container.
+        inspected = []
+        for container_id in container_ids:
+            try:
+                inspected.extend(json.loads(self._run(["inspect", container_id], container_id=container_id)))
+            except json.JSONDecodeError as e:
+                raise DockerError(str(e), container_id=container_id)
+        return inspected
+
+    def stats(self, interval):
+        """Yield lists of stats samples for all running containers from one `docker stats` process.
+
+        `docker stats` redraws all containers about once a second, starting each
+        round with a clear-screen escape; interval is left to the caller.
+        """
+        try:
+            process = subprocess.Popen(["docker", "stats", "--format", "{{json .}}"],
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            raise DockerError("Docker command not found.")
+        try:
+            frame, seen = [], set()
+            for line in process.stdout:
+                line = line.decode(errors="replace")
+                redraw = '\x1b[2J' in line or '\x1b[H' in line
+                line = ANSI_ESCAPE.sub('', line).strip()
+                if not line:
+                    if redraw and frame:
+                        yield frame
+                        frame, seen = [], set()
+                    continue
+                try:
+                    sample = _cli_stats_sample(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"Warning: Could not parse stats line: {line!r}")
+                    continue
+                # A new round starts with a redraw, or at the latest when a container repeats
+                if frame and (redraw or sample['ID'] in seen):
+                    yield frame
+                    frame, seen = [], set()
+                frame.append(sample)
+                seen.add(sample['ID'])
+            if process.wait() != 0:
+                raise DockerError(process.stderr.read().decode(errors="replace").strip() or "docker stats failed")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            process.stderr.close()
+
+    @_timed("container_action")
+    def container_action(self, action, container_id):
+        self._run([action, container_id], container_id=container_id)
+
+    def close(self):
+        pass
+
+
+# --- Backend selection ---
+
+def socket_path_from_env():
+    """Unix socket path from DOCKER_SOCKET or a unix:// DOCKER_HOST."""
+    if os.environ.get("DOCKER_SOCKET"):
+        return os.environ["DOCKER_SOCKET"]
+    docker_host = os.environ.get("DOCKER_HOST", "")
+    if docker_host.startswith("unix://"):
+        return docker_host[len("unix://"):]
+    return DEFAULT_SOCKET
+
+
+def create_backend(kind=None, socket_path=None, pool_size=None):
+    """Create the configured backend.
+
+    kind is "api", "cli" or "auto" (default, from DOCKER_BACKEND): auto uses the
+    Engine API when the socket answers a ping and falls back to the CLI otherwise.
+    """
+    kind = (kind or os.environ.get("DOCKER_BACKEND", "auto")).lower()
+    socket_path = socket_path or socket_path_from_env()
+    pool_size = pool_size or int(os.environ.get("DOCKER_POOL_SIZE", "8"))
+    if kind == "cli":
+        return CLIBackend()
+
+    backend = APIBackend(socket_path, pool_size=pool_size, api_version=os.environ.get("DOCKER_API_VERSION"))
+    if kind == "api":
+        return backend
+    try:
+        backend.request("GET", "/_ping")
+        return backend
+    except DockerError:
+        backend.close()
+        return CLIBackend()
+
+
+def backend_for_endpoint(endpoint, timeout=60, pool_size=None):
+    """Backend for one endpoint: unix:///path/to/docker.sock, tcp://host:port or cli (the docker binary)."""
+    pool_size = pool_size or int(os.environ.get("DOCKER_POOL_SIZE", "8"))
+    api_version = os.environ.get("DOCKER_API_VERSION")
+    if endpoint == "cli":
+        return CLIBackend()
+    if endpoint.startswith("unix://"):
+        return APIBackend(endpoint[len("unix://"):], pool_size=pool_size, timeout=timeout, api_version=api_version)
+    if endpoint.startswith(("tcp://", "http://")):
+        host, _, port = endpoint.split("://", 1)[1].rstrip("/").rpartition(":")
+        if not host or not port.isdigit():
+            raise ValueError(f"Invalid Docker endpoint {endpoint!r}, expected tcp://host:port")
+        return APIBackend(pool_size=pool_size, timeout=timeout, api_version=api_version,
+                          tcp_address=(host.strip("[]"), int(port)))
+    raise ValueError(f"Unsupported Docker endpoint {endpoint!r}, expected unix://, tcp:// or cli")
@@ -0,0 +1,134 @@
+"""Fan-out over several Docker hosts.
+
+DOCKER_HOSTS lists the daemons to aggregate, e.g.
+
+    DOCKER_HOSTS="local=unix:///var/run/docker.sock,web-1=tcp://10.0.0.5:2375,db-1=tcp://10.0.0.6:2375"
+
+Fleet.map() (or Fleet.amap() for coroutines) runs a call against every host at
+the same time and waits at most `timeout` seconds for each: a slow or unreachable host is reported as failed
+instead of holding up (or breaking) the others. Results come back in the
+configured host order, tagged with their host.
+"""
+import asyncio
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+from docker_backend import backend_for_endpoint
+
+HostResult = namedtuple('HostResult', 'host value error elapsed')
+
+
+class DockerHost:
+    def __init__(self, name, endpoint, backend):
+        self.name = name
+        self.endpoint = endpoint
+        self.backend = backend
+
+    def link_hostname(self, request_hostname):
+        """Hostname for links to published ports: the daemon's own address for TCP hosts."""
+        if self.endpoint.startswith(("tcp://", "http://")):
+            return urlparse(self.endpoint.replace("tcp://", "http://", 1)).hostname
+        return request_hostname
+
+
+def parse_hosts(spec):
+    """Parse "name=endpoint,..." into [(name, endpoint)]; a bare endpoint is named after its address."""
+    hosts = []
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, sep, endpoint = entry.partition('=')
+        name, endpoint = name.strip(), endpoint.strip()
+        if not sep:
+            endpoint = name
+            parsed = urlparse(endpoint.replace("tcp://", "http://", 1))
+            name = parsed.hostname or parsed.path.rstrip('/').rsplit('/', 1)[-1] or endpoint
+        if any(existing == name for existing, _ in hosts):
+            raise ValueError(f"Duplicate Docker host name {name!r} in DOCKER_HOSTS")
+        hosts.append((name, endpoint))
+    return hosts
+
+
+class Fleet:
+    def __init__(self, hosts, timeout=10):
+        self.hosts = hosts
+        self.timeout = timeout
+        # Threads of a host that timed out stay busy until its call returns, so
+        # leave room for a few of those before new calls have to wait.
+        self._executor = ThreadPoolExecutor(max_workers=max(4, len(hosts) * 4), thread_name_prefix="fleet")
+        self._lock = threading.Lock()
+        self.status = {host.name: None for host in hosts} # Host name -> outcome of its last call
+
+    @classmethod
+    def from_spec(cls, spec, timeout=10):
+        return cls([DockerHost(name, endpoint, backend_for_endpoint(endpoint, timeout=timeout))
+                    for name, endpoint in parse_hosts(spec)], timeout=timeout)
+
+    def get(self, name):
+        for host in self.hosts:
+            if host.name == name:
+                return host
+        raise KeyError(name)
+
+    def map(self, fn, timeout=None):
+        """Run fn(host) for every host concurrently; returns a HostResult per host, in host order."""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+
+        def timed(host):
+            value = fn(host)
+            return value, time.monotonic() - started
+
+        futures = [self._executor.submit(timed, host) for host in self.hosts]
+        wait(futures, timeout=timeout)
+        results = []
+        for host, future in zip(self.hosts, futures):
+            if not future.done():
+                future.cancel()
+                results.append(HostResult(host, None, f"timed out after {timeout:g}s", timeout))
+                continue
+            try:
+                value, elapsed = future.result()
+                results.append(HostResult(host, value, None, elapsed))
+            except Exception as e: # DockerError or anything unexpected: only this host fails
+                results.append(HostResult(host, None, str(e) or type(e).__name__, time.monotonic() - started))
+        self._record(results)
+        return results
+
+    async def amap(self, fn, timeout=None):
+        """map() for a coroutine function fn(host), run concurrently on the current event loop."""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+
+        async def timed(host):
+            try:
+                value = await asyncio.wait_for(fn(host), timeout)
+                return HostResult(host, value, None, time.monotonic() - started)
+            except asyncio.TimeoutError:
+                return HostResult(host, None, f"timed out after {timeout:g}s", timeout)
+            except Exception as e:
+                return HostResult(host, None, str(e) or type(e).__name__, time.monotonic() - started)
+
+        results = await asyncio.gather(*(timed(host) for host in self.hosts))
+        self._record(results)
+        return results
+
+    def _record(self, results):
+        with self._lock:
+            for result in results:
+                self.status[result.host.name] = {
+                    'ok': result.error is None,
+                    'error': result.error,
+                    'elapsed': round(result.elapsed, 3),
+                    'checked': time.time(),
+                }
+
+    def describe(self):
+        """Configured hosts with the outcome of their last call, for /api/hosts."""
+        with self._lock:
+            return [{'name': host.name, 'endpoint': host.endpoint, 'backend': host.backend.name,
+                     'last_call': self.status[host.name]} for host in self.hosts]
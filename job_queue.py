@@ -0,0 +1,123 @@
+"""Bounded job queue served by a fixed pool of worker threads.
+
+Jobs with the same dedup key share one run while it is queued or running.
+Queued jobs can be cancelled outright; running jobs are cancelled
+cooperatively by calling check_cancelled() at convenient points.
+"""
+import threading
+from collections import OrderedDict
+
+
+class QueueFull(Exception):
+    """Raised by submit() when max_queued jobs are already waiting."""
+    def __init__(self, queued):
+        super().__init__(f"Job queue is full ({queued} jobs waiting)")
+        self.queued = queued
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job by check_cancelled() after cancel()."""
+
+
+class JobQueue:
+    def __init__(self, workers=2, max_queued=10, on_positions_changed=None):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.on_positions_changed = on_positions_changed # Called with {job_id: 1-based position}
+        self._queue = OrderedDict() # job_id -> (fn, args), oldest first
+        self._running = set()
+        self._cancel_requested = set()
+        self._keys = {} # job_id -> dedup key
+        self._inflight = {} # dedup key -> job_id (queued or running)
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def submit(self, job_id, fn, args=(), key=None):
+        """Queue fn(*args) under job_id.
+
+        Returns (job_id, deduplicated): if a job with the same key is already
+        queued or running, nothing is queued and that job's ID is returned.
+        Raises QueueFull when the queue is at capacity.
+        """
+        with self._cond:
+            if key is not None and key in self._inflight:
+                return self._inflight[key], True
+            if len(self._queue) >= self.max_queued:
+                raise QueueFull(len(self._queue))
+            self._queue[job_id] = (fn, args)
+            if key is not None:
+                self._keys[job_id] = key
+                self._inflight[key] = job_id
+            self._start_workers()
+            self._cond.notify()
+        self._announce_positions()
+        return job_id, False
+
+    def cancel(self, job_id):
+        """Cancel a job. Returns 'queued' or 'running' for the state it was in, None if unknown."""
+        with self._cond:
+            if job_id in self._queue:
+                del self._queue[job_id]
+                self._release(job_id)
+                state = 'queued'
+            elif job_id in self._running:
+                self._cancel_requested.add(job_id)
+                return 'running'
+            else:
+                return None
+        self._announce_positions()
+        return state
+
+    def check_cancelled(self, job_id):
+        """Raise JobCancelled if cancellation of this running job was requested."""
+        if job_id in self._cancel_requested:
+            raise JobCancelled(job_id)
+
+    def position(self, job_id):
+        """1-based position of a queued job, or None if it is not queued."""
+        with self._cond:
+            for position, queued_id in enumerate(self._queue, start=1):
+                if queued_id == job_id:
+                    return position
+        return None
+
+    def stats(self):
+        with self._cond:
+            return {'queued': len(self._queue), 'running': len(self._running), 'workers': self.workers}
+
+    def _start_workers(self):
+        # Caller holds self._cond; threads are started on first use only
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"job-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _release(self, job_id):
+        key = self._keys.pop(job_id, None)
+        if key is not None and self._inflight.get(key) == job_id:
+            del self._inflight[key]
+
+    def _announce_positions(self):
+        if self.on_positions_changed is None:
+            return
+        with self._cond:
+            positions = {job_id: position for position, job_id in enumerate(self._queue, start=1)}
+        self.on_positions_changed(positions)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job_id, (fn, args) = self._queue.popitem(last=False)
+                self._running.add(job_id)
+            self._announce_positions()
+            try:
+                fn(*args)
+            except Exception as e: # The job reports its own errors; keep the worker alive
+                print(f"Warning: Job {job_id} failed: {e}")
+            finally:
+                with self._cond:
+                    self._running.discard(job_id)
+                    self._cancel_requested.discard(job_id)
+                    self._release(job_id)
@@ -0,0 +1,246 @@
+"""Live container resource metrics kept in fixed-size ring buffers.
+
+A background thread follows one stats feed for all running containers (see
+the backends' stats()) and records CPU, memory, network and block I/O per
+container in three tiers: raw samples every `interval` seconds, and 1 minute
+and 1 hour averages. Each tier is a ring buffer of preallocated arrays, so a
+container's history takes the same fixed amount of memory no matter how long
+it has been sampled, and at most `max_containers` containers are tracked.
+"""
+import math
+import threading
+import time
+from array import array
+
+# Recorded per sample. Network and block I/O are rates (bytes/s) computed
+# from the cumulative counters of consecutive samples.
+FIELDS = ('cpu_percent', 'memory_usage', 'net_rx_rate', 'net_tx_rate', 'block_read_rate', 'block_write_rate')
+COUNTERS = ('net_rx', 'net_tx', 'block_read', 'block_write')
+TIERS = ('raw', '1m', '1h')
+TIER_SECONDS = {'1m': 60, '1h': 3600}
+
+NAN = float('nan')
+
+
+class RingSeries:
+    """Time series with a fixed number of slots; the oldest point is overwritten when full.
+
+    Timestamps are doubles, values single precision floats (NaN when unknown).
+    """
+    def __init__(self, size):
+        self.size = size
+        self.times = array('d', bytes(8 * size))
+        self.values = [array('f', bytes(4 * size)) for _ in FIELDS]
+        self.count = 0
+        self._next = 0
+
+    def append(self, timestamp, values):
+        slot = self._next
+        self.times[slot] = timestamp
+        for column, value in zip(self.values, values):
+            column[slot] = NAN if value is None else value
+        self._next = (slot + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def points(self, since=None, columns=None):
+        """Points from oldest to newest as [timestamp, value, ...]; NaN becomes None."""
+        columns = range(len(FIELDS)) if columns is None else columns
+        start = (self._next - self.count) % self.size
+        result = []
+        for i in range(self.count):
+            slot = (start + i) % self.size
+            timestamp = self.times[slot]
+            if since is not None and timestamp < since:
+                continue
+            point = [timestamp]
+            for column in columns:
+                value = self.values[column][slot]
+                point.append(None if math.isnan(value) else value)
+            result.append(point)
+        return result
+
+    @property
+    def nbytes(self):
+        return self.times.itemsize * self.size + sum(column.itemsize * self.size for column in self.values)
+
+
+class Downsampler:
+    """Averages samples over fixed time buckets, skipping unknown values."""
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.bucket = None # Start of the current bucket
+        self.sums = array('d', bytes(8 * len(FIELDS)))
+        self.counts = array('I', bytes(4 * len(FIELDS)))
+
+    def add(self, timestamp, values):
+        """Add a sample; returns (bucket start, averages) when the sample closes a bucket."""
+        bucket = timestamp - timestamp % self.seconds
+        closed = None
+        if self.bucket is not None and bucket != self.bucket:
+            closed = (self.bucket, [s / c if c else None for s, c in zip(self.sums, self.counts)])
+            for i in range(len(FIELDS)):
+                self.sums[i] = 0.0
+                self.counts[i] = 0
+        self.bucket = bucket
+        for i, value in enumerate(values):
+            if value is not None:
+                self.sums[i] += value
+                self.counts[i] += 1
+        return closed
+
+
+class ContainerMetrics:
+    """Ring buffers and downsampling state of one container."""
+    def __init__(self, raw_points, minute_points, hour_points):
+        self.name = None
+        self.memory_limit = 0
+        self.last_seen = 0.0
+        self.tiers = {'raw': RingSeries(raw_points), '1m': RingSeries(minute_points), '1h': RingSeries(hour_points)}
+        self._downsamplers = {tier: Downsampler(seconds) for tier, seconds in TIER_SECONDS.items()}
+        self._counters = None # (timestamp, cumulative counters) of the previous sample
+
+    def record(self, timestamp, sample):
+        counters = [sample.get(name) or 0 for name in COUNTERS]
+        rates = [None] * len(COUNTERS)
+        if self._counters is not None:
+            elapsed = timestamp - self._counters[0]
+            for i, (now, before) in enumerate(zip(counters, self._counters[1])):
+                if elapsed > 0 and now >= before: # Counters restart with the container
+                    rates[i] = (now - before) / elapsed
+        self._counters = (timestamp, counters)
+
+        values = [sample.get('cpu_percent'), sample.get('memory_usage'), *rates]
+        self.tiers['raw'].append(timestamp, values)
+        for tier, downsampler in self._downsamplers.items():
+            closed = downsampler.add(timestamp, values)
+            if closed:
+                self.tiers[tier].append(*closed)
+        self.name = sample.get('Name') or self.name
+        self.memory_limit = sample.get('memory_limit') or self.memory_limit
+        self.last_seen = timestamp
+
+
+class MetricsSampler:
+    def __init__(self, get_backend, interval=5, raw_points=120, minute_points=360, hour_points=168,
+                 max_containers=1000):
+        self.get_backend = get_backend
+        self.interval = interval # Seconds between recorded samples
+        self.raw_points = raw_points
+        self.minute_points = minute_points
+        self.hour_points = hour_points
+        self.max_containers = max_containers
+        self._containers = {} # Short container ID -> ContainerMetrics
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._recorded_at = 0.0
+        self.frames = 0 # Stats rounds recorded
+        self.last_error = None
+
+    def start(self):
+        """Start the background thread (idempotent)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="metrics-sampler", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def tier_seconds(self, tier):
+        return TIER_SECONDS.get(tier, self.interval)
+
+    def bytes_per_container(self):
+        """Memory taken by the ring buffers of one container."""
+        return sum(RingSeries(size).nbytes for size in (self.raw_points, self.minute_points, self.hour_points))
+
+    def record_frame(self, timestamp, samples):
+        """Record one stats round (a list of samples of all running containers)."""
+        with self._lock:
+            for sample in samples:
+                container_id = sample.get('ID')
+                if not container_id:
+                    continue
+                metrics = self._containers.get(container_id)
+                if metrics is None:
+                    metrics = self._containers[container_id] = ContainerMetrics(
+                        self.raw_points, self.minute_points, self.hour_points)
+                metrics.record(timestamp, sample)
+            overflow = len(self._containers) - self.max_containers
+            if overflow > 0: # Forget the containers that have been gone longest
+                by_last_seen = sorted(self._containers, key=lambda c: self._containers[c].last_seen)
+                for container_id in by_last_seen[:overflow]:
+                    del self._containers[container_id]
+            self.frames += 1
+
+    def _find(self, container_id):
+        metrics = self._containers.get(container_id[:12])
+        if metrics is None and len(container_id) < 12:
+            matches = [c for c in self._containers if c.startswith(container_id)]
+            if len(matches) == 1:
+                return matches[0], self._containers[matches[0]]
+        return container_id[:12], metrics
+
+    def series(self, container_id, tier='raw', since=None, fields=None):
+        """A window of a container's series as a JSON-ready dict, or None if it has no metrics."""
+        columns = [FIELDS.index(f) for f in fields] if fields else None
+        with self._lock:
+            container_id, metrics = self._find(container_id)
+            if metrics is None:
+                return None
+            return {
+                'id': container_id,
+                'name': metrics.name,
+                'tier': tier,
+                'interval': self.tier_seconds(tier),
+                'memory_limit': metrics.memory_limit,
+                'last_seen': metrics.last_seen,
+                'fields': list(fields) if fields else list(FIELDS),
+                'points': metrics.tiers[tier].points(since, columns),
+            }
+
+    def usage_summary(self, window=3600):
+        """Average CPU and memory per container over the last window seconds, highest CPU first."""
+        since = time.time() - window
+        summary = []
+        with self._lock:
+            for container_id, metrics in self._containers.items():
+                if metrics.last_seen < since:
+                    continue
+                # Minute averages cover the window; a young sampler only has raw samples yet
+                points = metrics.tiers['1m'].points(since, columns=(0, 1)) or metrics.tiers['raw'].points(since, columns=(0, 1))
+                cpu = [p[1] for p in points if p[1] is not None]
+                memory = [p[2] for p in points if p[2] is not None]
+                summary.append({
+                    'id': container_id,
+                    'name': metrics.name,
+                    'cpu_percent': sum(cpu) / len(cpu) if cpu else None,
+                    'memory_usage': sum(memory) / len(memory) if memory else None,
+                    'memory_limit': metrics.memory_limit,
+                })
+        summary.sort(key=lambda s: s['cpu_percent'] or 0, reverse=True)
+        return summary
+
+    # --- Background thread ---
+
+    def _run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                for samples in self.get_backend().stats(self.interval):
+                    if self._stop.is_set():
+                        return
+                    now = time.time()
+                    # `docker stats` redraws every second; keep one round per interval
+                    if now - self._recorded_at >= self.interval * 0.9:
+                        self._recorded_at = now
+                        self.record_frame(now, samples)
+                    backoff = 1
+                    self.last_error = None
+                raise RuntimeError("stats feed ended")
+            except Exception as e: # DockerError or anything unexpected: don't let the thread die
+                self.last_error = str(e)
+                print(f"Warning: Metrics sampler lost the stats feed, retrying in {backoff}s: {e}")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60)
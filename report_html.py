@@ -0,0 +1,53 @@
+"""Server-side rendering of report markdown to HTML.
+
+Reports are rendered once, when their task completes, instead of by every
+viewer's browser. Raw HTML in the markdown is escaped rather than passed
+through: reports quote container names, labels and environment variables,
+which are not trusted. For the same reason links and images may only point
+to http, https and mailto URLs or relative ones; any other URL (javascript:,
+data:, ...) is dropped. Headings get stable anchor IDs (a container section
+becomes e.g. `#container-web-1-0123456789ab`) so sections can be linked to.
+"""
+import html
+import re
+
+import markdown
+from markdown.treeprocessors import Treeprocessor
+
+MARKDOWN_EXTENSIONS = ['tables', 'fenced_code', 'toc']
+SAFE_URL_SCHEMES = ('http', 'https', 'mailto')
+URL_ATTRIBUTES = {'a': 'href', 'img': 'src'}
+_SCHEME = re.compile(r'^([a-z][a-z0-9+.-]*):', re.IGNORECASE)
+_IGNORED_URL_CHARACTERS = re.compile(r'[\x00-\x20\x7f]+') # Browsers skip these when reading a URL's scheme
+
+
+def is_safe_url(url):
+    """Whether url is relative or uses one of SAFE_URL_SCHEMES."""
+    scheme = _SCHEME.match(_IGNORED_URL_CHARACTERS.sub('', html.unescape(url)))
+    return scheme is None or scheme.group(1).lower() in SAFE_URL_SCHEMES
+
+
+class SafeURLs(Treeprocessor):
+    """Drops link and image URLs that are not is_safe_url()."""
+    def run(self, root):
+        for element in root.iter():
+            attribute = URL_ATTRIBUTES.get(element.tag)
+            if attribute and not is_safe_url(element.get(attribute, '')):
+                del element.attrib[attribute]
+
+
+def _heading_ids(tokens):
+    for token in tokens:
+        yield token['id']
+        yield from _heading_ids(token['children'])
+
+
+def markdown_to_html(text):
+    """Render markdown text; returns (html, heading anchor IDs in document order)."""
+    md = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS, extension_configs={'toc': {'permalink': True}})
+    # Escape raw HTML instead of emitting it
+    md.preprocessors.deregister('html_block')
+    md.inlinePatterns.deregister('html')
+    md.treeprocessors.register(SafeURLs(md), 'safe_urls', -1) # After 'unescape', on the final URLs
+    html = md.convert(text)
+    return html, list(_heading_ids(md.toc_tokens))
@@ -0,0 +1,202 @@
+"""Inspect snapshot cache for incremental report generation.
+
+Between reports most containers don't change, so their `docker inspect`
+documents are kept and reused. A cached document is reused when the
+container's listing row is unchanged (ignoring the ever-changing "Up 5
+minutes" text) and Docker reported no events for it since the last
+collection; everything else is re-inspected. Rendered report fragments are
+cached separately, keyed on a state fingerprint of the inspect document
+(State.StartedAt plus a hash of the configuration), so unchanged containers
+are not re-rendered either.
+"""
+import hashlib
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from container_cache import STATE_ACTIONS
+
+# Listing columns that change without the container changing
+VOLATILE_ROW_FIELDS = ('Status', 'RunningFor', 'Size')
+# Network events that change a container's NetworkSettings; the container is in Actor.Attributes.container
+NETWORK_ACTIONS = ('connect', 'disconnect')
+
+
+def row_fingerprint(row):
+    """Fingerprint of a `docker ps` row, ignoring columns that change with time."""
+    stable = {k: v for k, v in row.items() if k not in VOLATILE_ROW_FIELDS}
+    return hashlib.sha1(json.dumps(stable, sort_keys=True).encode()).hexdigest()
+
+
+def changed_container(event):
+    """Short ID of the container whose inspect document an event changes, or None."""
+    action = (event.get('Action') or event.get('status') or '').split(':')[0]
+    actor = event.get('Actor') or {}
+    if event.get('Type') == 'network':
+        if action not in NETWORK_ACTIONS:
+            return None
+        return ((actor.get('Attributes') or {}).get('container') or '')[:12] or None
+    if action in STATE_ACTIONS or action == 'destroy':
+        return (actor.get('ID') or event.get('id') or '')[:12] or None
+    return None
+
+
+def state_fingerprint(container_info):
+    """Fingerprint of an inspect document: ID, StartedAt and a hash of everything the report uses."""
+    state = container_info.get('State', {})
+    config = {
+        'Name': container_info.get('Name'),
+        'Created': container_info.get('Created'),
+        'Status': state.get('Status'),
+        'Config': container_info.get('Config'),
+        'HostConfig': container_info.get('HostConfig'),
+        'Mounts': container_info.get('Mounts'),
+        'Ports': container_info.get('NetworkSettings', {}).get('Ports'),
+        'Networks': sorted((container_info.get('NetworkSettings', {}).get('Networks') or {}).keys()),
+    }
+    config_hash = hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()
+    return f"{container_info.get('Id', '')}:{state.get('StartedAt', '')}:{config_hash}"
+
+
+class LRUCache:
+    """Small thread-safe LRU mapping with a maximum number of entries."""
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class InspectSnapshotCache:
+    def __init__(self, max_containers=1000, max_fragments=2000):
+        self.documents = LRUCache(max_containers) # Short ID -> (row fingerprint, compressed inspect doc, state fingerprint)
+        self.fragments = LRUCache(max_fragments) # State fingerprint -> rendered fragment
+        self._last_listed_at = None # time.time() just before the previous collection's listing
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fragment_hits = 0
+        self.fragment_misses = 0
+
+    def _changed_since_last_collection(self, backend, now):
+        """Short IDs of containers with state events since the last collection, or None if unknown."""
+        with self._lock:
+            since = self._last_listed_at
+        if since is None:
+            return None
+        changed = set()
+        try:
+            for event in backend.events(since, now, types=('container', 'network')):
+                container_id = changed_container(event)
+                if container_id:
+                    changed.add(container_id)
+        except Exception as e:
+            print(f"Warning: Could not read Docker events, re-inspecting all containers: {e}")
+            return None
+        return changed
+
+    async def _achanged_since_last_collection(self, backend, now):
+        """_changed_since_last_collection() for an async_docker backend."""
+        with self._lock:
+            since = self._last_listed_at
+        if since is None:
+            return None
+        try:
+            events = await backend.events(since, now, types=('container', 'network'))
+        except Exception as e:
+            print(f"Warning: Could not read Docker events, re-inspecting all containers: {e}")
+            return None
+        return {container_id for container_id in map(changed_container, events) if container_id}
+
+    def _plan(self, rows, changed):
+        """[(short ID, row fingerprint, cached entry or None)] for rows, and the IDs to inspect."""
+        plan, to_inspect = [], []
+        for row in rows:
+            short_id = row['ID'][:12]
+            fingerprint = row_fingerprint(row)
+            cached = self.documents.get(short_id)
+            if not (cached and changed is not None and short_id not in changed and cached[0] == fingerprint):
+                cached = None
+                to_inspect.append(short_id)
+            plan.append((short_id, fingerprint, cached))
+        return plan, to_inspect
+
+    def _cached(self, cached):
+        with self._lock:
+            self.hits += 1
+        return json.loads(zlib.decompress(cached[1])), cached[2]
+
+    def _store(self, short_id, fingerprint, container_info):
+        if container_info is None or not container_info.get('Id', '').startswith(short_id):
+            raise RuntimeError(f"docker inspect did not return container {short_id} in order")
+        state = state_fingerprint(container_info)
+        # Stored compressed: a cached document costs a fraction of the parsed JSON
+        self.documents.put(short_id, (fingerprint, zlib.compress(json.dumps(container_info).encode()), state))
+        with self._lock:
+            self.misses += 1
+        return container_info, state
+
+    def _collected(self, listed_at):
+        with self._lock:
+            # Events from before this listing have been accounted for now
+            self._last_listed_at = listed_at
+
+    def collect(self, backend, rows, listed_at, inspect):
+        """Yield (inspect doc, state fingerprint) for rows, in order.
+
+        rows are the `docker ps` rows listed at time listed_at. inspect(ids)
+        must yield the inspect documents for ids in order; it is called once,
+        with the IDs that can't be served from the cache. Documents are
+        produced one at a time so callers can process and drop them.
+        """
+        plan, to_inspect = self._plan(rows, self._changed_since_last_collection(backend, time.time()))
+        inspected = iter(inspect(to_inspect)) if to_inspect else iter(())
+        for short_id, fingerprint, cached in plan:
+            if cached is not None:
+                yield self._cached(cached)
+            else:
+                yield self._store(short_id, fingerprint, next(inspected, None))
+        self._collected(listed_at)
+
+    async def acollect(self, backend, rows, listed_at, inspect):
+        """collect() for an async_docker backend: inspect(ids) is an async iterator of the documents."""
+        plan, to_inspect = self._plan(rows, await self._achanged_since_last_collection(backend, time.time()))
+        inspected = aiter(inspect(to_inspect)) if to_inspect else None
+        for short_id, fingerprint, cached in plan:
+            if cached is not None:
+                yield self._cached(cached)
+            else:
+                yield self._store(short_id, fingerprint, await anext(inspected, None))
+        self._collected(listed_at)
+
+    def fragment(self, fingerprint, render):
+        """Cached rendered fragment for a state fingerprint; render() builds it on a miss."""
+        value = self.fragments.get(fingerprint)
+        hit = value is not None
+        if not hit:
+            value = render()
+            self.fragments.put(fingerprint, value)
+        with self._lock:
+            if hit:
+                self.fragment_hits += 1
+            else:
+                self.fragment_misses += 1
+        return value
@@ -0,0 +1,325 @@
+"""Content-addressed, compressed history of container collections.
+
+Every report collection is kept as a snapshot. Inspect documents are stored
+once per distinct content: zlib-compressed under the SHA-256 of their
+canonical JSON in objects/ (fanned out by the first two hex digits, like
+git). A snapshot's container list (its manifest) is stored the same way and
+the snapshot record in snapshots/ only names it, so an hourly snapshot of a
+host that didn't change adds one small record file.
+
+Manifest entries carry a short hash of each diffable field (image, env,
+ports, mounts, ...), so diff() compares two snapshots from their manifests
+alone; inspect documents are only read back for the changed containers, and
+only when the changed values are asked for.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+
+from snapshot_cache import LRUCache
+
+DIFF_FIELDS = ('image', 'command', 'env', 'ports', 'mounts', 'networks', 'labels', 'limits', 'state')
+LIMIT_FIELDS = ('CpuShares', 'NanoCpus', 'CpuQuota', 'Memory', 'MemorySwap', 'PidsLimit')
+GC_GRACE = 3600 # Unreferenced objects younger than this may belong to a collection still in progress
+GC_INTERVAL = 3600 # Seconds between object sweeps after old snapshots were dropped
+STATS_TTL = 300 # Seconds stats() reuses its object totals; counting them reads the metadata of every object
+
+
+def _canonical(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':')).encode()
+
+
+def _short_hash(value):
+    return hashlib.sha256(_canonical(value)).hexdigest()[:16]
+
+
+def _without_volatile(document):
+    """The document without the health check log, which changes with every check."""
+    health = (document.get('State') or {}).get('Health')
+    if not health or not health.get('Log'):
+        return document
+    return dict(document, State=dict(document['State'], Health=dict(health, Log=[])))
+
+
+def diff_fields(document):
+    """The diffable fields of an inspect document: strings, or sorted lists of strings."""
+    config = document.get('Config') or {}
+    host_config = document.get('HostConfig') or {}
+    network_settings = document.get('NetworkSettings') or {}
+    ports = []
+    for container_port, bindings in (network_settings.get('Ports') or {}).items():
+        if bindings:
+            ports.extend(f"{container_port} -> {b.get('HostIp', '0.0.0.0')}:{b.get('HostPort', '')}" for b in bindings)
+        else:
+            ports.append(f"{container_port} (no host binding)")
+    mounts = [f"{m.get('Source', '')} -> {m.get('Destination', '')} ({m.get('Type', '')}{'' if m.get('RW', True) else ', ro'})"
+              for m in document.get('Mounts') or []]
+    return {
+        'image': config.get('Image') or '',
+        'command': " ".join([*(config.get('Entrypoint') or []), *(config.get('Cmd') or [])]),
+        'env': sorted(config.get('Env') or []),
+        'ports': sorted(ports),
+        'mounts': sorted(mounts),
+        'networks': sorted((network_settings.get('Networks') or {}).keys()),
+        'labels': sorted(f"{k}={v}" for k, v in (config.get('Labels') or {}).items()),
+        'limits': [f"{k}={host_config[k]}" for k in LIMIT_FIELDS if host_config.get(k)],
+        'state': (document.get('State') or {}).get('Status') or '',
+    }
+
+
+def _field_change(before, after):
+    if isinstance(after, list):
+        return {'added': sorted(set(after) - set(before)), 'removed': sorted(set(before) - set(after))}
+    return {'before': before, 'after': after}
+
+
+class SnapshotWriter:
+    """Collects one snapshot: add() each inspect document, then commit()."""
+    def __init__(self, history):
+        self.history = history
+        self.entries = []
+        self.size = 0 # Bytes of canonical JSON stored or deduplicated
+
+    def add(self, document, host=None):
+        document = _without_volatile(document)
+        data = _canonical(document)
+        digest = self.history.put_object(data)
+        fields = diff_fields(document)
+        self.entries.append({
+            'host': host,
+            'name': (document.get('Name') or '').lstrip('/'),
+            'id': document.get('Id', ''),
+            'image': fields['image'],
+            'state': fields['state'],
+            'object': digest,
+            'fields': {field: _short_hash(fields[field]) for field in DIFF_FIELDS},
+        })
+        self.size += len(data)
+
+    def commit(self, **meta):
+        """Store the snapshot and return its record; meta is kept in the record (task ID, failed hosts)."""
+        return self.history.commit(self.entries, self.size, meta)
+
+
+class SnapshotHistory:
+    def __init__(self, directory, keep=500):
+        self.directory = directory
+        self.keep = keep # Snapshots kept; older ones are dropped and their unshared objects swept
+        self._objects_dir = os.path.join(directory, "objects")
+        self._snapshots_dir = os.path.join(directory, "snapshots")
+        self._manifests = LRUCache(16) # Manifest digest -> parsed entries
+        self._lock = threading.Lock()
+        self._last_gc = 0
+        self._last_id_ns = 0 # Creation time of the newest snapshot committed here, in nanoseconds
+        self._object_totals = None # (time counted, objects, stored bytes, disk bytes) for stats()
+        self.hits = 0 # Documents already stored
+        self.misses = 0 # Documents written
+        os.makedirs(self._objects_dir, exist_ok=True)
+        os.makedirs(self._snapshots_dir, exist_ok=True)
+
+    # --- Objects ---
+
+    def _object_path(self, digest):
+        return os.path.join(self._objects_dir, digest[:2], digest[2:])
+
+    def put_object(self, data):
+        """Store bytes under their SHA-256 unless already there; returns the hex digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        try:
+            os.utime(path) # Already stored: just make it recent again, so a concurrent sweep keeps it
+            with self._lock:
+                self.hits += 1
+            return digest
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(zlib.compress(data, 6))
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.misses += 1
+        return digest
+
+    def get_object(self, digest):
+        with open(self._object_path(digest), 'rb') as f:
+            return zlib.decompress(f.read())
+
+    def manifest(self, record):
+        """The container entries of a snapshot record."""
+        entries = self._manifests.get(record['manifest'])
+        if entries is None:
+            entries = json.loads(self.get_object(record['manifest']))
+            self._manifests.put(record['manifest'], entries)
+        return entries
+
+    # --- Snapshots ---
+
+    def begin(self):
+        return SnapshotWriter(self)
+
+    def _new_id(self):
+        """A snapshot ID: its UTC creation time to the nanosecond, then random hex.
+
+        IDs sort in commit order; times are kept strictly increasing, so two
+        snapshots in the same nanosecond or across a clock step back don't swap.
+        """
+        with self._lock:
+            created_ns = self._last_id_ns = max(time.time_ns(), self._last_id_ns + 1)
+        seconds, nanoseconds = divmod(created_ns, 10**9)
+        return (time.strftime("%Y%m%dT%H%M%S", time.gmtime(seconds)) + f".{nanoseconds:09d}Z-" + uuid.uuid4().hex[:6],
+                created_ns / 1e9)
+
+    def commit(self, entries, size, meta):
+        entries = sorted(entries, key=lambda e: (e['host'] or '', e['name'], e['id']))
+        snapshot_id, created = self._new_id()
+        record = dict(meta, id=snapshot_id, created=created, containers=len(entries), size=size,
+                      manifest=self.put_object(_canonical(entries)))
+        path = os.path.join(self._snapshots_dir, f"{record['id']}.json")
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(record, f)
+        os.replace(f"{path}.tmp", path)
+        self.prune()
+        return record
+
+    def snapshot_ids(self):
+        """IDs of the stored snapshots, oldest first (IDs start with their UTC time)."""
+        return sorted(name[:-5] for name in os.listdir(self._snapshots_dir) if name.endswith('.json'))
+
+    def get(self, snapshot_id):
+        """The record of a snapshot ("latest" for the newest), or None."""
+        if snapshot_id == 'latest':
+            ids = self.snapshot_ids()
+            if not ids:
+                return None
+            snapshot_id = ids[-1]
+        if not snapshot_id or os.sep in snapshot_id or snapshot_id.startswith('.'):
+            return None
+        try:
+            with open(os.path.join(self._snapshots_dir, f"{snapshot_id}.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def previous(self, snapshot_id):
+        """The record of the snapshot taken before snapshot_id, or None."""
+        older = [i for i in self.snapshot_ids() if i < snapshot_id]
+        return self.get(older[-1]) if older else None
+
+    def records(self, limit=None):
+        """Snapshot records, newest first."""
+        ids = self.snapshot_ids()[::-1]
+        records = (self.get(snapshot_id) for snapshot_id in (ids[:limit] if limit else ids))
+        return [record for record in records if record is not None]
+
+    def document(self, record, container, host=None):
+        """The stored inspect document of a container (name or ID prefix) in a snapshot, or None."""
+        for entry in self.manifest(record):
+            if (host is None or entry['host'] == host) and (entry['name'] == container or
+                                                             (len(container) >= 12 and entry['id'].startswith(container))):
+                return json.loads(self.get_object(entry['object']))
+        return None
+
+    # --- Diffs ---
+
+    def diff(self, old, new, details=False):
+        """What changed from snapshot record old to new.
+
+        Containers are matched by host and name, so one recreated with a new
+        image shows up as changed (and recreated) rather than removed and
+        added. Only the field hashes in the manifests are compared; with
+        details, the stored documents of the changed containers are read to
+        list the changed values.
+        """
+        def summary(entry):
+            return {'host': entry['host'], 'name': entry['name'], 'id': entry['id'][:12],
+                    'image': entry['image'], 'state': entry['state']}
+
+        result = {'from': old['id'], 'to': new['id'], 'added': [], 'removed': [], 'changed': [], 'unchanged': 0}
+        if old['manifest'] == new['manifest']:
+            result['unchanged'] = new['containers']
+            return result
+
+        before = {(e['host'], e['name']): e for e in self.manifest(old)}
+        after = {(e['host'], e['name']): e for e in self.manifest(new)}
+        result['removed'] = [summary(entry) for key, entry in before.items() if key not in after]
+        for key, entry in after.items():
+            previous = before.get(key)
+            if previous is None:
+                result['added'].append(summary(entry))
+                continue
+            fields = [f for f in DIFF_FIELDS if previous['fields'].get(f) != entry['fields'].get(f)]
+            recreated = previous['id'] != entry['id']
+            if previous['object'] == entry['object'] or not (fields or recreated):
+                result['unchanged'] += 1 # Only fields outside DIFF_FIELDS changed (addresses, start time, ...)
+                continue
+            change = dict(summary(entry), fields=fields, recreated=recreated)
+            if recreated:
+                change['previous_id'] = previous['id'][:12]
+            if details:
+                old_fields = diff_fields(json.loads(self.get_object(previous['object'])))
+                new_fields = diff_fields(json.loads(self.get_object(entry['object'])))
+                change['details'] = {f: _field_change(old_fields[f], new_fields[f]) for f in fields}
+            result['changed'].append(change)
+        return result
+
+    # --- Retention ---
+
+    def prune(self):
+        """Drop the snapshots beyond keep, oldest first, then sweep objects now unused (at most hourly)."""
+        with self._lock:
+            ids = self.snapshot_ids()
+            for snapshot_id in ids[:max(0, len(ids) - self.keep)]:
+                try:
+                    os.remove(os.path.join(self._snapshots_dir, f"{snapshot_id}.json"))
+                except OSError:
+                    pass
+            if len(ids) > self.keep and time.time() - self._last_gc >= GC_INTERVAL:
+                self._last_gc = time.time()
+                self._sweep()
+
+    def _sweep(self):
+        referenced = set()
+        for record in self.records():
+            if record['manifest'] not in referenced:
+                referenced.add(record['manifest'])
+                try:
+                    referenced.update(entry['object'] for entry in self.manifest(record))
+                except (OSError, ValueError):
+                    pass
+        cutoff = time.time() - GC_GRACE
+        self._object_totals = None
+        for fan_out in os.scandir(self._objects_dir):
+            if not fan_out.is_dir():
+                continue
+            for entry in os.scandir(fan_out.path):
+                if fan_out.name + entry.name not in referenced and entry.stat().st_mtime < cutoff:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+    def stats(self):
+        """Snapshots kept, distinct objects, their compressed size and the disk space they take.
+
+        The object totals are counted at most every STATS_TTL seconds (and
+        after each sweep); the snapshot count is always current.
+        """
+        totals = self._object_totals
+        if totals is None or time.monotonic() - totals[0] >= STATS_TTL:
+            objects = stored = disk = 0
+            for fan_out in os.scandir(self._objects_dir):
+                if fan_out.is_dir():
+                    for entry in os.scandir(fan_out.path):
+                        stat = entry.stat()
+                        objects += 1
+                        stored += stat.st_size
+                        disk += stat.st_blocks * 512
+            totals = self._object_totals = (time.monotonic(), objects, stored, disk)
+        _, objects, stored, disk = totals
+        return {'snapshots': len(self.snapshot_ids()), 'objects': objects, 'stored_bytes': stored, 'disk_bytes': disk}
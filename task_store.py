@@ -0,0 +1,333 @@
+"""Storage for report generation tasks.
+
+TaskStore keeps tasks in memory and evicts tasks that have not changed for
+`ttl` seconds, and finished tasks beyond `max_tasks` (least recently used
+first), deleting their report directories. SQLiteTaskStore persists tasks
+in a SQLite database so they survive restarts and are visible to every worker
+process sharing the database file.
+
+Both behave like the dict the app used before: `tasks[task_id]` returns the
+task dict and `task_id in tasks` checks for existence. Tasks report their own
+changes through save(), which the app's Task class calls on every update.
+
+A task runs in the process that created it. SQLiteTaskStore records that
+process with the task, so a process starting up can fail the unfinished
+tasks of processes that are gone, and passes cancellation requests from
+other processes on to the owner, which polls cancel_requested().
+"""
+import glob
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+REPORT_DIR_PREFIX = "docker_info_"
+FINISHED_STATUSES = ('completed', 'error', 'cancelled')
+CANCEL_POLL_INTERVAL = 1.0 # Seconds between database checks for a cancellation request of a task
+
+
+def remove_report_dir(task):
+    """Delete the temporary report directory of a task, if it has one."""
+    task_dir = task.get('task_dir')
+    # Only ever delete directories this app created
+    if task_dir and os.path.basename(task_dir).startswith(REPORT_DIR_PREFIX) and os.path.isdir(task_dir):
+        shutil.rmtree(task_dir, ignore_errors=True)
+
+
+class TaskStore:
+    """In-memory task store with TTL and LRU eviction."""
+    def __init__(self, max_tasks=200, ttl=24 * 3600, task_factory=None):
+        self.max_tasks = max_tasks
+        self.ttl = ttl
+        self.task_factory = task_factory or (lambda task_id, data: data)
+        self._tasks = OrderedDict() # task_id -> task, least recently used first
+        self._updated = {} # task_id -> time.time() of the last change
+        self._lock = threading.RLock()
+        self._swept = False
+
+    def __setitem__(self, task_id, task):
+        with self._lock:
+            self._tasks[task_id] = task
+            self._tasks.move_to_end(task_id)
+            self._updated[task_id] = time.time()
+        self.save(task_id, task)
+        self.evict()
+
+    def __getitem__(self, task_id):
+        with self._lock:
+            task = self._tasks[task_id]
+            self._tasks.move_to_end(task_id)
+            return task
+
+    def get(self, task_id, default=None):
+        try:
+            return self[task_id]
+        except KeyError:
+            return default
+
+    def __contains__(self, task_id):
+        with self._lock:
+            return task_id in self._tasks
+
+    def __delitem__(self, task_id):
+        with self._lock:
+            task = self._tasks.pop(task_id)
+            self._updated.pop(task_id, None)
+        remove_report_dir(task)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tasks)
+
+    def items(self):
+        with self._lock:
+            return list(self._tasks.items())
+
+    def count_by_status(self):
+        """{status: number of tasks}"""
+        counts = {}
+        with self._lock:
+            for task in self._tasks.values():
+                counts[task.get('status')] = counts.get(task.get('status'), 0) + 1
+        return counts
+
+    def save(self, task_id, task):
+        """Record a change to a task (refreshes its TTL)."""
+        with self._lock:
+            if task_id in self._updated:
+                self._updated[task_id] = time.time()
+
+    def is_local(self, task_id):
+        """True if changes to this task are made (and announced) in this process."""
+        return True
+
+    def request_cancel(self, task_id):
+        """Ask the process running a task to cancel it; False if the task is unknown or finished."""
+        return False # Every task runs in this process, whose queue cancels it directly
+
+    def cancel_requested(self, task_id):
+        """True if another process asked to cancel this task."""
+        return False
+
+    def evict(self):
+        """Drop tasks unchanged for ttl seconds, then finished tasks beyond max_tasks.
+
+        A running task updates itself regularly, so it only expires if whatever
+        was running it is gone (e.g. after a restart).
+        """
+        now = time.time()
+        evicted = []
+        with self._lock:
+            for task_id, task in list(self._tasks.items()):
+                if now - self._updated.get(task_id, now) > self.ttl:
+                    evicted.append(self._pop(task_id))
+            overflow = len(self._tasks) - self.max_tasks
+            for task_id, task in list(self._tasks.items()): # Least recently used first
+                if overflow <= 0:
+                    break
+                if task.get('status') in FINISHED_STATUSES:
+                    evicted.append(self._pop(task_id))
+                    overflow -= 1
+        for task in evicted:
+            remove_report_dir(task)
+        self._sweep_orphans()
+
+    def _pop(self, task_id):
+        self._updated.pop(task_id, None)
+        return self._tasks.pop(task_id)
+
+    def _known_report_dirs(self):
+        with self._lock:
+            return {t.get('task_dir') for t in self._tasks.values()}
+
+    def _sweep_orphans(self):
+        """Once per process: remove report directories left behind by earlier runs."""
+        if self._swept:
+            return
+        self._swept = True
+        known = self._known_report_dirs()
+        cutoff = time.time() - self.ttl
+        for task_dir in glob.glob(os.path.join(tempfile.gettempdir(), REPORT_DIR_PREFIX + "*")):
+            try:
+                if task_dir not in known and os.path.getmtime(task_dir) < cutoff:
+                    shutil.rmtree(task_dir, ignore_errors=True)
+            except OSError:
+                pass
+
+
+class SQLiteTaskStore(TaskStore):
+    """Task store persisted in SQLite, shared by all processes using the same file.
+
+    Tasks created by this process stay in memory as live objects (and are
+    written through on every change); tasks of other processes are read from
+    the database on each access so they are always current.
+    """
+    def __init__(self, path, max_tasks=200, ttl=24 * 3600, task_factory=None):
+        super().__init__(max_tasks=max_tasks, ttl=ttl, task_factory=task_factory)
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL") # Readers in other workers don't block writers
+        self._db.execute("""CREATE TABLE IF NOT EXISTS tasks (
+            id TEXT PRIMARY KEY, data TEXT NOT NULL, status TEXT, updated REAL NOT NULL, accessed REAL NOT NULL)""")
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(tasks)")}
+        for column, definition in (('owner', 'TEXT'), ('cancel_requested', 'INTEGER NOT NULL DEFAULT 0')):
+            if column not in columns: # Database created by an earlier version
+                self._db.execute(f"ALTER TABLE tasks ADD COLUMN {column} {definition}")
+        self._token = uuid.uuid4().hex[:8] # Tells this process from an earlier one with the same PID (e.g. PID 1 in a container)
+        self._cancel_checked = {} # task_id -> time.monotonic() of the last cancel_requested() query
+        self.fail_orphans()
+
+    def _load(self, task_id):
+        with self._lock:
+            row = self._db.execute("SELECT data FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE tasks SET accessed = ? WHERE id = ?", (time.time(), task_id))
+        return self.task_factory(task_id, json.loads(row[0]))
+
+    def __getitem__(self, task_id):
+        with self._lock:
+            if task_id in self._tasks:
+                self._db.execute("UPDATE tasks SET accessed = ? WHERE id = ?", (time.time(), task_id))
+                return self._tasks[task_id]
+        task = self._load(task_id)
+        if task is None:
+            raise KeyError(task_id)
+        return task
+
+    def __contains__(self, task_id):
+        with self._lock:
+            if task_id in self._tasks:
+                return True
+            return self._db.execute("SELECT 1 FROM tasks WHERE id = ?", (task_id,)).fetchone() is not None
+
+    def __delitem__(self, task_id):
+        task = self.get(task_id)
+        with self._lock:
+            self._tasks.pop(task_id, None)
+            self._updated.pop(task_id, None)
+            self._db.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+        if task is not None:
+            remove_report_dir(task)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def items(self):
+        with self._lock:
+            rows = self._db.execute("SELECT id, data FROM tasks ORDER BY accessed").fetchall()
+            local = dict(self._tasks)
+        return [(task_id, local.get(task_id) or self.task_factory(task_id, json.loads(data)))
+                for task_id, data in rows]
+
+    def count_by_status(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+
+    def save(self, task_id, task):
+        now = time.time()
+        with self._lock:
+            if task_id not in self._tasks:
+                return # Only the owning process writes a task
+            self._db.execute(
+                """INSERT INTO tasks (id, data, status, updated, accessed, owner) VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(id) DO UPDATE SET data = excluded.data, status = excluded.status,
+                   updated = excluded.updated""",
+                (task_id, json.dumps(dict(task)), task.get('status'), now, now, self.owner))
+            if task.get('status') in FINISHED_STATUSES:
+                self._cancel_checked.pop(task_id, None)
+
+    def is_local(self, task_id):
+        with self._lock:
+            return task_id in self._tasks
+
+    @property
+    def owner(self):
+        """host:PID:token of this process, recorded with the tasks it runs (the PID changes in forked workers)."""
+        return f"{socket.gethostname()}:{os.getpid()}:{self._token}"
+
+    def request_cancel(self, task_id):
+        finished = ",".join("?" * len(FINISHED_STATUSES))
+        with self._lock:
+            cursor = self._db.execute(f"UPDATE tasks SET cancel_requested = 1 WHERE id = ? AND status NOT IN ({finished})",
+                                      (task_id, *FINISHED_STATUSES))
+            return cursor.rowcount > 0
+
+    def cancel_requested(self, task_id):
+        # Called at every checkpoint of a running task, so the database is only asked every CANCEL_POLL_INTERVAL
+        now = time.monotonic()
+        with self._lock:
+            if now - self._cancel_checked.get(task_id, 0) < CANCEL_POLL_INTERVAL:
+                return False
+            self._cancel_checked[task_id] = now
+            row = self._db.execute("SELECT cancel_requested FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            return bool(row and row[0])
+
+    def _owner_exited(self, owner):
+        """True if owner was a process of this host that is gone; processes of other hosts can't be checked."""
+        try:
+            hostname, pid, _ = owner.rsplit(':', 2)
+            pid = int(pid)
+        except ValueError:
+            return False
+        if hostname != socket.gethostname():
+            return False # Left to the TTL
+        if pid == os.getpid():
+            return owner != self.owner # An earlier process that had this PID
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass # Exists, run by another user
+        return False
+
+    def fail_orphans(self):
+        """Mark the unfinished tasks of exited processes as failed, instead of leaving them running until the TTL."""
+        finished = ",".join("?" * len(FINISHED_STATUSES))
+        with self._lock:
+            rows = self._db.execute(f"SELECT id, data, owner FROM tasks WHERE status NOT IN ({finished}) AND owner IS NOT NULL",
+                                    FINISHED_STATUSES).fetchall()
+            for task_id, data, owner in rows:
+                if not self._owner_exited(owner):
+                    continue
+                task = dict(json.loads(data), status='error',
+                            message='Error: The worker process running this task exited before it finished.')
+                self._db.execute("UPDATE tasks SET data = ?, status = 'error', updated = ? WHERE id = ?",
+                                 (json.dumps(task), time.time(), task_id))
+
+    def evict(self):
+        now = time.time()
+        finished = ",".join("?" * len(FINISHED_STATUSES))
+        with self._lock:
+            evicted = self._db.execute("SELECT id, data FROM tasks WHERE updated < ?", (now - self.ttl,)).fetchall()
+            self._delete_rows(evicted)
+            overflow = self._db.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] - self.max_tasks
+            if overflow > 0:
+                lru = self._db.execute(
+                    f"SELECT id, data FROM tasks WHERE status IN ({finished}) ORDER BY accessed LIMIT ?",
+                    (*FINISHED_STATUSES, overflow)).fetchall()
+                self._delete_rows(lru)
+                evicted += lru
+        for _, data in evicted:
+            remove_report_dir(json.loads(data))
+        self._sweep_orphans()
+
+    def _delete_rows(self, rows):
+        for task_id, _ in rows:
+            self._db.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+            self._tasks.pop(task_id, None)
+            self._updated.pop(task_id, None)
+            self._cancel_checked.pop(task_id, None)
+
+    def _known_report_dirs(self):
+        # Directories of tasks persisted by any process are not orphans
+        with self._lock:
+            return {json.loads(data).get('task_dir') for (data,) in self._db.execute("SELECT data FROM tasks")}
@@ -0,0 +1,61 @@
+"""Makes the app's modules and the fakes in bench/ importable from the tests; fixtures shared by them."""
+import os
+import socket
+import sys
+import tempfile
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "bench")]
+
+
+@pytest.fixture(scope="session")
+def app():
+    """The app module, imported once against the fake `docker` CLI with caches, history and metrics off."""
+    from fake_docker import install_fake_docker
+
+    bin_dir = install_fake_docker(tempfile.mkdtemp(prefix="fake-docker-"))
+    os.environ.update(PATH=bin_dir + os.pathsep + os.environ["PATH"], FAKE_DOCKER_CONTAINERS="50",
+                      DOCKER_BACKEND="cli", CONTAINER_CACHE="false", METRICS="false",
+                      HISTORY_DIR="", EXPORT_DATASET="", AI_CACHE_DIR="")
+    for name in ("DOCKER_HOSTS", "TASK_STORE_DB", "OPENAI_API_KEY", "OPENAI_BASE_URL"):
+        os.environ.pop(name, None)
+    import app
+    return app
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    """A fake Engine API daemon with 20 containers: (socket path, FakeDockerState)."""
+    from fake_daemon import serve
+
+    socket_path = str(tmp_path / "docker.sock")
+    server, state = serve(socket_path, 20)
+    yield socket_path, state
+    server.shutdown()
+
+
+@pytest.fixture
+def garbage_daemon(tmp_path):
+    """A unix socket answering every request with something that isn't HTTP."""
+    socket_path = str(tmp_path / "garbage.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen()
+
+    def answer():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            with conn:
+                conn.recv(65536)
+                conn.sendall(b"garbage\r\n\r\n")
+
+    threading.Thread(target=answer, daemon=True).start()
+    yield socket_path
+    listener.close()
+    os.remove(socket_path)
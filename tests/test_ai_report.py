@@ -0,0 +1,89 @@
+"""AIReportGenerator against the stub OpenAI server: retries, the completion cache and the token budget."""
+import json
+
+import openai
+import pytest
+
+from ai_report import (NOTES_SEPARATOR, SYSTEM_PROMPT, AIReportGenerator, CompletionCache, estimate_tokens, fit_notes,
+                       project_container)
+from fake_docker import synthetic_container
+from fake_openai import serve
+
+
+@pytest.fixture
+def stub():
+    """Starts stub servers: stub(rate_limit_every) -> (client, state)."""
+    started = []
+
+    def start(rate_limit_every=0):
+        server, state, base_url = serve(rate_limit_every=rate_limit_every, retry_after=0.01)
+        client = openai.OpenAI(api_key="test", base_url=base_url, max_retries=0)
+        started.append((server, client))
+        return client, state
+    yield start
+    for server, client in started:
+        client.close()
+        server.shutdown()
+
+
+def test_rate_limited_completion_is_retried_then_cached(stub, tmp_path):
+    client, state = stub(rate_limit_every=2)
+    cache = CompletionCache(str(tmp_path))
+    generator = AIReportGenerator(client, "stub", max_retries=3, cache=cache)
+
+    first = generator.complete("first prompt")
+    second = generator.complete("second prompt") # The stub rejects every second request
+    assert state.rate_limited == 1 and state.completed == 2
+    assert generator.requests == 3
+
+    assert generator.complete("second prompt") == second
+    assert generator.complete("first prompt") == first
+    assert state.requests == 3 and generator.requests == 3
+    assert cache.hits == 2
+
+
+def test_rate_limit_raised_once_retries_are_used_up(stub, tmp_path):
+    client, state = stub(rate_limit_every=1)
+    generator = AIReportGenerator(client, "stub", max_retries=2, cache=CompletionCache(str(tmp_path)))
+    with pytest.raises(openai.RateLimitError):
+        generator.complete("prompt")
+    assert state.requests == 3
+
+
+def test_fit_notes_keeps_notes_within_budget():
+    notes = ["short note", "x" * 40000, "y" * 10000]
+    fitted = fit_notes(notes, 2000)
+    assert estimate_tokens(NOTES_SEPARATOR.join(fitted)) <= 2000
+    assert fitted[0] == "short note"
+    assert fit_notes(notes[:1], 2000) == notes[:1]
+
+
+def test_every_request_stays_within_token_budget(stub, tmp_path):
+    client, _ = stub()
+    budget = 2000
+    prompts = []
+    generator = AIReportGenerator(client, "stub", token_budget=budget, cache=CompletionCache(str(tmp_path)))
+    complete = generator.complete
+    generator.complete = lambda prompt, check_cancelled=None: prompts.append(prompt) or complete(prompt, check_cancelled)
+
+    report = generator.generate([project_container(synthetic_container(i)) for i in range(200)])
+    assert report.startswith("## Stub report")
+    assert len(prompts) > 2 # Batches, then the final merge
+    assert max(generator._prompt_overhead("") + estimate_tokens(prompt) for prompt in prompts) <= budget
+
+
+def test_single_report_prompt_is_measured_against_its_own_template(stub, tmp_path):
+    client, _ = stub()
+    records = [project_container(synthetic_container(i)) for i in range(10)]
+    single = AIReportGenerator(client, "stub", token_budget=10**6)._single_report_prompt(
+        [json.dumps(record, separators=(',', ':')) for record in records])
+    # One token short of the single report prompt, though the batch still fits with the shorter map prompt
+    budget = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(single) - 1
+    prompts = []
+    generator = AIReportGenerator(client, "stub", token_budget=budget, cache=CompletionCache(str(tmp_path)))
+    complete = generator.complete
+    generator.complete = lambda prompt, check_cancelled=None: prompts.append(prompt) or complete(prompt, check_cancelled)
+
+    assert generator.generate(records).startswith("## Stub report")
+    assert single not in prompts
+    assert max(generator._prompt_overhead("") + estimate_tokens(prompt) for prompt in prompts) <= budget
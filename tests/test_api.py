@@ -0,0 +1,33 @@
+"""The Flask API routes on the fake `docker` CLI."""
+import pytest
+
+from container_index import ContainerListIndex
+from fake_docker import ps_entry
+
+
+@pytest.fixture
+def cached_index(app, monkeypatch):
+    """A current event-driven cache of 5 containers, with every Docker call failing the test."""
+    index = ContainerListIndex([app._simplify_container(ps_entry(i), None) for i in range(5)], app._container_key)
+    monkeypatch.setattr(app, "cached_container_index", lambda show_all, request_hostname: index)
+
+    def no_docker(host=None):
+        raise AssertionError("Docker was called although the cache is current")
+    monkeypatch.setattr(app, "get_docker", no_docker)
+    return index
+
+
+def test_containers_served_from_current_cache_without_docker(app, cached_index):
+    response = app.app.test_client().get('/api/containers?limit=2')
+    assert response.status_code == 200
+    assert [c['name'] for c in response.get_json()] == [c['name'] for c in cached_index.containers][:2]
+
+
+def test_snapshots_reject_limit_below_one(app, tmp_path, monkeypatch):
+    from snapshot_history import SnapshotHistory
+
+    monkeypatch.setattr(app, "get_history", lambda: SnapshotHistory(str(tmp_path)))
+    client = app.app.test_client()
+    assert client.get('/api/snapshots?limit=-1').status_code == 400
+    assert client.get('/api/snapshots?limit=0').status_code == 400
+    assert client.get('/api/snapshots?limit=5').get_json()['snapshots'] == []
@@ -0,0 +1,75 @@
+"""The ASGI app: requests handled on the event loop must not stall it."""
+import asyncio
+import time
+
+import pytest
+
+from container_index import ContainerListIndex
+from fake_docker import ps_entry, synthetic_container
+
+
+@pytest.fixture
+def asgi(app):
+    import asgi
+    return asgi
+
+
+async def call(asgi, method, path, query=b""):
+    """Run one request through the ASGI app; returns (status, body)."""
+    response = {'body': b""}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b""}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        else:
+            response['body'] += message.get('body', b"")
+
+    await asgi.app({'type': 'http', 'method': method, 'path': path, 'query_string': query,
+                    'headers': [(b'host', b'localhost')]}, receive, send)
+    return response['status'], response['body']
+
+
+def test_export_streams_off_the_event_loop(app, asgi, tmp_path, monkeypatch):
+    from container_export import DatasetWriter
+
+    path = str(tmp_path / "export.jsonl")
+    dataset = DatasetWriter(path)
+    for index in range(5000):
+        dataset.add(app.export_record(synthetic_container(index), None))
+    dataset.commit()
+    monkeypatch.setattr(app, "EXPORT_DATASET", path) # Just collected, so the export doesn't refresh it
+
+    async def main():
+        gaps = []
+
+        async def ticker():
+            while True:
+                started = time.perf_counter()
+                await asyncio.sleep(0.001)
+                gaps.append(time.perf_counter() - started)
+
+        ticking = asyncio.ensure_future(ticker())
+        started = time.perf_counter()
+        status, body = await call(asgi, 'GET', '/api/export', b'format=csv&gzip=true')
+        elapsed = time.perf_counter() - started
+        ticking.cancel()
+        return status, body, elapsed, max(gaps, default=elapsed) # No tick at all: blocked throughout
+
+    status, body, elapsed, longest_gap = asyncio.run(main())
+    assert status == 200 and body[:2] == b"\x1f\x8b"
+    assert longest_gap < max(0.1, elapsed / 4), (longest_gap, elapsed)
+
+
+def test_containers_served_from_current_cache_without_docker(app, asgi, monkeypatch):
+    index = ContainerListIndex([app._simplify_container(ps_entry(i), None) for i in range(5)], app._container_key)
+    monkeypatch.setattr(app, "cached_container_index", lambda show_all, request_hostname: index)
+
+    async def no_docker(host=None):
+        raise AssertionError("Docker was called although the cache is current")
+    monkeypatch.setattr(asgi, "get_async_docker", no_docker)
+
+    status, body = asyncio.run(call(asgi, 'GET', '/api/containers'))
+    assert status == 200 and body.count(b'"name"') == 5
@@ -0,0 +1,65 @@
+"""AsyncAPIBackend against the fake Engine API daemon."""
+import asyncio
+import time
+
+import pytest
+
+from async_docker import AsyncAPIBackend
+from docker_backend import DockerError
+from fake_docker import container_id
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_requests_reuse_keep_alive_connection(daemon):
+    async def main():
+        backend = AsyncAPIBackend(socket_path=daemon[0])
+        try:
+            rows = await backend.list_containers(show_all=True)
+            documents = await backend.inspect([row['ID'] for row in rows[:5]])
+            return rows, documents, len(backend._idle)
+        finally:
+            backend.close()
+
+    rows, documents, idle = run(main())
+    assert len(rows) == 20
+    assert [d['Id'][:12] for d in documents] == [row['ID'] for row in rows[:5]]
+    assert idle == 5 # The concurrent inspects' connections, kept for reuse
+
+
+def test_events_read_from_chunked_stream(daemon):
+    socket_path, state = daemon
+    with state.lock:
+        state.record_event(3, "stop")
+
+    async def main():
+        backend = AsyncAPIBackend(socket_path=socket_path)
+        # until is sent with millisecond precision, so leave room past the event
+        return await backend.events(time.time() - 60, time.time() + 0.1)
+
+    events = run(main())
+    assert [(e['Action'], e['Actor']['ID'][:12]) for e in events] == [("stop", container_id(3)[:12])]
+
+
+def test_error_status_raises_docker_error(daemon):
+    async def main():
+        backend = AsyncAPIBackend(socket_path=daemon[0])
+        with pytest.raises(DockerError) as error:
+            await backend.inspect(["does-not-exist"])
+        assert error.value.status == 404
+        return await backend.version()
+
+    assert run(main()).startswith("Docker version")
+
+
+def test_invalid_response_raises_docker_error(garbage_daemon):
+    async def main():
+        backend = AsyncAPIBackend(socket_path=garbage_daemon, timeout=1)
+        for _ in range(2):
+            with pytest.raises(DockerError, match="Invalid response"):
+                await backend.version()
+        assert backend._idle == []
+
+    run(main())
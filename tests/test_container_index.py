@@ -0,0 +1,80 @@
+"""ContainerListIndex: keyset pagination, cursor validation and substring search."""
+import pytest
+
+from container_index import ContainerListIndex, decode_cursor, encode_cursor
+
+
+def container(i, created=None, image=None):
+    return {'id': f"{i:04x}" * 16, 'name': f"app-{i}", 'image': image or f"registry/app:{i % 3}",
+            'state': 'running' if i % 4 else 'exited', 'created': 1700000000 + i // 5 if created is None else created}
+
+
+def all_pages(index, limit, sort=None, **query):
+    """Follow the cursors from the first page: (container IDs, total, page count)."""
+    pages, cursor = [], None
+    while True:
+        page, total, cursor = index.query(cursor=cursor and decode_cursor(cursor, sort), limit=limit, sort=sort, **query)
+        pages.append(page)
+        if cursor is None:
+            return [c['id'] for page in pages for c in page], total, len(pages)
+
+
+def key(c):
+    return c['id']
+
+
+@pytest.mark.parametrize("sort, descending", [(None, False), (None, True), ('image', False), ('image', True),
+                                              ('state', False)])
+def test_pages_cover_every_container_once_despite_ties(sort, descending):
+    # Five containers share each creation time, a third share each image, a quarter each state
+    containers = [container(i) for i in range(47)]
+    index = ContainerListIndex(containers, key)
+    unpaged, total, _ = all_pages(index, None, sort=sort, descending=descending)
+    for limit in (1, 4, 5, 10):
+        ids, paged_total, pages = all_pages(index, limit, sort=sort, descending=descending)
+        assert ids == unpaged and paged_total == total == 47
+        assert pages == -(-47 // limit)
+
+
+def test_filtered_pages_follow_the_sort_key():
+    index = ContainerListIndex([container(i) for i in range(40)], key)
+    ids, total, _ = all_pages(index, 3, states=['running'], sort='name')
+    running = sorted((c for c in index.containers if c['state'] == 'running'), key=lambda c: (c['name'], c['id']))
+    assert ids == [c['id'] for c in running] and total == 30
+
+
+def test_cursor_stays_valid_across_list_versions():
+    old = ContainerListIndex([container(i) for i in range(20)], key)
+    first, _, cursor = old.query(limit=5)
+    # The container the cursor points after is gone and newer ones appeared; paging goes on after its key
+    removed = first[-1]['id']
+    newer = ContainerListIndex([c for c in old.containers if c['id'] != removed] +
+                               [container(i, created=1800000000) for i in range(100, 103)], key)
+    rest, total, _ = newer.query(cursor=decode_cursor(cursor, None))
+    assert [c['id'] for c in rest] == [c['id'] for c in old.query()[0][5:]]
+    assert total == 22
+
+
+@pytest.mark.parametrize("cursor, sort", [("", None), ("not base64!", None), (encode_cursor(None, "x"), None),
+                                          (encode_cursor(None, [True, "a"]), None), (encode_cursor(None, ["1", "a"]), None),
+                                          (encode_cursor(None, [1, 2, 3]), None), (encode_cursor('name', [1, "a"]), 'name')])
+def test_invalid_cursors_are_rejected(cursor, sort):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor, sort)
+
+
+def test_cursor_of_another_sort_is_rejected():
+    index = ContainerListIndex([container(i) for i in range(10)], key)
+    _, _, cursor = index.query(sort='name', limit=2)
+    assert decode_cursor(cursor, 'name')[1] == index.query(sort='name', limit=2)[0][-1]['id']
+    with pytest.raises(ValueError, match="different sort order"):
+        decode_cursor(cursor, 'image')
+
+
+def test_search_matches_substrings_of_any_length():
+    containers = [container(i, image=image) for i, image in enumerate(["nginx:1.25", "redis:7", "NGINX-proxy", "db"])]
+    index = ContainerListIndex(containers, key)
+    assert {c['image'] for c in index.query(image="nginx")[0]} == {"NGINX-proxy", "nginx:1.25"}
+    assert [c['image'] for c in index.query(image="ng", sort='image')[0]] == ["NGINX-proxy", "nginx:1.25"] # Case-insensitive
+    assert index.query(image="nginxx")[1] == 0
+    assert index.query(text="app-3")[0][0]['image'] == "db"
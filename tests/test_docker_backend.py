@@ -0,0 +1,71 @@
+"""APIBackend and its connection pool against the fake Engine API daemon."""
+import pytest
+
+from docker_backend import APIBackend, ConnectionPool, DockerError
+
+
+def test_requests_reuse_pooled_connection(daemon):
+    backend = APIBackend(daemon[0], pool_size=2)
+    try:
+        for _ in range(5):
+            assert len(backend.list_containers(show_all=True)) == 20
+        assert backend.pool.created == 1
+    finally:
+        backend.close()
+
+
+def test_pool_slot_returned_after_invalid_response(garbage_daemon):
+    backend = APIBackend(garbage_daemon, pool_size=1, timeout=1)
+    try:
+        # With one slot, a leaked one would turn the later calls into "stayed busy" errors
+        for _ in range(3):
+            with pytest.raises(DockerError, match="Invalid response"):
+                backend.version()
+    finally:
+        backend.close()
+
+
+def test_pool_slot_returned_when_connecting_fails(tmp_path):
+    backend = APIBackend(str(tmp_path / "missing.sock"), pool_size=1, timeout=1)
+    for _ in range(3):
+        with pytest.raises(DockerError, match="Cannot connect"):
+            backend.version()
+
+
+def test_pool_get_times_out_when_all_connections_busy():
+    pool = ConnectionPool(object, size=1, wait=0.1)
+    conn = pool.get()
+    with pytest.raises(DockerError, match="stayed busy"):
+        pool.get()
+    pool.put(conn)
+    assert pool.get() is conn
+
+
+def test_error_status_raises_docker_error(daemon):
+    backend = APIBackend(daemon[0])
+    try:
+        with pytest.raises(DockerError) as error:
+            backend.inspect(["does-not-exist"])
+        assert error.value.status == 404
+        assert backend.version().startswith("Docker version")
+    finally:
+        backend.close()
+
+
+def test_stats_sampling_leaves_request_connections_free(tmp_path):
+    from fake_daemon import serve
+
+    socket_path = str(tmp_path / "docker.sock")
+    server, _ = serve(socket_path, 20, latency=0.05)
+    backend = APIBackend(socket_path, pool_size=1, timeout=1)
+    try:
+        samples = backend.stats(interval=0)
+        first = next(samples)
+        # The round ran on the sampler's own connections, at most two at a time
+        assert first and backend.stats_pool.created <= 2
+        assert backend.pool.created == 1  # only the listing of running containers
+        assert len(backend.list_containers(show_all=True)) == 20
+        samples.close()
+    finally:
+        backend.close()
+        server.shutdown()
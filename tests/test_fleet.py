@@ -0,0 +1,47 @@
+"""Fleet fan-out over fake daemons: a broken or slow host must not hold up or fail the others."""
+import time
+
+import pytest
+
+from fake_daemon import serve, serve_tcp
+from fleet import Fleet, parse_hosts
+
+
+def test_parse_hosts():
+    assert parse_hosts(" a = tcp://10.0.0.1:2375, unix:///run/docker.sock,tcp://10.0.0.2:2375 ") == [
+        ('a', 'tcp://10.0.0.1:2375'), ('docker.sock', 'unix:///run/docker.sock'), ('10.0.0.2', 'tcp://10.0.0.2:2375')]
+
+
+def test_parse_hosts_rejects_duplicate_names():
+    with pytest.raises(ValueError, match="Duplicate"):
+        parse_hosts("a=tcp://10.0.0.1:2375,a =tcp://10.0.0.2:2375")
+
+
+@pytest.fixture
+def fleet(tmp_path):
+    healthy, _ = serve(str(tmp_path / "healthy.sock"), 5)
+    healthy_tcp, _, tcp_endpoint = serve_tcp(7)
+    slow, _ = serve(str(tmp_path / "slow.sock"), 5, latency=1)
+    fleet = Fleet.from_spec(f"healthy=unix://{tmp_path}/healthy.sock,tcp={tcp_endpoint},"
+                            f"slow=unix://{tmp_path}/slow.sock,down=unix://{tmp_path}/down.sock", timeout=0.5)
+    yield fleet
+    for host in fleet.hosts:
+        host.backend.close()
+    for server in (healthy, healthy_tcp, slow):
+        server.shutdown()
+        server.server_close() # Waits for the slow host's handler, whose client is gone
+
+
+def test_map_isolates_failing_hosts(fleet):
+    started = time.monotonic()
+    results = {r.host.name: r for r in fleet.map(lambda host: len(host.backend.list_containers(show_all=True)))}
+    assert time.monotonic() - started < 0.9 # The slow host's timeout, not its latency
+
+    assert (results['healthy'].value, results['healthy'].error) == (5, None)
+    assert (results['tcp'].value, results['tcp'].error) == (7, None)
+    assert "timed out" in results['slow'].error # By the fleet or by the backend's socket, whichever is first
+    assert "Cannot connect" in results['down'].error
+
+    status = {host['name']: host['last_call'] for host in fleet.describe()}
+    assert status['healthy']['ok'] and status['tcp']['ok']
+    assert not status['slow']['ok'] and not status['down']['ok']
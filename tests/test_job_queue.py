@@ -0,0 +1,89 @@
+"""JobQueue: deduplication, cancelling queued and running jobs, and the queue bound."""
+import threading
+import time
+import types
+
+import pytest
+
+from job_queue import JobCancelled, JobQueue, QueueFull
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def busy_queue():
+    """A one-worker queue busy with job "running" until it is cancelled or release is set.
+
+    Every job runs job(job_id), which waits for release; outcomes maps job IDs
+    to 'done' or 'cancelled', positions lists what on_positions_changed got.
+    """
+    positions = []
+    queue = JobQueue(workers=1, max_queued=2, on_positions_changed=positions.append)
+    release = threading.Event()
+    outcomes = {}
+
+    def job(job_id):
+        try:
+            while not release.wait(0.01):
+                queue.check_cancelled(job_id)
+            outcomes[job_id] = 'done'
+        except JobCancelled:
+            outcomes[job_id] = 'cancelled'
+            raise
+
+    assert queue.submit("running", job, args=("running",), key="report") == ("running", False)
+    wait_until(lambda: queue.stats()['running'] == 1)
+    yield types.SimpleNamespace(queue=queue, job=job, release=release, outcomes=outcomes, positions=positions)
+    release.set()
+
+
+def test_identical_jobs_share_the_queued_or_running_one(busy_queue):
+    queue, job, release, outcomes = busy_queue.queue, busy_queue.job, busy_queue.release, busy_queue.outcomes
+    assert queue.submit("same", job, args=("same",), key="report") == ("running", True)
+    assert queue.submit("other", job, args=("other",), key="profile") == ("other", False)
+    assert queue.submit("again", job, args=("again",), key="profile") == ("other", True)
+    assert queue.stats()['queued'] == 1
+    release.set()
+    wait_until(lambda: outcomes.get("other") == 'done')
+    # Once a job is finished, its key is free again
+    assert queue.submit("later", job, args=("later",), key="report") == ("later", False)
+
+
+def test_cancel_queued_job_removes_it_without_running(busy_queue):
+    queue, job, release, outcomes = busy_queue.queue, busy_queue.job, busy_queue.release, busy_queue.outcomes
+    queue.submit("first", job, args=("first",), key="a")
+    queue.submit("second", job, args=("second",), key="b")
+    assert queue.position("second") == 2
+    assert queue.cancel("first") == 'queued'
+    assert queue.position("first") is None and queue.position("second") == 1
+    assert busy_queue.positions[-1] == {"second": 1}
+    # The cancelled job's key no longer deduplicates
+    assert queue.submit("first-again", job, args=("first-again",), key="a") == ("first-again", False)
+    release.set()
+    wait_until(lambda: len(outcomes) == 3)
+    assert "first" not in outcomes and outcomes["second"] == outcomes["first-again"] == 'done'
+
+
+def test_cancel_running_job_stops_it_at_its_next_check(busy_queue):
+    queue, job, release, outcomes = busy_queue.queue, busy_queue.job, busy_queue.release, busy_queue.outcomes
+    assert queue.cancel("running") == 'running'
+    wait_until(lambda: queue.stats()['running'] == 0)
+    assert outcomes["running"] == 'cancelled'
+    assert queue.cancel("running") is None
+    assert queue.submit("next", job, args=("next",), key="report") == ("next", False)
+
+
+def test_submit_beyond_max_queued_raises_queue_full(busy_queue):
+    queue, job, release, outcomes = busy_queue.queue, busy_queue.job, busy_queue.release, busy_queue.outcomes
+    queue.submit("first", job, args=("first",))
+    queue.submit("second", job, args=("second",))
+    with pytest.raises(QueueFull) as error:
+        queue.submit("third", job, args=("third",))
+    assert error.value.queued == 2
+    # A duplicate of the running job is still answered while the queue is full
+    assert queue.submit("dup", job, args=("dup",), key="report") == ("running", True)
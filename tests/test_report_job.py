@@ -0,0 +1,89 @@
+"""Report jobs end to end on the fake `docker` CLI and the stub OpenAI server."""
+import json
+import time
+
+import pytest
+
+from fake_openai import serve
+
+
+def wait_for(app, task_id, statuses, timeout=30):
+    deadline = time.monotonic() + timeout
+    while app.tasks[task_id]['status'] not in statuses:
+        assert time.monotonic() < deadline, f"task still {app.tasks[task_id]['status']}"
+        time.sleep(0.01)
+    return app.tasks[task_id]
+
+
+@pytest.fixture
+def openai_stub(app, monkeypatch):
+    server, state, base_url = serve(latency=0.2)
+    # A small budget makes several map batches, so the AI step takes a while
+    monkeypatch.setattr(app, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(app, "OPENAI_BASE_URL", base_url)
+    monkeypatch.setattr(app, "AI_TOKEN_BUDGET", 2000)
+    monkeypatch.setattr(app, "AI_WORKERS", 2)
+    yield state
+    server.shutdown()
+
+
+def start_report(app, use_openai):
+    response = app.app.test_client().post('/generate', data={'use_openai': 'true' if use_openai else 'false'})
+    assert response.status_code == 302
+    return response.headers['Location'].rsplit('/', 1)[-1]
+
+
+def test_basic_report_completes(app):
+    task_id = start_report(app, use_openai=False)
+    task = wait_for(app, task_id, app.FINISHED_STATUSES)
+    assert task['status'] == 'completed', task['message']
+
+
+def test_cancel_during_ai_map_phase(app, openai_stub):
+    task_id = start_report(app, use_openai=True)
+    deadline = time.monotonic() + 30
+    while openai_stub.requests == 0: # The map phase has begun
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    response = app.app.test_client().post(f'/api/tasks/{task_id}/cancel')
+    assert response.status_code == 200
+    task = wait_for(app, task_id, app.FINISHED_STATUSES)
+    assert (task['status'], task['message']) == ('cancelled', 'Report generation was cancelled.')
+
+
+def test_cancel_after_completion_keeps_report(app, monkeypatch):
+    complete_report = app.complete_report
+
+    def complete_then_cancel(task_id, message):
+        complete_report(task_id, message)
+        assert app.report_queue.cancel(task_id) == 'running' # Arrives while the job is still wrapping up
+    monkeypatch.setattr(app, "complete_report", complete_then_cancel)
+
+    task_id = start_report(app, use_openai=False)
+    task = wait_for(app, task_id, app.FINISHED_STATUSES)
+    time.sleep(0.1)
+    assert task['status'] == 'completed', task['message']
+    response = app.app.test_client().post(f'/api/tasks/{task_id}/cancel')
+    assert response.status_code == 409
+    assert app.tasks[task_id]['status'] == 'completed'
+
+
+def test_view_pages_link_under_application_root(app, monkeypatch):
+    monkeypatch.setattr(app, "VIEW_PAGE_SIZE", 20)
+    monkeypatch.setitem(app.app.config, "APPLICATION_ROOT", "/docker")
+    task_id = start_report(app, use_openai=False)
+    task = wait_for(app, task_id, app.FINISHED_STATUSES)
+    assert task['status'] == 'completed', task['message']
+
+    client = app.app.test_client()
+    html = client.get(f'/view/{task_id}?page=2').get_data(as_text=True)
+    assert 'href="/docker/static/view.css"' in html and "https://" not in html
+    assert f'href="/docker/view/{task_id}?page=1"' in html and f'href="/docker/view/{task_id}?page=3"' in html
+    assert f'href="/docker/download/{task_id}"' in html
+    assert client.get('/static/view.css').status_code == 200
+
+    with open(f"{task['task_dir']}/docker_containers_info.html.json") as f:
+        section, page = next(iter(json.load(f)['anchors'].items()))
+    response = client.get(f'/view/{task_id}?section={section}')
+    assert response.status_code == 302
+    assert response.headers['Location'] == f"/docker/view/{task_id}?page={page}#{section}"
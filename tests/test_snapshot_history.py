@@ -0,0 +1,32 @@
+"""SnapshotHistory IDs, ordering and storage totals."""
+import snapshot_history
+from fake_docker import synthetic_container
+from snapshot_history import SnapshotHistory
+
+
+def take_snapshot(history, count, **meta):
+    writer = history.begin()
+    for i in range(count):
+        writer.add(synthetic_container(i))
+    return writer.commit(**meta)
+
+
+def test_snapshots_in_the_same_second_keep_commit_order(tmp_path):
+    history = SnapshotHistory(str(tmp_path))
+    committed = [take_snapshot(history, 2, task=n)['id'] for n in range(20)]
+    assert history.snapshot_ids() == committed
+    assert [r['task'] for r in history.records(limit=3)] == [19, 18, 17]
+    assert history.previous(committed[10])['id'] == committed[9]
+    assert history.get('latest')['id'] == committed[-1]
+
+
+def test_stats_reuses_object_totals_until_ttl(tmp_path, monkeypatch):
+    history = SnapshotHistory(str(tmp_path))
+    take_snapshot(history, 3)
+    first = history.stats()
+    assert first['snapshots'] == 1 and first['objects'] == 4 # 3 documents and the manifest
+    take_snapshot(history, 5)
+    cached = history.stats()
+    assert cached['snapshots'] == 2 and cached['objects'] == 4
+    monkeypatch.setattr(snapshot_history, "STATS_TTL", 0)
+    assert history.stats()['objects'] == 7
@@ -0,0 +1,71 @@
+"""Eviction order of the in-memory and SQLite task stores."""
+import os
+import tempfile
+import time
+import types
+
+import pytest
+
+import task_store
+from task_store import REPORT_DIR_PREFIX, SQLiteTaskStore, TaskStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path, monkeypatch):
+    """make_store(max_tasks, ttl) -> (store, clock); clock.advance(seconds) moves the store's time.time() on."""
+    clock = types.SimpleNamespace(now=time.time())
+    clock.advance = lambda seconds: setattr(clock, "now", clock.now + seconds)
+    monkeypatch.setattr(task_store, "time", types.SimpleNamespace(time=lambda: clock.now, monotonic=time.monotonic))
+
+    def make(max_tasks, ttl=3600):
+        if request.param == "memory":
+            store = TaskStore(max_tasks=max_tasks, ttl=ttl)
+        else:
+            store = SQLiteTaskStore(str(tmp_path / "tasks.db"), max_tasks=max_tasks, ttl=ttl)
+        store._swept = True # Leave the report directories of other tests in the temp directory alone
+        return store, clock
+    return make
+
+
+def add(store, clock, task_id, status='completed', **fields):
+    clock.advance(1) # Keeps the access times of consecutive operations apart
+    store[task_id] = dict(status=status, **fields)
+
+
+def test_least_recently_used_finished_task_is_evicted_first(make_store):
+    store, clock = make_store(max_tasks=3)
+    for task_id in "abc":
+        add(store, clock, task_id)
+    clock.advance(1)
+    store["a"] # Viewing a task makes it recent again
+    add(store, clock, "d")
+    assert sorted(task_id for task_id, _ in store.items()) == ["a", "c", "d"]
+    add(store, clock, "e")
+    assert "c" not in store and "a" in store
+
+
+def test_unfinished_tasks_are_kept_beyond_max_tasks(make_store):
+    store, clock = make_store(max_tasks=2)
+    for task_id in "abc":
+        add(store, clock, task_id, status='running')
+    add(store, clock, "d")
+    # Only finished tasks make room, so a finished task goes right away while the store is over max_tasks
+    assert sorted(task_id for task_id, _ in store.items()) == ["a", "b", "c"]
+    store["a"]["status"] = 'completed'
+    store.save("a", store["a"])
+    add(store, clock, "e", status='running')
+    assert sorted(task_id for task_id, _ in store.items()) == ["b", "c", "e"]
+
+
+def test_tasks_unchanged_for_ttl_expire_with_their_report_dir(make_store):
+    store, clock = make_store(max_tasks=10, ttl=100)
+    report_dir = tempfile.mkdtemp(prefix=REPORT_DIR_PREFIX)
+    add(store, clock, "stale", status='running', task_dir=report_dir)
+    add(store, clock, "viewed")
+    clock.advance(60)
+    add(store, clock, "fresh")
+    store["viewed"] # Reading doesn't extend the TTL, only changes do
+    clock.advance(50)
+    store.evict()
+    assert "stale" not in store and "viewed" not in store and "fresh" in store
+    assert not os.path.exists(report_dir)
@@ -0,0 +1,176 @@
+"""Inverted indexes of what containers share: networks, volumes, images and host ports.
+
+TopologyIndex maps every network, named volume or bind mount source, image
+and published host port to the containers using it, so "which containers
+are on this network" or "who has this port" is a dictionary lookup instead
+of a pass over every inspect document. It is kept up to date one container
+at a time as collections go by: a container whose state fingerprint (see
+snapshot_cache.state_fingerprint) is unchanged is skipped, a changed one has
+its postings replaced, and containers missing from a host's latest listing
+are dropped by sync(). Lookups and report sections are sorted, so they are
+the same for the same containers.
+"""
+import threading
+import time
+
+KINDS = ('networks', 'volumes', 'images', 'ports')
+
+
+def container_links(container_info):
+    """{kind: {name: detail}} of one inspect document."""
+    network_settings = container_info.get('NetworkSettings') or {}
+    links = {kind: {} for kind in KINDS}
+    for name, network in (network_settings.get('Networks') or {}).items():
+        links['networks'][name] = {'ip_address': (network or {}).get('IPAddress') or None}
+    for mount in container_info.get('Mounts') or []:
+        mount_type = mount.get('Type')
+        name = mount.get('Name') if mount_type == 'volume' else mount.get('Source') if mount_type == 'bind' else None
+        if name: # tmpfs and other mounts have nothing to share
+            links['volumes'][name] = {'type': mount_type, 'destination': mount.get('Destination'),
+                                      'read_only': not mount.get('RW', True)}
+    image = (container_info.get('Config') or {}).get('Image')
+    if image:
+        links['images'][image] = {'image_id': (container_info.get('Image') or '')[:19] or None}
+    for container_port, bindings in (network_settings.get('Ports') or {}).items():
+        protocol = container_port.partition('/')[2] or 'tcp'
+        for binding in bindings or []:
+            if binding.get('HostPort'):
+                detail = links['ports'].setdefault(f"{binding['HostPort']}/{protocol}",
+                                                   {'container_port': container_port, 'host_ips': []})
+                detail['host_ips'] = sorted({*detail['host_ips'], binding.get('HostIp') or '0.0.0.0'})
+    return links
+
+
+def _name_key(kind, name):
+    if kind == 'ports': # Numerically: 80/tcp before 443/tcp before 8080/tcp
+        port, _, protocol = name.partition('/')
+        return (int(port) if port.isdigit() else 0, protocol)
+    return (name.lower(), name)
+
+
+class TopologyIndex:
+    def __init__(self):
+        self._containers = {} # (host, short ID) -> (state fingerprint, container summary, links)
+        self._index = {kind: {} for kind in KINDS} # Kind -> name -> {(host, short ID): detail}
+        self._lock = threading.Lock()
+        self.updated_at = None # time.time() of the last complete collection
+        self.updates = 0 # Containers (re)indexed
+        self.skipped = 0 # Containers found unchanged
+
+    def update(self, container_info, fingerprint, host=None):
+        """Index one inspected container; returns False if it was already indexed in this state."""
+        key = (host, container_info.get('Id', '')[:12])
+        with self._lock:
+            current = self._containers.get(key)
+            if current is not None and current[0] == fingerprint:
+                self.skipped += 1
+                return False
+        links = container_links(container_info)
+        labels = (container_info.get('Config') or {}).get('Labels') or {}
+        summary = {
+            'name': (container_info.get('Name') or '').lstrip('/'),
+            'id': key[1],
+            'host': host,
+            'state': (container_info.get('State') or {}).get('Status'),
+            'compose_project': labels.get('com.docker.compose.project'),
+        }
+        with self._lock:
+            self._remove(key)
+            self._containers[key] = (fingerprint, summary, links)
+            for kind, names in links.items():
+                for name, detail in names.items():
+                    self._index[kind].setdefault(name, {})[key] = detail
+            self.updates += 1
+        return True
+
+    def _remove(self, key):
+        current = self._containers.pop(key, None)
+        if current is None:
+            return
+        for kind, names in current[2].items():
+            for name in names:
+                postings = self._index[kind].get(name)
+                if postings is not None:
+                    postings.pop(key, None)
+                    if not postings:
+                        del self._index[kind][name]
+
+    def sync(self, keys, hosts):
+        """End of a collection: drop the containers of hosts that are not among keys, their listed containers."""
+        with self._lock:
+            for key in [k for k in self._containers if k[0] in hosts and k not in keys]:
+                self._remove(key)
+            self.updated_at = time.time()
+
+    # --- Lookups ---
+
+    def lookup(self, kind, name=None, hosts=None):
+        """{name: [container summary with the link's detail, ...]} of a kind, or of just one name.
+
+        hosts limits the containers to those hosts (None for all).
+        """
+        with self._lock:
+            names = self._index[kind] if name is None else {name: self._index[kind][name]} if name in self._index[kind] else {}
+            result = {}
+            for entry_name in sorted(names, key=lambda n: _name_key(kind, n)):
+                containers = [dict(self._containers[key][1], **detail) for key, detail in names[entry_name].items()
+                              if hosts is None or key[0] in hosts]
+                if containers:
+                    result[entry_name] = sorted(containers, key=lambda c: (c['name'], c['host'] or '', c['id']))
+            return result
+
+    def summary(self):
+        with self._lock:
+            return {'updated_at': self.updated_at, 'containers': len(self._containers),
+                    **{kind: len(self._index[kind]) for kind in KINDS}}
+
+    # --- Report sections ---
+
+    def markdown(self, hosts=None, max_names=50):
+        """The report's topology sections: networks, volumes, images and published ports.
+
+        Each entry lists at most max_names containers; the rest are counted.
+        """
+        def label(container):
+            text = f"{container['name']} ({container['id']})"
+            return text if container['host'] is None else f"{text} on {container['host']}"
+
+        def cell(text):
+            return str(text).replace('|', '\\|')
+
+        def names(containers, describe=label):
+            listed = ", ".join(describe(c) for c in containers[:max_names])
+            more = len(containers) - max_names
+            return cell(listed + (f" and {more} more" if more > 0 else ""))
+
+        parts = []
+        networks = self.lookup('networks', hosts=hosts)
+        if networks:
+            parts.append("## Networks\n\n| Network | Containers | Connected |\n|---------|------------|-----------|\n")
+            for name, containers in networks.items():
+                connected = names(containers, lambda c: f"{label(c)} {c['ip_address']}" if c['ip_address'] else label(c))
+                parts.append(f"| {cell(name)} | {len(containers)} | {connected} |\n")
+            parts.append("\n")
+        volumes = self.lookup('volumes', hosts=hosts)
+        if volumes:
+            parts.append("## Volumes and Bind Mounts\n\n| Source | Type | Containers | Mounted by |\n"
+                         "|--------|------|------------|------------|\n")
+            for name, containers in volumes.items():
+                mounted = names(containers, lambda c: f"{label(c)} at {c['destination']}{' (ro)' if c['read_only'] else ''}")
+                parts.append(f"| {cell(name)} | {containers[0]['type']} | {len(containers)} | {mounted} |\n")
+            parts.append("\n")
+        images = self.lookup('images', hosts=hosts)
+        if images:
+            parts.append("## Images\n\n| Image | Containers | Used by |\n|-------|------------|---------|\n")
+            for name, containers in images.items():
+                parts.append(f"| {cell(name)} | {len(containers)} | {names(containers)} |\n")
+            parts.append("\n")
+        ports = self.lookup('ports', hosts=hosts)
+        if ports:
+            parts.append("## Published Ports\n\n| Host Port | Container | Container Port | Host Addresses |\n"
+                         "|-----------|-----------|----------------|----------------|\n")
+            for name, containers in ports.items():
+                for c in containers:
+                    parts.append(f"| {name} | {cell(label(c))} | {c['container_port']} | {', '.join(c['host_ips'])} |\n")
+            parts.append("\n")
+        return "".join(parts)